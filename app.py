@@ -1,15 +1,22 @@
 import os
 from flask import Flask
 from extensions import db, mail
-from globals import model as deepfake_model  # use the globally loaded model
+from utils.startup import timed, start_services
 
 
 def create_app():
     app = Flask(__name__)
 
+    # Uploads are spooled in memory and decoded once (see utils/image_pipeline.py)
+    from utils.image_pipeline import SpooledRequest
+    app.request_class = SpooledRequest
+
     # ---- Core config (read from environment for deployment) ----
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-prod')
 
+    # Reject oversized uploads before they are read (413)
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '32')) * 1024 * 1024
+
     # ---- Database config ----
     # Prefer Railway's Postgres DATABASE_URL, then optional SQLALCHEMY_DATABASE_URI,
     # and finally fall back to local SQLite for development.
@@ -41,19 +48,39 @@ def create_app():
     mail.init_app(app)
 
     # ✅ Ensure tables exist in the configured database (Postgres on Railway)
-    with app.app_context():
+    with app.app_context(), timed("db:create_all"):
         from models.user import User
         from models.image_record import ImageRecord
         from models.admin import Admin
+        from models.chain_registration import ChainRegistration, OutboxLease
         db.create_all()
 
-    # ---- Attach Deepfake Detection Model (already loaded in globals.py) ----
-    app.model = deepfake_model
+        # Columns / indexes added to existing tables after they were created
+        from utils.schema import add_missing_columns, add_missing_indexes, check_hash_columns
+        add_missing_columns(db.engine, [ImageRecord, ChainRegistration])
+        add_missing_indexes(db.engine, [ImageRecord, ChainRegistration])
+        # Refuse to start if IMAGE_HASH_BINARY doesn't match the existing column
+        check_hash_columns(db.engine, [ImageRecord])
 
     # ---- Register blueprints ----
-    from routes.frontend import frontend_bp
-    from routes.admin import admin_bp
+    with timed("import:blueprints"):
+        from routes.frontend import frontend_bp
+        from routes.admin import admin_bp
+        from routes.metrics import metrics_bp
+        from routes.health import health_bp
+        from routes.api import api_bp
     app.register_blueprint(frontend_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(api_bp)
+
+    # ---- History writer, deepfake model + background services ----
+    # Loaded after the app is built (in a thread by default, see STARTUP_MODE):
+    # history writer, TFLite model, warm-up inference, Web3 client, chain
+    # indexer and outbox. Under gunicorn --preload they start in each worker
+    # after the fork instead (gunicorn.conf.py). /readyz answers 503 until
+    # the warm-up has finished.
+    start_services(app)
 
     return app
@@ -0,0 +1,35 @@
+# asgi.py
+"""
+ASGI entry point: the async verification API mounted next to the Flask app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 2
+
+/api/async/verify (routes/async_api.py) runs on the event loop; every
+other path is the unchanged Flask app, served through a2wsgi on a
+thread pool. The WSGI app (run.py) keeps working under gunicorn as before.
+
+Config (env):
+  ASGI_WSGI_THREADS     threads serving the mounted Flask app (default 16)
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from app import create_app
+from routes.async_api import lifespan, routes as async_routes
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "16"))
+
+flask_app = create_app()
+
+app = Starlette(
+    routes=[*async_routes, Mount("/", app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS))],
+    lifespan=lifespan,
+)
+app.state.flask_app = flask_app
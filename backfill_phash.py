@@ -0,0 +1,56 @@
+# backfill_phash.py
+"""
+Compute perceptual hashes (ImageRecord.phash / ChainRegistration.phash)
+for rows created before near-duplicate detection existed, from the
+originals in static/images. Run once after upgrading:
+
+    python backfill_phash.py
+"""
+from pathlib import Path
+
+from PIL import Image
+
+from app import create_app
+from extensions import db
+from models.image_record import ImageRecord
+from models.chain_registration import ChainRegistration
+from utils.hash_utils import get_image_dhash_from_image
+
+STATIC_IMAGES_DIR = Path(__file__).resolve().parent / "static" / "images"
+BATCH_SIZE = 500
+
+app = create_app()
+
+with app.app_context():
+    updated = missing = 0
+
+    last_id = 0
+    while True:
+        rows = (
+            ImageRecord.query
+            .filter(ImageRecord.id > last_id, ImageRecord.phash.is_(None))
+            .order_by(ImageRecord.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        for rec in rows:
+            path = STATIC_IMAGES_DIR / rec.image_filename
+            if not path.exists():
+                missing += 1
+                continue
+            with Image.open(path) as img:
+                rec.phash = get_image_dhash_from_image(img.convert("RGB"))
+            updated += 1
+        last_id = rows[-1].id
+        db.session.commit()
+
+    # Registrations reuse the phash of the ImageRecord with the same image hash
+    for reg in ChainRegistration.query.filter(ChainRegistration.phash.is_(None)).all():
+        rec = ImageRecord.query.filter_by(image_hash=reg.image_hash).first()
+        if rec is not None and rec.phash:
+            reg.phash = rec.phash
+    db.session.commit()
+
+    print(f"Backfilled {updated} perceptual hashes ({missing} images not found in {STATIC_IMAGES_DIR}).")
@@ -0,0 +1,50 @@
+# backfill_thumbnails.py
+"""
+Create WebP thumbnails (static/thumbs/<hash>.webp) for originals in
+static/images that don't have one yet. Safe to re-run.
+
+    python backfill_thumbnails.py [--workers 4]
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.thumbnails import STATIC_IMAGES_DIR, ensure_thumbnail, thumbnail_path
+
+
+def _backfill_one(image_hash):
+    try:
+        return image_hash, ensure_thumbnail(image_hash, trigger="backfill") is not None, None
+    except Exception as e:
+        return image_hash, False, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if not STATIC_IMAGES_DIR.exists():
+        print(f"No images directory at {STATIC_IMAGES_DIR}")
+        return
+
+    hashes = sorted({
+        path.stem for path in STATIC_IMAGES_DIR.iterdir()
+        if path.is_file() and not path.name.startswith(".") and not thumbnail_path(path.stem).exists()
+    })
+    print(f"{len(hashes)} images need a thumbnail")
+
+    created = failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for image_hash, ok, error in pool.map(_backfill_one, hashes, chunksize=16):
+            if ok:
+                created += 1
+            else:
+                failed += 1
+                print(f"  {image_hash}: {error or 'original not found'}")
+
+    print(f"Created {created} thumbnails ({failed} failed).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# benchmarks/async_throughput.py
+"""
+Concurrent-request throughput: sync Flask path vs the ASGI/AsyncWeb3 path.
+
+One server process at a time, on this box, against a fake JSON-RPC
+endpoint that answers getResult ("not stored") after --rpc-latency-ms, so
+every request pays a realistic chain round-trip:
+
+  sync    gunicorn (gunicorn.conf.py), 1 worker x --sync-threads threads,
+          POST /api/verify with one image (requests.Session + HTTPProvider)
+  async   uvicorn asgi:app, 1 worker, POST /api/async/verify
+          (AsyncWeb3 on the event loop, ASYNC_CPU_WORKERS threads)
+
+For each --concurrency, --requests uploads (every one a different image, so
+no cache answers them) are sent by that many concurrent clients. Reported:
+requests/s, p50/p95/p99 latency, errors, and the server's peak thread count.
+
+The model is the synthetic one from benchmarks/synthetic_model.py (needs
+TensorFlow) unless --model is given; the chain indexer and the outbox
+submitter are off. Needs the packages in requirements.txt:
+    python -m benchmarks.async_throughput --concurrency 16 64 256 --requests 1000
+    python -m benchmarks.async_throughput --paths async --rpc-latency-ms 250 --json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+FAKE_CONTRACT_ADDRESS = "0x" + "11" * 20
+
+PATHS = {
+    "sync": ("/api/verify", "images"),
+    "async": ("/api/async/verify", "image"),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- Fake RPC ---
+
+
+def _empty_get_result():
+    """ABI-encoded empty Result struct, i.e. getResult for a hash that was never stored."""
+    from eth_abi import encode
+
+    from blockchain.interact import CONTRACT_ABI
+
+    (fn,) = [item for item in CONTRACT_ABI if item.get("name") == "getResult"]
+    (output,) = fn["outputs"]
+    types = [c["type"] for c in output["components"]]
+    zero = {"bytes32": b"\0" * 32, "string": "", "address": "0x" + "00" * 20}
+    values = tuple(zero.get(t, 0) for t in types)
+    return "0x" + encode([f"({','.join(types)})"], [values]).hex()
+
+
+class FakeRpc(threading.Thread):
+    """JSON-RPC server on its own event loop; eth_call answers after latency_s."""
+
+    def __init__(self, port, latency_s):
+        super().__init__(name="fake-rpc", daemon=True)
+        self.port = port
+        self.latency_s = latency_s
+        self.started = threading.Event()
+        self._results = {
+            "eth_call": _empty_get_result(),
+            "eth_chainId": "0x1",
+            "net_version": "1",
+            "eth_blockNumber": "0x1",
+            "web3_clientVersion": "fake-rpc",
+        }
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        body = await request.json()
+        if body.get("method") == "eth_call":
+            await asyncio.sleep(self.latency_s)
+        result = self._results.get(body.get("method"), None)
+        return web.json_response({"jsonrpc": "2.0", "id": body.get("id"), "result": result})
+
+    def run(self):
+        from aiohttp import web
+
+        async def serve():
+            app = web.Application()
+            app.router.add_post("/", self._handle)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", self.port).start()
+            self.started.set()
+            await asyncio.Event().wait()
+
+        asyncio.run(serve())
+
+
+# --- Servers ---
+
+
+def start_server(path, port, env, sync_threads):
+    if path == "sync":
+        env = dict(env, GUNICORN_PRELOAD="False", WEB_CONCURRENCY="1",
+                   GUNICORN_THREADS=str(sync_threads), GUNICORN_BIND=f"127.0.0.1:{port}")
+        cmd = [sys.executable, "-m", "gunicorn", "-c", str(REPO_ROOT / "gunicorn.conf.py"), "run:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", "1", "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server on port {port} not ready within {timeout}s")
+
+
+def serving_pids(pid):
+    """The server process and its children (gunicorn's worker)."""
+    pids = [pid]
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+        pids += [int(c) for c in children]
+    except OSError:
+        pass
+    return pids
+
+
+def thread_count(pids):
+    total = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("Threads:"):
+                    total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+# --- Load ---
+
+
+def jpeg(seed, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+async def run_load(path, port, concurrency, images, server_pid):
+    import aiohttp
+
+    url_path, field = PATHS[path]
+    url = f"http://127.0.0.1:{port}{url_path}"
+    latencies, errors = [], 0
+    peak_threads = 0
+    queue = list(enumerate(images))
+    stop = asyncio.Event()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while not stop.is_set():
+            peak_threads = max(peak_threads, thread_count(serving_pids(server_pid)))
+            await asyncio.sleep(0.2)
+
+    async def client(session):
+        nonlocal errors
+        while queue:
+            index, data = queue.pop()
+            form = aiohttp.FormData()
+            form.add_field(field, data, filename=f"bench-{index}.jpg", content_type="image/jpeg")
+            started = time.perf_counter()
+            try:
+                async with session.post(url, data=form) as resp:
+                    body = await resp.text()
+                    ok = resp.status == 200 and "error" not in json.loads(body.splitlines()[0])
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            errors += not ok
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        sampler = asyncio.create_task(sample_threads())
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "errors": errors,
+        "peak_threads": peak_threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="+", default=list(PATHS), choices=list(PATHS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--requests", type=int, default=500, help="uploads per path and concurrency")
+    parser.add_argument("--rpc-latency-ms", type=float, default=100, help="fake getResult round-trip")
+    parser.add_argument("--sync-threads", type=int, default=32, help="gunicorn threads for the sync path")
+    parser.add_argument("--model", default=None, help="TFLite model (default: synthetic model)")
+    parser.add_argument("--timeout", type=float, default=180, help="seconds to wait for a server to be ready")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    rpc = FakeRpc(free_port(), args.rpc_latency_ms / 1000.0)
+    rpc.start()
+    rpc.started.wait(10)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="async-bench-") as tmp:
+        tmp = Path(tmp)
+        model_path = args.model
+        if model_path is None:
+            from benchmarks.synthetic_model import write_synthetic_model
+            model_path = write_synthetic_model(tmp / "synthetic.tflite")
+
+        seed = 0
+        for path in args.paths:
+            for concurrency in args.concurrency:
+                workdir = tmp / f"{path}-{concurrency}"
+                workdir.mkdir()
+                env = dict(os.environ, **{
+                    "DATABASE_URL": f"sqlite:///{workdir / 'bench.sqlite3'}",
+                    "LOCAL_STATE_DIR": str(workdir / "state"),
+                    "TFLITE_PATH": str(model_path),
+                    "RPC_URL": f"http://127.0.0.1:{rpc.port}/",
+                    "CONTRACT_ADDRESS": FAKE_CONTRACT_ADDRESS,
+                    "CHAIN_INDEXER_ENABLED": "False",
+                    "OUTBOX_ENABLED": "False",
+                    "STARTUP_MODE": "background",
+                    "SLOW_REQUEST_MS": "60000",
+                })
+                images = [jpeg(seed + i) for i in range(args.requests)]
+                seed += args.requests
+
+                port = free_port()
+                proc = start_server(path, port, env, args.sync_threads)
+                try:
+                    wait_ready(port, args.timeout)
+                    rows.append(asyncio.run(run_load(path, port, concurrency, images, proc.pid)))
+                finally:
+                    proc.terminate()
+                    try:
+                        proc.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        proc.kill()
+                        proc.wait()
+
+    if args.json:
+        print(json.dumps({"rpc_latency_ms": args.rpc_latency_ms, "sync_threads": args.sync_threads,
+                          "results": rows}, indent=2))
+        return
+
+    print(f"fake RPC latency {args.rpc_latency_ms:.0f} ms; sync path: 1 worker x {args.sync_threads} threads")
+    print(f"{'path':<6} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'threads':>8}")
+    for r in rows:
+        print(f"{r['path']:<6} {r['concurrency']:>5} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['errors']:>7} {r['peak_threads']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# benchmarks/db_logging.py
+"""
+History logging throughput: the original SELECT/SELECT/INSERT/flush/commit
+log_image_if_new ("before") vs the ON CONFLICT DO NOTHING upsert with the
+email -> user_id cache in utils/history.py, written inside the call
+("after") and through the write-behind HistoryWriter ("write_behind";
+timed until the queue is fully flushed).
+
+Runs against a throwaway SQLite file by default, or any SQLAlchemy URL:
+    python -m benchmarks.db_logging --rows 5000 --users 200 --duplicates 0.2
+    python -m benchmarks.db_logging --db-url postgresql://... --threads 8
+
+With --threads > 1 the same hashes are logged concurrently, which also
+shows how often the old path hit the unique constraint.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.user import User
+from models.image_record import ImageRecord
+from utils import history
+
+
+def _legacy_log(email, age, gender, occupation, image_filename, image_hash, label, confidence, phash=None):
+    """log_image_if_new as it was before utils/history.py."""
+    if not image_hash or not label:
+        return
+    existing = ImageRecord.query.filter_by(image_hash=image_hash).first()
+    if existing:
+        return
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        user = User(email=email, age=int(age), gender=gender, occupation=occupation)
+        db.session.add(user)
+        db.session.flush()
+    rec = ImageRecord(
+        user_id=user.id,
+        image_filename=image_filename,
+        image_hash=image_hash,
+        label=label.lower(),
+        confidence=confidence if confidence is not None else 0.0,
+    )
+    db.session.add(rec)
+    db.session.commit()
+
+
+def _make_app(db_url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def _workload(rows, users, duplicates, seed):
+    rng = random.Random(seed)
+    events = []
+    for i in range(rows):
+        n = rng.randrange(max(1, i)) if i and rng.random() < duplicates else i
+        image_hash = hashlib.sha256(f"image-{n}".encode()).hexdigest()
+        events.append({
+            "email": f"user{rng.randrange(users)}@example.com",
+            "age": 30,
+            "gender": "other",
+            "occupation": "researcher",
+            "image_filename": f"{image_hash}.jpg",
+            "image_hash": image_hash,
+            "label": rng.choice(("real", "fake")),
+            "confidence": rng.random(),
+        })
+    return events
+
+
+def _run(app, log_fn, events, threads, write_behind=False):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    history._user_ids.clear()
+    writer = history._writer = history.HistoryWriter(app) if write_behind else None
+    if writer is not None:
+        writer.start()
+
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(chunk):
+        with app.app_context():
+            for event in chunk:
+                try:
+                    log_fn(**event)
+                except IntegrityError:
+                    db.session.rollback()
+                    with lock:
+                        errors[0] += 1
+
+    chunks = [events[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if writer is not None:
+        writer.stop(timeout=None)  # drain and flush
+        history._writer = None
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stored = ImageRecord.query.count()
+    return {
+        "calls": len(events),
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round(len(events) / elapsed, 1),
+        "rows_stored": stored,
+        "integrity_errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="log calls per run")
+    parser.add_argument("--users", type=int, default=200, help="distinct emails")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="fraction of re-uploaded images")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--db-url", default=None, help="SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    tmp = None
+    db_url = args.db_url
+    if db_url is None:
+        fd, tmp = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        db_url = f"sqlite:///{tmp}"
+
+    try:
+        app = _make_app(db_url)
+        events = _workload(args.rows, args.users, args.duplicates, args.seed)
+        results = {
+            "before": _run(app, _legacy_log, events, args.threads),
+            "after": _run(app, history.log_image_if_new, events, args.threads),
+            "write_behind": _run(app, history.log_image_if_new, events, args.threads, write_behind=True),
+        }
+    finally:
+        if tmp is not None:
+            os.unlink(tmp)
+
+    results["speedup"] = round(results["after"]["calls_per_second"] / results["before"]["calls_per_second"], 2)
+    results["speedup_write_behind"] = round(
+        results["write_behind"]["calls_per_second"] / results["before"]["calls_per_second"], 2
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'path':<12} {'calls/s':>9} {'rows':>7} {'errors':>7}")
+    for name in ("before", "after", "write_behind"):
+        r = results[name]
+        print(f"{name:<12} {r['calls_per_second']:>9.1f} {r['rows_stored']:>7} {r['integrity_errors']:>7}")
+    print(f"speedup: {results['speedup']}x (write-behind: {results['speedup_write_behind']}x)")
+
+
+if __name__ == "__main__":
+    main()
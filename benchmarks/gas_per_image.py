@@ -0,0 +1,98 @@
+# benchmarks/gas_per_image.py
+"""
+Gas per image: storeResult (one tx per image) vs storeResults (one tx per batch).
+
+Runs against an eth-tester chain (see benchmarks/local_chain.py):
+    python -m benchmarks.gas_per_image --images 50 --batch-sizes 1 5 10 25 50
+    python -m benchmarks.gas_per_image --solc /usr/local/bin/solc-0.8.20   # offline
+
+Also fits gasUsed = base + per_image * n over every storeResults receipt;
+those two numbers are what BATCH_GAS_BASE / BATCH_GAS_PER_ITEM
+(blockchain/interact.py) fall back to when gas estimation fails.
+"""
+import argparse
+import hashlib
+import json
+
+from benchmarks.local_chain import deploy_local_chain
+
+
+def _items(n, offset):
+    return [
+        (hashlib.sha256(f"image-{offset + i}".encode()).digest(), "real", 9000 + i % 1000)
+        for i in range(n)
+    ]
+
+
+def fit_batch_gas(receipts):
+    """Least-squares (base, per_image) over (batch size, gasUsed) pairs."""
+    n = len(receipts)
+    mean_x = sum(x for x, _ in receipts) / n
+    mean_y = sum(y for _, y in receipts) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in receipts)
+    if var_x == 0:
+        raise ValueError("need at least two different batch sizes to fit base and per-image gas")
+    per_image = sum((x - mean_x) * (y - mean_y) for x, y in receipts) / var_x
+    return mean_y - per_image * mean_x, per_image
+
+
+def measure(images, batch_sizes, solc_binary=None):
+    w3, contract = deploy_local_chain(solc_binary=solc_binary)
+    results = []
+    receipts = []  # (batch size, gasUsed) of every storeResults transaction
+    offset = 0
+
+    # Baseline: one storeResult transaction per image
+    total = 0
+    for content_hash, label, conf in _items(images, offset):
+        tx = contract.functions.storeResult(content_hash, label, conf).transact()
+        total += w3.eth.wait_for_transaction_receipt(tx).gasUsed
+    offset += images
+    results.append({"path": "storeResult", "batch_size": 1, "images": images,
+                    "gas_total": total, "gas_per_image": total / images})
+
+    for batch_size in batch_sizes:
+        items = _items(images, offset)
+        offset += images
+        total = 0
+        for i in range(0, images, batch_size):
+            batch = items[i:i + batch_size]
+            tx = contract.functions.storeResults(
+                [h for h, _, _ in batch], [l for _, l, _ in batch], [c for _, _, c in batch]
+            ).transact()
+            gas_used = w3.eth.wait_for_transaction_receipt(tx).gasUsed
+            receipts.append((len(batch), gas_used))
+            total += gas_used
+        results.append({"path": "storeResults", "batch_size": batch_size, "images": images,
+                        "gas_total": total, "gas_per_image": total / images})
+
+    baseline = results[0]["gas_per_image"]
+    for r in results:
+        r["saving_vs_single"] = round(1 - r["gas_per_image"] / baseline, 4)
+    base, per_image = fit_batch_gas(receipts)
+    fit = {"base": round(base), "per_image": round(per_image),
+           "max_gas_used": max(g for _, g in receipts)}
+    return results, fit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--solc", default=None, help="local solc binary (default: download with py-solc-x)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results, fit = measure(args.images, args.batch_sizes, solc_binary=args.solc)
+    if args.json:
+        print(json.dumps({"results": results, "storeResults_fit": fit}, indent=2))
+        return
+
+    print(f"{'path':<13} {'batch':>5} {'gas/image':>10} {'saving':>8}")
+    for r in results:
+        print(f"{r['path']:<13} {r['batch_size']:>5} {r['gas_per_image']:>10.0f} {r['saving_vs_single']:>8.1%}")
+    print(f"storeResults gasUsed ~= {fit['base']} + {fit['per_image']} * n")
+
+
+if __name__ == "__main__":
+    main()
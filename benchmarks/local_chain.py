@@ -0,0 +1,79 @@
+# benchmarks/local_chain.py
+"""
+In-process EVM with DeepfakeLogger deployed, for offline benchmarks.
+
+Requires the optional benchmark dependencies:
+    pip install "web3[tester]" py-solc-x
+"""
+import threading
+from pathlib import Path
+
+from web3 import Web3, EthereumTesterProvider
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CONTRACT_PATH = BASE_DIR / "contracts" / "DeepfakeLogger.sol"
+SOLC_VERSION = "0.8.24"
+
+
+def compile_contract(solc_version=SOLC_VERSION, solc_binary=None):
+    """
+    Compile contracts/DeepfakeLogger.sol and return (abi, bytecode).
+
+    solc_binary: path to a local solc; otherwise py-solc-x downloads
+    solc_version from binaries.soliditylang.org on first use.
+    """
+    import solcx
+
+    if solc_binary is not None:
+        version_kwargs = {"solc_binary": solc_binary}
+    else:
+        if solc_version not in [str(v) for v in solcx.get_installed_solc_versions()]:
+            solcx.install_solc(solc_version)
+        version_kwargs = {"solc_version": solc_version}
+
+    compiled = solcx.compile_files(
+        [str(CONTRACT_PATH)],
+        output_values=["abi", "bin"],
+        optimize=True,
+        **version_kwargs,
+    )
+    for name, artifact in compiled.items():
+        if name.endswith(":DeepfakeLogger"):
+            return artifact["abi"], artifact["bin"]
+    raise RuntimeError("DeepfakeLogger not found in compiler output")
+
+
+class SerializedTesterProvider(EthereumTesterProvider):
+    """eth-tester is not thread-safe; concurrent callers take turns (like a single node would)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            return super().make_request(method, params)
+
+
+def deploy_local_chain(solc_binary=None):
+    """Start an eth-tester chain, deploy DeepfakeLogger, return (w3, contract)."""
+    w3 = Web3(SerializedTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+
+    abi, bytecode = compile_contract(solc_binary=solc_binary)
+    factory = w3.eth.contract(abi=abi, bytecode=bytecode)
+    tx_hash = factory.constructor().transact()
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3, w3.eth.contract(address=receipt.contractAddress, abi=abi)
+
+
+def add_funded_account(w3, private_key: str, ether=100):
+    """Import private_key into the tester chain and fund it; returns its address."""
+    address = w3.provider.ethereum_tester.add_account(private_key)
+    tx_hash = w3.eth.send_transaction({
+        "from": w3.eth.accounts[0],
+        "to": address,
+        "value": w3.to_wei(ether, "ether"),
+    })
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.to_checksum_address(address)
@@ -0,0 +1,356 @@
+# benchmarks/pipeline.py
+"""
+Offline end-to-end benchmark of the verification pipeline.
+
+Everything runs in this process, with no network and no real model:
+  chain     eth-tester EVM with contracts/DeepfakeLogger.sol deployed
+            (benchmarks/local_chain.py); the app's Web3 client is pinned to it
+  model     synthetic TFLite model with the 299x299x3 input signature
+            (benchmarks/synthetic_model.py), or --model for a real file
+  database  throwaway SQLite file
+  images    random-noise JPEGs, fresh for every run so no cache answers them
+
+Stages (each op timed on its own, run by --concurrency threads):
+  decode        DecodedUpload: decode + pixel hash of an uploaded JPEG
+  hash          pixel hash of an already-decoded image
+  preprocess    299x299 float32 tensor from the decoded image
+  inference     one image through the micro-batching scheduler
+  chain_read    get_result (local mirror, then eth_call)
+  chain_rpc     getResult eth_call, bypassing the mirror
+  chain_write   signed storeResult transaction, waited until mined
+  analyze       full POST /analyze through the Flask test client
+
+Output: throughput plus p50/p95/p99 latency per stage and concurrency,
+as a table or JSON (--json / --output). The JSON records the git
+commit, so results can be kept and compared; --baseline prints the change
+against an earlier file, and exits 1 if any p95 got worse than
+--tolerance.
+
+Requires the optional benchmark dependencies:
+    pip install "web3[tester]" py-solc-x tensorflow
+
+    python -m benchmarks.pipeline --ops 200 --concurrency 1 4 16
+    python -m benchmarks.pipeline --stages inference analyze --output bench.json
+    python -m benchmarks.pipeline --baseline bench.json --tolerance 0.1
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+STAGES = ("decode", "hash", "preprocess", "inference", "chain_read", "chain_rpc", "chain_write", "analyze")
+
+# Deterministic key for the signer account imported into the tester chain
+BENCH_PRIVATE_KEY = "0x" + "4b" * 32
+
+FORM = {"email": "bench@example.com", "age": "30", "gender": "other", "occupation": "benchmark"}
+
+
+# --- Workload ---
+
+
+class ImageFactory:
+    """Random-noise JPEGs; every call returns images no earlier call has produced."""
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def jpegs(self, n):
+        out = []
+        for _ in range(n):
+            with self._lock:
+                pixels = self._rng.integers(0, 256, (self.size[1], self.size[0], 3), dtype=np.uint8)
+            buf = io.BytesIO()
+            Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+            out.append(buf.getvalue())
+        return out
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def measure(op, payloads, concurrency):
+    """Run op(payload) for every payload on `concurrency` threads; latency stats in ms."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(payload):
+        started = time.perf_counter()
+        try:
+            op(payload)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, payloads))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [v * 1000.0 for v in latencies]
+    return {
+        "ops": len(payloads),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(wall, 4),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": _round(percentile(ms, 50)),
+        "p95_ms": _round(percentile(ms, 95)),
+        "p99_ms": _round(percentile(ms, 99)),
+        "max_ms": _round(ms[-1] if ms else None),
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+# --- Environment ---
+
+
+def setup(workdir: Path, model_path=None, model_width=16):
+    """
+    Deploy the local chain, point the app at it and the synthetic model,
+    and build the Flask app. Environment variables are set before any app
+    module is imported, since they are read at import time.
+    """
+    from benchmarks.local_chain import add_funded_account, deploy_local_chain
+
+    w3, contract = deploy_local_chain()
+    add_funded_account(w3, BENCH_PRIVATE_KEY)
+
+    if model_path is None:
+        from benchmarks.synthetic_model import write_synthetic_model
+        model_path = write_synthetic_model(workdir / "synthetic.tflite", width=model_width)
+
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.sqlite3'}",
+        "LOCAL_STATE_DIR": str(workdir / "state"),
+        "STARTUP_MODE": "eager",
+        "RPC_URL": "http://in-process.invalid",  # never dialled: the client is pinned to eth-tester
+        "CONTRACT_ADDRESS": contract.address,
+        "PRIVATE_KEY": BENCH_PRIVATE_KEY,
+        "CHAIN_ID": str(w3.eth.chain_id),
+        "INDEXER_CONFIRMATIONS": "0",
+        "INDEXER_POLL_SECONDS": "0.5",
+        "OUTBOX_POLL_SECONDS": "0.5",
+        "SLOW_REQUEST_MS": "0",
+    })
+
+    import globals as app_globals
+    from blockchain import interact
+    from routes import frontend
+    from utils import thumbnails
+
+    interact._client.pin(w3)
+    app_globals.TFLITE_PATH = str(model_path)
+    frontend.STATIC_IMAGES_DIR = thumbnails.STATIC_IMAGES_DIR = workdir / "images"
+    thumbnails.THUMBS_DIR = workdir / "thumbs"
+
+    from app import create_app
+    return create_app(), str(model_path)
+
+
+# --- Stages ---
+
+
+def _stage_ops(name, app, images):
+    """(op, payloads) for one stage; payloads are prepared up front, outside the timing."""
+    from werkzeug.datastructures import FileStorage
+
+    import globals as app_globals
+    from blockchain import interact
+    from utils.hash_utils import get_image_pixel_hash_from_image
+    from utils.image_pipeline import DecodedUpload
+    from utils.predict import predict_array, preprocess_pil
+
+    def decoded(data):
+        with Image.open(io.BytesIO(data)) as img:
+            return img.convert("RGB")
+
+    if name == "decode":
+        return (lambda data: DecodedUpload(FileStorage(io.BytesIO(data), filename="bench.jpg")),
+                images)
+    if name == "hash":
+        return get_image_pixel_hash_from_image, [decoded(d) for d in images]
+    if name == "preprocess":
+        return preprocess_pil, [decoded(d) for d in images]
+    if name == "inference":
+        scheduler = app_globals.get_scheduler()
+        if scheduler is None:
+            raise RuntimeError("model did not load; see the log above")
+        return (lambda x: predict_array(scheduler, x)), [preprocess_pil(decoded(d)) for d in images]
+
+    hashes = [bytes.fromhex(get_image_pixel_hash_from_image(decoded(d))) for d in images]
+    if name == "chain_read":
+        return interact.get_result, hashes
+    if name == "chain_rpc":
+        return interact._get_result_rpc, hashes
+    if name == "chain_write":
+        return (lambda h: interact.store_result(h, "real", 0.9)), hashes
+
+    if name == "analyze":
+        local = threading.local()
+
+        def post(data):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = app.test_client()
+            response = client.post(
+                "/analyze",
+                data={**FORM, "image": (io.BytesIO(data), "bench.jpg")},
+                content_type="multipart/form-data",
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"/analyze answered {response.status_code}")
+
+        return post, images
+    raise ValueError(f"unknown stage {name!r}")
+
+
+def run(stages, concurrencies, ops, warmup, image_size, model_path=None, model_width=16, seed=0):
+    workdir = Path(tempfile.mkdtemp(prefix="deepfake-bench-"))
+    try:
+        app, model_path = setup(workdir, model_path, model_width)
+        factory = ImageFactory(image_size, seed)
+        results = []
+
+        for stage in stages:
+            for concurrency in concurrencies:
+                if warmup:
+                    op, payloads = _stage_ops(stage, app, factory.jpegs(warmup))
+                    measure(op, payloads, concurrency)
+                op, payloads = _stage_ops(stage, app, factory.jpegs(ops))
+                results.append({"stage": stage, "concurrency": concurrency, **measure(op, payloads, concurrency)})
+
+        import globals as app_globals
+        return {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "tflite_runtime": app_globals.TFLITE_RUNTIME,
+                "model": os.path.basename(model_path),
+                "ops": ops,
+                "warmup": warmup,
+                "image_size": list(image_size),
+            },
+            "results": results,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+# --- Reporting ---
+
+
+def compare(baseline, current, tolerance):
+    """Rows of (stage, concurrency, throughput ratio, p95 ratio, regressed) for runs in both files."""
+    previous = {(r["stage"], r["concurrency"]): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        old = previous.get((r["stage"], r["concurrency"]))
+        if old is None or not old.get("p95_ms") or not old.get("throughput_per_s") or not r.get("p95_ms"):
+            continue
+        p95_ratio = r["p95_ms"] / old["p95_ms"]
+        throughput_ratio = (r["throughput_per_s"] or 0.0) / old["throughput_per_s"]
+        rows.append((r["stage"], r["concurrency"], throughput_ratio, p95_ratio, p95_ratio > 1.0 + tolerance))
+    return rows
+
+
+def print_table(report):
+    print(f"commit {report['meta']['commit']}  runtime {report['meta']['tflite_runtime']}  "
+          f"model {report['meta']['model']}")
+    print(f"{'stage':<12} {'conc':>4} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+    for r in report["results"]:
+        print(f"{r['stage']:<12} {r['concurrency']:>4} {_fmt(r['throughput_per_s'])} "
+              f"{_fmt(r['p50_ms'])} {_fmt(r['p95_ms'])} {_fmt(r['p99_ms'])} {r['errors']:>6}")
+        if r["first_error"]:
+            print(f"{'':<17} first error: {r['first_error']}")
+
+
+def _fmt(value):
+    return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--ops", type=int, default=100, help="timed operations per stage and concurrency")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed operations before each run")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 480], metavar=("W", "H"))
+    parser.add_argument("--model", default=None, help="TFLite file to use instead of the synthetic model")
+    parser.add_argument("--model-width", type=int, default=16, help="conv filters of the synthetic model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed p95 increase vs --baseline")
+    args = parser.parse_args()
+
+    report = run(args.stages, args.concurrency, args.ops, args.warmup, tuple(args.image_size),
+                 model_path=args.model, model_width=args.model_width, seed=args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.tolerance)
+        print(f"\nvs {args.baseline} (commit {baseline['meta'].get('commit')}):")
+        print(f"{'stage':<12} {'conc':>4} {'ops/s':>8} {'p95':>8}")
+        for stage, concurrency, throughput_ratio, p95_ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{stage:<12} {concurrency:>4} {throughput_ratio:>7.2f}x {p95_ratio:>7.2f}x{flag}")
+        if any(row[4] for row in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/preprocess_draft.py
+"""
+JPEG draft-mode preprocessing vs full decode: speed, memory and verdict drift.
+
+utils.predict._preprocess_image decodes JPEGs in draft mode (DCT-domain
+downscaling to the smallest 1/2, 1/4 or 1/8 scale still >= 299x299); the
+old path decoded the full photo and then did a nearest-neighbour resize.
+For every image this compares the two paths:
+
+  decode ms       median wall time of file -> (1, 299, 299, 3) tensor
+  decoded MP      pixels actually decoded (drives peak memory: 3 bytes each)
+  pixel diff      mean |difference| of the model input, in 0-255 units
+  score diff      |p_fake(draft) - p_fake(full)| through the TFLite model
+
+and exits 1 if any score moves by more than --tolerance or any real/fake
+decision flips (so it can gate a change to the preprocessing).
+
+Uses --images (a directory of real photos, recommended) or generated
+12 MP JPEGs, and --model (default: the synthetic model from
+benchmarks/synthetic_model.py, which needs TensorFlow to build):
+    python -m benchmarks.preprocess_draft --images data/holdout --model model/xception_deepfake_quant.tflite
+    python -m benchmarks.preprocess_draft --synthetic 10 --tolerance 0.02
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from utils.predict import _decode_binary_preds, _preprocess_image, predict_batch, preprocess_pil
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg"}
+
+
+def synthetic_photos(directory: Path, count, size=(4032, 3024), seed=0):
+    """Smooth, photo-like JPEGs (upsampled low-res noise plus grain), 12 MP by default."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        base = rng.integers(0, 256, (size[1] // 64, size[0] // 64, 3), dtype=np.uint8)
+        img = Image.fromarray(base).resize(size, Image.BICUBIC)
+        grain = rng.normal(0, 4, (size[1], size[0], 3))
+        img = Image.fromarray(np.clip(np.asarray(img, dtype=np.float32) + grain, 0, 255).astype(np.uint8))
+        path = directory / f"synthetic-{i}.jpg"
+        img.save(path, format="JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def full_decode(path) -> np.ndarray:
+    """The previous preprocessing: full-resolution decode, then nearest resize."""
+    with Image.open(path) as img:
+        return preprocess_pil(img, np.uint8)
+
+
+def decoded_megapixels(path, draft):
+    with Image.open(path) as img:
+        if draft:
+            img.draft("RGB", (299, 299))
+        img.load()
+        return img.size[0] * img.size[1] / 1e6
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples)
+
+
+def load_interpreter(model_path):
+    from globals import _import_tflite_runtime
+
+    interpreter_cls, _ = _import_tflite_runtime()
+    if interpreter_cls is None:
+        raise RuntimeError("no TFLite runtime installed")
+    interpreter = interpreter_cls(model_path=str(model_path))
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def compare(paths, interpreter, runs):
+    rows = []
+    for path in paths:
+        full = full_decode(path)
+        draft = _preprocess_image(str(path), np.uint8)
+        p_full = np.asarray(predict_batch(interpreter, full)).ravel()
+        p_draft = np.asarray(predict_batch(interpreter, draft)).ravel()
+        rows.append({
+            "image": path.name,
+            "full_ms": round(median_ms(lambda: full_decode(path), runs), 2),
+            "draft_ms": round(median_ms(lambda: _preprocess_image(str(path), np.uint8), runs), 2),
+            "full_mp": round(decoded_megapixels(path, draft=False), 2),
+            "draft_mp": round(decoded_megapixels(path, draft=True), 2),
+            "pixel_diff": round(float(np.abs(full.astype(np.int16) - draft.astype(np.int16)).mean()), 3),
+            "score_diff": round(float(np.abs(p_full - p_draft).max()), 5),
+            "same_label": _decode_binary_preds(p_full)[0] == _decode_binary_preds(p_draft)[0],
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory of JPEGs (default: generated photos)")
+    parser.add_argument("--synthetic", type=int, default=8, help="generated photos when --images is not given")
+    parser.add_argument("--model", default=None, help="TFLite model (default: synthetic model)")
+    parser.add_argument("--runs", type=int, default=5, help="timed decodes per image and path")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="max allowed |p_fake| change")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="draft-bench-") as tmp:
+        tmp = Path(tmp)
+        if args.images:
+            paths = sorted(p for p in Path(args.images).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+        else:
+            paths = synthetic_photos(tmp, args.synthetic)
+        if not paths:
+            parser.error("no JPEGs to compare")
+
+        model_path = args.model
+        if model_path is None:
+            from benchmarks.synthetic_model import write_synthetic_model
+            model_path = write_synthetic_model(tmp / "synthetic.tflite")
+
+        rows = compare(paths, load_interpreter(model_path), args.runs)
+
+    summary = {
+        "images": len(rows),
+        "speedup": round(sum(r["full_ms"] for r in rows) / max(1e-9, sum(r["draft_ms"] for r in rows)), 2),
+        "max_score_diff": max(r["score_diff"] for r in rows),
+        "label_flips": sum(not r["same_label"] for r in rows),
+        "tolerance": args.tolerance,
+    }
+    summary["ok"] = summary["max_score_diff"] <= args.tolerance and summary["label_flips"] == 0
+
+    if args.json:
+        print(json.dumps({"summary": summary, "images": rows}, indent=2))
+    else:
+        print(f"{'image':<24} {'full ms':>8} {'draft ms':>8} {'full MP':>8} {'draft MP':>8} {'px diff':>8} {'score diff':>10}")
+        for r in rows:
+            print(f"{r['image'][:24]:<24} {r['full_ms']:>8.1f} {r['draft_ms']:>8.1f} {r['full_mp']:>8.2f} "
+                  f"{r['draft_mp']:>8.2f} {r['pixel_diff']:>8.2f} {r['score_diff']:>10.5f}")
+        print(f"speedup {summary['speedup']}x, max score diff {summary['max_score_diff']} "
+              f"(tolerance {args.tolerance}), label flips {summary['label_flips']}: "
+              f"{'OK' if summary['ok'] else 'FAIL'}")
+
+    if not summary["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
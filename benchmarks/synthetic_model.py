@@ -0,0 +1,73 @@
+# benchmarks/synthetic_model.py
+"""
+Tiny stand-in for the Xception TFLite model, for offline benchmarks.
+
+Same interface as model/xception_deepfake_quant.tflite: float32 input of
+shape (None, 299, 299, 3) (dynamic batch, exported the same way as
+convert_to_tflite.py) and one sigmoid output per image. The weights are
+random (fixed seed), so the verdicts mean nothing; the point is to time
+the serving path around the model without the real 80 MB file.
+
+Requires TensorFlow (only to build the file; the app then loads it with
+whichever TFLite runtime is installed):
+    python -m benchmarks.synthetic_model --out /tmp/synthetic.tflite
+"""
+import argparse
+from pathlib import Path
+
+from utils.predict import IMG_SIZE
+
+
+def build_keras_model(seed=0, width=16):
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=(IMG_SIZE[1], IMG_SIZE[0], 3))
+    x = tf.keras.layers.AveragePooling2D(pool_size=4)(inputs)
+    x = tf.keras.layers.Conv2D(width, 3, strides=2, activation="relu")(x)
+    x = tf.keras.layers.Conv2D(width * 2, 3, strides=2, activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(1, activation="sigmoid")(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+def convert(model, quantize=True) -> bytes:
+    """
+    TFLite flatbuffer with a dynamic batch dimension (as convert_to_tflite.py does).
+
+    from_keras_model freezes the weights and keeps the Input's None batch.
+    A concrete function of model(x) does not: with Keras 3 its variables
+    end up as uninitialised resource variables and the model returns NaN.
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def write_synthetic_model(path, seed=0, width=16, quantize=True) -> Path:
+    """Build the synthetic model and write it to path (skipped if it already exists)."""
+    path = Path(path)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(convert(build_keras_model(seed, width), quantize=quantize))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="where to write the .tflite file")
+    parser.add_argument("--width", type=int, default=16, help="conv filters (more = slower model)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-quantize", action="store_true", help="skip dynamic-range quantization")
+    args = parser.parse_args()
+
+    path = write_synthetic_model(args.out, args.seed, args.width, quantize=not args.no_quantize)
+    print(f"Wrote {path} ({path.stat().st_size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/upload_memo.py
+"""
+Raw-bytes upload memo: identity check and decode time saved.
+
+For every image this builds a DecodedUpload three times from the same bytes:
+
+  decode    use_memo=False, the plain decode path
+  miss      first memo lookup (decodes, then records the hashes)
+  hit       byte-identical re-upload, answered from the memo
+
+and checks that the pixel hash and dHash from all three are identical to
+each other and to utils.hash_utils.get_image_hash on the file, and that a
+memo hit decodes to the same RGB bytes when the pixels are asked for.
+A second UploadMemo on the same SQLite file (a fresh worker) must answer
+from the persistent tier as well. Exits 1 on any mismatch.
+
+Uses --images (a directory, recommended) or generated images covering the
+modes the decode path converts (RGB/L/P/RGBA/CMYK JPEG, PNG, GIF, WebP):
+    python -m benchmarks.upload_memo
+    python -m benchmarks.upload_memo --images data/holdout --json
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif"}
+
+# (file name, PIL mode, save format)
+SYNTHETIC_IMAGES = [
+    ("rgb.jpg", "RGB", "JPEG"),
+    ("gray.jpg", "L", "JPEG"),
+    ("cmyk.jpg", "CMYK", "JPEG"),
+    ("rgb.png", "RGB", "PNG"),
+    ("rgba.png", "RGBA", "PNG"),
+    ("palette.png", "P", "PNG"),
+    ("palette.gif", "P", "GIF"),
+    ("rgb.webp", "RGB", "WEBP"),
+]
+
+
+def synthetic_images(directory: Path, size=(1600, 1200), seed=0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for name, mode, fmt in SYNTHETIC_IMAGES:
+        base = rng.integers(0, 256, (size[1] // 32, size[0] // 32, 4), dtype=np.uint8)
+        img = Image.fromarray(base, "RGBA").resize(size, Image.BICUBIC)
+        img = img.convert(mode) if mode != "P" else img.convert("RGB").quantize(64)
+        path = directory / name
+        img.save(path, format=fmt)
+        paths.append(path)
+    return paths
+
+
+def upload_of(data: bytes, filename, use_memo=True):
+    from werkzeug.datastructures import FileStorage
+
+    from utils.image_pipeline import DecodedUpload
+
+    return DecodedUpload(FileStorage(stream=io.BytesIO(data), filename=filename), use_memo=use_memo)
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples)
+
+
+def check(path, runs, memo_db):
+    from utils.hash_utils import get_image_hash
+    from utils.upload_memo import UploadMemo, bytes_digest
+
+    data = path.read_bytes()
+    reference = get_image_hash(str(path))
+
+    decoded = upload_of(data, path.name, use_memo=False)
+    miss = upload_of(data, path.name)
+    hit = upload_of(data, path.name)
+    fresh_worker = UploadMemo(memory_items=0, db_filename=memo_db)
+    persisted = fresh_worker.get(bytes_digest(io.BytesIO(data)))
+
+    expected = (reference, decoded.perceptual_hash)
+    problems = []
+    if decoded.pixel_hash != reference:
+        problems.append("decode path differs from get_image_hash")
+    if miss.memo_hit or (miss.pixel_hash, miss.perceptual_hash) != expected:
+        problems.append("memo miss")
+    if not hit.memo_hit or (hit.pixel_hash, hit.perceptual_hash) != expected:
+        problems.append("memo hit")
+    if persisted != expected:
+        problems.append("persistent tier")
+    if hit.rgb.tobytes() != decoded.rgb.tobytes():
+        problems.append("lazy decode of a memo hit")
+
+    return {
+        "image": path.name,
+        "bytes": len(data),
+        # Both hashes, as decide() needs them
+        "decode_ms": round(median_ms(lambda: upload_of(data, path.name, use_memo=False).perceptual_hash, runs), 3),
+        "hit_ms": round(median_ms(lambda: upload_of(data, path.name).perceptual_hash, runs), 3),
+        "identical": not problems,
+        "problems": problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory of images (default: generated images)")
+    parser.add_argument("--runs", type=int, default=5, help="timed uploads per image and path")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="upload-memo-") as tmp:
+        tmp = Path(tmp)
+        # Read at import time by utils.local_store / utils.upload_memo
+        os.environ["LOCAL_STATE_DIR"] = str(tmp / "state")
+        os.environ["UPLOAD_MEMO_ENABLED"] = "True"
+        from utils.upload_memo import UPLOAD_MEMO_DB
+
+        if args.images:
+            paths = sorted(p for p in Path(args.images).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+        else:
+            paths = synthetic_images(tmp)
+        if not paths:
+            parser.error("no images to check")
+
+        rows = [check(path, args.runs, UPLOAD_MEMO_DB) for path in paths]
+
+    summary = {
+        "images": len(rows),
+        "mismatches": sum(not r["identical"] for r in rows),
+        "speedup": round(sum(r["decode_ms"] for r in rows) / max(1e-9, sum(r["hit_ms"] for r in rows)), 1),
+    }
+
+    if args.json:
+        print(json.dumps({"summary": summary, "images": rows}, indent=2))
+    else:
+        print(f"{'image':<24} {'KB':>8} {'decode ms':>10} {'memo hit ms':>12}  identical")
+        for r in rows:
+            status = "yes" if r["identical"] else "NO: " + ", ".join(r["problems"])
+            print(f"{r['image'][:24]:<24} {r['bytes'] / 1024:>8.1f} {r['decode_ms']:>10.2f} {r['hit_ms']:>12.3f}  {status}")
+        print(f"{summary['images']} images, {summary['mismatches']} mismatches, "
+              f"memo hits {summary['speedup']}x faster than decoding")
+
+    if summary["mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/worker_memory.py
+"""
+Memory per gunicorn worker with and without preload_app (Linux only).
+
+Starts gunicorn (gunicorn.conf.py) with --workers 4 and 8 by default, in
+two configurations:
+
+  before    no preload: every worker imports the app and the runtime and
+            loads the model on its own
+  preload   preload_app in the master (STARTUP_MODE=deferred): the app and
+            the TFLite runtime are imported once and shared copy-on-write;
+            each worker still builds its own interpreters
+
+In both, interpreters load with model_path, which memory-maps the model
+file, so the flatbuffer itself is shared through the page cache.
+
+waits until every worker has warmed up (memory stops growing), and reads
+/proc/<pid>/smaps_rollup for the master and each worker:
+
+  RSS       resident pages, counting shared pages in full in every process
+  PSS       shared pages divided by the number of processes mapping them;
+            the sum over all processes is the real footprint
+  private   pages only this process maps
+
+The interesting figures are PSS per worker and the total PSS.
+
+Uses --model (the real model is recommended, the weights dominate) or a
+synthetic model from benchmarks/synthetic_model.py (needs TensorFlow):
+    python -m benchmarks.worker_memory --model model/xception_deepfake_quant.tflite
+    python -m benchmarks.worker_memory --workers 4 8 --json
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CONFIGS = {
+    "before": {"GUNICORN_PRELOAD": "False", "STARTUP_MODE": "background"},
+    "preload": {"GUNICORN_PRELOAD": "True", "STARTUP_MODE": "deferred"},
+}
+
+SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def smaps_rollup(pid):
+    """{"rss", "pss", "private"} in MB for one process."""
+    totals = {"rss": 0, "pss": 0, "private": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in SMAPS_FIELDS:
+                totals[SMAPS_FIELDS[key]] += int(rest.split()[0])  # kB
+    return {k: round(v / 1024, 1) for k, v in totals.items()}
+
+
+def child_pids(pid):
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # "pid (comm) state ppid ...": comm may contain spaces, so split after it
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            children.append(int(entry.name))
+    return sorted(children)
+
+
+def wait_until_settled(master_pid, workers, timeout, interval=0.5, samples=6, tolerance=0.005):
+    """Wait for all workers to exist and total PSS to stop moving (warm-up finished)."""
+    deadline = time.monotonic() + timeout
+    history = []
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        pids = child_pids(master_pid)
+        if len(pids) < workers:
+            history.clear()
+            continue
+        try:
+            history.append(sum(smaps_rollup(pid)["pss"] for pid in pids))
+        except OSError:  # a worker restarted between listing and reading
+            history.clear()
+            continue
+        recent = history[-samples:]
+        if len(recent) == samples and max(recent) - min(recent) <= tolerance * max(recent):
+            return pids
+    raise RuntimeError(f"gunicorn did not settle with {workers} workers within {timeout}s")
+
+
+def measure(config, workers, model_path, workdir, timeout):
+    env = dict(os.environ)
+    env.update(CONFIGS[config])
+    env.update({
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_BIND": f"unix:{workdir / 'gunicorn.sock'}",
+        "TFLITE_PATH": str(model_path),
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.sqlite3'}",
+        "LOCAL_STATE_DIR": str(workdir / "state"),
+    })
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(REPO_ROOT / "gunicorn.conf.py"), "run:app"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        pids = wait_until_settled(proc.pid, workers, timeout)
+        per_worker = [smaps_rollup(pid) for pid in pids]
+        master = smaps_rollup(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    return {
+        "config": config,
+        "workers": workers,
+        "worker_rss_mb": round(statistics.mean(w["rss"] for w in per_worker), 1),
+        "worker_pss_mb": round(statistics.mean(w["pss"] for w in per_worker), 1),
+        "worker_private_mb": round(statistics.mean(w["private"] for w in per_worker), 1),
+        "master_pss_mb": master["pss"],
+        "total_pss_mb": round(master["pss"] + sum(w["pss"] for w in per_worker), 1),
+        "per_worker": per_worker,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--model", default=None, help="TFLite model (default: synthetic model)")
+    parser.add_argument("--model-width", type=int, default=512, help="synthetic model size (conv filters)")
+    parser.add_argument("--timeout", type=float, default=180, help="seconds to wait for the workers to settle")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        parser.error("needs Linux /proc/<pid>/smaps_rollup")
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="worker-memory-") as tmp:
+        tmp = Path(tmp)
+        model_path = args.model
+        if model_path is None:
+            from benchmarks.synthetic_model import write_synthetic_model
+            model_path = write_synthetic_model(tmp / f"synthetic-{args.model_width}.tflite", width=args.model_width)
+        model_mb = round(Path(model_path).stat().st_size / 2**20, 1)
+
+        for workers in args.workers:
+            for config in args.configs:
+                workdir = tmp / f"{config}-{workers}"
+                workdir.mkdir()
+                rows.append(measure(config, workers, model_path, workdir, args.timeout))
+
+    if args.json:
+        print(json.dumps({"model": str(model_path), "model_mb": model_mb, "results": rows}, indent=2))
+        return
+
+    print(f"model {model_path} ({model_mb} MB); per-worker figures are means, in MB")
+    print(f"{'config':<8} {'workers':>7} {'RSS/worker':>10} {'PSS/worker':>10} {'private':>8} "
+          f"{'master PSS':>10} {'total PSS':>10}")
+    for r in rows:
+        print(f"{r['config']:<8} {r['workers']:>7} {r['worker_rss_mb']:>10.1f} {r['worker_pss_mb']:>10.1f} "
+              f"{r['worker_private_mb']:>8.1f} {r['master_pss_mb']:>10.1f} {r['total_pss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# blockchain/async_client.py
+"""
+AsyncWeb3 chain reads for the ASGI verification API (routes/async_api.py).
+
+The sync client parks a worker thread for every RPC round-trip. Here
+getResult goes through AsyncWeb3 over one shared aiohttp session (keep-alive,
+up to ASYNC_WEB3_POOL_SIZE connections), so a single event loop can have
+hundreds of lookups in flight. The local ResultStored mirror is still asked
+first, on the executor the client is given (its SQLite lookup would block
+the loop), and RPC calls go through the same circuit breaker as the sync path.
+
+Registrations are not sent from here: they stay in the durable outbox
+(blockchain/outbox.py), whose background submitter never blocks a request.
+
+The session belongs to the event loop that created it; build one
+AsyncChainClient per loop (the ASGI lifespan does) and close() it on
+shutdown.
+
+Config (env):
+  ASYNC_WEB3_POOL_SIZE      pooled HTTP connections to the RPC (default 100)
+  WEB3_READ_TIMEOUT_S       per-call timeout, shared with the sync path (default 3)
+"""
+import asyncio
+import logging
+import os
+
+from blockchain.client import WEB3_READ_TIMEOUT_S, rpc_breaker
+from blockchain.indexer import get_mirror
+from blockchain.interact import CONTRACT_ABI, CONTRACT_ADDRESS, RPC_URL, result_from_call
+
+logger = logging.getLogger(__name__)
+
+ASYNC_WEB3_POOL_SIZE = int(os.getenv("ASYNC_WEB3_POOL_SIZE", "100"))
+
+
+class AsyncChainClient:
+    """Lazily connected AsyncWeb3 + DeepfakeLogger contract for one event loop."""
+
+    def __init__(self, rpc_url=RPC_URL, contract_address=CONTRACT_ADDRESS,
+                 pool_size=ASYNC_WEB3_POOL_SIZE, timeout=WEB3_READ_TIMEOUT_S, executor=None):
+        self.rpc_url = rpc_url
+        self.contract_address = contract_address
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.executor = executor  # for the mirror lookup; None = the loop's default executor
+        self._session = None
+        self._contract = None
+        self._lock = asyncio.Lock()
+
+    async def _get_contract(self):
+        if self._contract is not None:
+            return self._contract
+        if not self.rpc_url:
+            raise RuntimeError("RPC_URL/WEB3_RPC_URL not set in environment (.env)")
+        if not self.contract_address:
+            raise RuntimeError("CONTRACT_ADDRESS not set in environment (.env)")
+
+        async with self._lock:
+            if self._contract is None:
+                import aiohttp
+                from web3 import AsyncHTTPProvider, AsyncWeb3
+
+                timeout = aiohttp.ClientTimeout(total=self.timeout)
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.pool_size), timeout=timeout
+                )
+                provider = AsyncHTTPProvider(self.rpc_url, request_kwargs={"timeout": timeout})
+                await provider.cache_async_session(session)
+                w3 = AsyncWeb3(provider)
+                self._session = session
+                self._contract = w3.eth.contract(
+                    address=w3.to_checksum_address(self.contract_address),
+                    abi=CONTRACT_ABI,
+                )
+                logger.info(f"[async_client] AsyncWeb3 ready (pool of {self.pool_size} connections)")
+        return self._contract
+
+    async def get_result(self, content_hash_bytes32: bytes) -> dict | None:
+        """blockchain.interact.get_result without blocking the event loop."""
+        mirror = get_mirror()
+        if mirror is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                answered, cached = await loop.run_in_executor(self.executor, mirror.lookup, content_hash_bytes32)
+                if answered:
+                    return cached
+            except Exception:
+                pass
+
+        contract = await self._get_contract()
+        call = contract.functions.getResult(content_hash_bytes32).call
+        return result_from_call(await rpc_breaker.call_async(call))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._contract = None
@@ -0,0 +1,230 @@
+# blockchain/client.py
+"""
+Managed Web3 client and RPC circuit breaker.
+
+All Web3 instances share one pooled requests.Session (keep-alive, up to
+WEB3_POOL_SIZE connections to the RPC host), so chain calls stop paying a
+TCP/TLS handshake each. Timeouts are set per instance: the interactive
+lookup path asks for Web3Client.w3(timeout=WEB3_READ_TIMEOUT_S), and
+background work (indexer, outbox, warm-up) uses the longer WEB3_TIMEOUT_S.
+
+rpc_breaker guards the calls made on the request path. After
+BREAKER_FAILURE_THRESHOLD consecutive failures it opens: for
+BREAKER_RESET_SECONDS calls fail immediately with CircuitOpenError, and
+routes take the ML-only fallback instead of waiting out the HTTP timeout.
+After that one trial call is let through (half-open). If it succeeds the
+breaker closes; if it fails the breaker opens again.
+
+Config (env):
+  WEB3_POOL_SIZE              pooled HTTP connections to the RPC (default 10)
+  WEB3_TIMEOUT_S              default per-request timeout (default 10)
+  WEB3_READ_TIMEOUT_S         timeout for request-path reads (default 3)
+  BREAKER_FAILURE_THRESHOLD   consecutive failures that open it (default 5)
+  BREAKER_RESET_SECONDS       how long it stays open (default 30)
+"""
+import logging
+import os
+import threading
+import time
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+WEB3_POOL_SIZE = int(os.getenv("WEB3_POOL_SIZE", "10"))
+WEB3_TIMEOUT_S = float(os.getenv("WEB3_TIMEOUT_S", "10"))
+WEB3_READ_TIMEOUT_S = float(os.getenv("WEB3_READ_TIMEOUT_S", "3"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = metrics.gauge(
+    "chain_breaker_state",
+    "RPC circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ("breaker",),
+)
+BREAKER_TRANSITIONS = metrics.counter(
+    "chain_breaker_transitions_total",
+    "RPC circuit breaker state changes, by new state.",
+    ("breaker", "state"),
+)
+RPC_CALLS = metrics.counter(
+    "chain_rpc_calls_total",
+    "RPC calls made through the circuit breaker, by result.",
+    ("breaker", "result"),
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """The RPC circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker (closed -> open -> half-open -> closed).
+
+    failure_threshold: consecutive failures that open the breaker
+    reset_seconds: how long it stays open before a single trial call
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = max(0.0, float(reset_seconds))
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        BREAKER_STATE.set(_STATE_VALUES[CLOSED], breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        if state == self._state:
+            return
+        logger.warning(f"[client] Circuit breaker '{self.name}': {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._trial_in_flight = False
+        BREAKER_STATE.set(_STATE_VALUES[state], breaker=self.name)
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now (claims the trial slot when half-open)."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._transition(CLOSED)
+        RPC_CALLS.inc(breaker=self.name, result="ok")
+
+    def release_trial(self):
+        """Give back the half-open trial slot without a verdict (the call was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+        RPC_CALLS.inc(breaker=self.name, result="error")
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker; raises CircuitOpenError while it is open."""
+        if not self.allow():
+            RPC_CALLS.inc(breaker=self.name, result="short_circuit")
+            raise CircuitOpenError(f"circuit breaker '{self.name}' is open; skipping RPC call")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:  # cancelled or interrupted: says nothing about the endpoint
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """call() for a coroutine function (AsyncWeb3 calls, see blockchain/async_client.py)."""
+        if not self.allow():
+            RPC_CALLS.inc(breaker=self.name, result="short_circuit")
+            raise CircuitOpenError(f"circuit breaker '{self.name}' is open; skipping RPC call")
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:  # cancelled or interrupted: says nothing about the endpoint
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+
+class Web3Client:
+    """
+    Lazily built Web3 instances for one RPC endpoint over a shared pooled session.
+
+    w3(timeout) returns a Web3 whose requests use that timeout; instances
+    are cached per timeout and all share the same keep-alive connections.
+    """
+
+    def __init__(self, rpc_url, pool_size=WEB3_POOL_SIZE, timeout=WEB3_TIMEOUT_S):
+        self.rpc_url = rpc_url
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self._session = None
+        self._instances = {}
+        self._pinned = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def pin(self, w3):
+        """Serve this Web3 for every timeout instead of RPC_URL (in-process chains, benchmarks)."""
+        self._pinned = w3
+
+    def w3(self, timeout=None):
+        if self._pinned is not None:
+            return self._pinned
+        if not self.rpc_url:
+            raise RuntimeError("RPC_URL/WEB3_RPC_URL not set in environment (.env)")
+        timeout = self.timeout if timeout is None else timeout
+        instance = self._instances.get(timeout)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(timeout)
+                if instance is None:
+                    from web3 import Web3
+
+                    provider = Web3.HTTPProvider(
+                        self.rpc_url,
+                        request_kwargs={"timeout": timeout},
+                        session=self._get_session(),
+                    )
+                    instance = Web3(provider)
+                    self._instances[timeout] = instance
+        return instance
+
+
+# Shared by every request-path RPC call in this process
+rpc_breaker = CircuitBreaker("rpc")
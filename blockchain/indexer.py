@@ -0,0 +1,339 @@
+# blockchain/indexer.py
+"""
+Local mirror of DeepfakeLogger results, built from ResultStored events.
+
+A background indexer (one per box, elected with a file lock) follows the
+contract's ResultStored logs from a checkpointed block using chunked
+eth_getLogs ranges and keeps a SQLite table of
+    contentHash -> (label, confidence, timestamp, recorder)
+that every worker can read. blockchain.interact.get_result answers from it
+while it is fresh and only falls back to an eth_call when the mirror is
+behind or unavailable.
+
+Config (env):
+  CHAIN_INDEXER_ENABLED       run the indexer thread at all (default true)
+  INDEXER_START_BLOCK         first block of the initial backfill (contract
+                              deployment block; default 0)
+  INDEXER_CHUNK_SIZE          max blocks per eth_getLogs call (default 2000)
+  INDEXER_CONFIRMATIONS       blocks to stay behind head (default 3)
+  INDEXER_POLL_SECONDS        sleep between polls once caught up (default 4)
+  INDEXER_MAX_STALENESS_S     how old the last successful poll may be for a
+                              mirror miss to be trusted (default 30)
+"""
+import logging
+import os
+import threading
+import time
+
+from utils import metrics
+from utils.local_store import connect, try_acquire_leader
+
+logger = logging.getLogger(__name__)
+
+CHAIN_INDEXER_ENABLED = os.getenv("CHAIN_INDEXER_ENABLED", "True").lower() == "true"
+INDEXER_DB = os.getenv("INDEXER_DB", "chain_mirror.sqlite3")
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
+INDEXER_CHUNK_SIZE = int(os.getenv("INDEXER_CHUNK_SIZE", "2000"))
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "3"))
+INDEXER_POLL_SECONDS = float(os.getenv("INDEXER_POLL_SECONDS", "4"))
+INDEXER_MAX_STALENESS_S = float(os.getenv("INDEXER_MAX_STALENESS_S", "30"))
+
+RESULT_STORED_SIGNATURE = "ResultStored(bytes32,string,uint256,uint256,address)"
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+LOOKUPS = metrics.counter(
+    "chain_mirror_lookups_total",
+    "get_result lookups answered by the local mirror, by result.",
+    ("result",),
+)
+EVENTS_INDEXED = metrics.counter(
+    "chain_indexer_events_total",
+    "ResultStored events written to the local mirror.",
+)
+LAG_BLOCKS = metrics.gauge(
+    "chain_indexer_lag_blocks",
+    "Blocks between the chain head and the indexer checkpoint.",
+)
+STALENESS = metrics.gauge(
+    "chain_indexer_staleness_seconds",
+    "Seconds since the indexer last completed a poll.",
+)
+
+
+class ChainMirror:
+    """Read/write access to the SQLite mirror (safe to use from any worker)."""
+
+    def __init__(self, db_filename=INDEXER_DB):
+        self.db_filename = db_filename
+        self._db().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS onchain_results (
+                content_hash TEXT PRIMARY KEY,
+                label        TEXT NOT NULL,
+                confidence   INTEGER NOT NULL,
+                timestamp    INTEGER NOT NULL,
+                recorder     TEXT NOT NULL,
+                block_number INTEGER NOT NULL,
+                log_index    INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS indexer_state (
+                key   TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            );
+            """
+        )
+
+    def _db(self):
+        return connect(self.db_filename)
+
+    # --- State ---
+
+    def _get_state(self, key, default=None):
+        row = self._db().execute("SELECT value FROM indexer_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def checkpoint(self):
+        """Last fully indexed block, or None before the first backfill chunk."""
+        value = self._get_state("checkpoint")
+        return int(value) if value is not None else None
+
+    def head(self):
+        value = self._get_state("head")
+        return int(value) if value is not None else None
+
+    def last_poll(self):
+        return self._get_state("last_poll", 0.0)
+
+    def lag_blocks(self):
+        head, checkpoint = self.head(), self.checkpoint()
+        if head is None or checkpoint is None:
+            return 0
+        return max(0, head - checkpoint)
+
+    def staleness_seconds(self):
+        last = self.last_poll()
+        return time.time() - last if last else float("inf")
+
+    def is_fresh(self):
+        """True when a miss in the mirror can be trusted as 'not on chain'."""
+        return (
+            self.checkpoint() is not None
+            and self.lag_blocks() <= INDEXER_CONFIRMATIONS
+            and self.staleness_seconds() <= INDEXER_MAX_STALENESS_S
+        )
+
+    # --- Writes ---
+
+    def apply(self, events, checkpoint=None, head=None):
+        """
+        Upsert decoded ResultStored events and advance the checkpoint atomically.
+
+        events: iterable of dicts with content_hash (bytes), label, confidence
+        (scaled int), timestamp, recorder, block_number, log_index. The contract
+        overwrites on re-store, so the newest (block, log index) wins.
+        """
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            count = 0
+            for ev in events:
+                db.execute(
+                    """
+                    INSERT INTO onchain_results
+                        (content_hash, label, confidence, timestamp, recorder, block_number, log_index)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        label = excluded.label,
+                        confidence = excluded.confidence,
+                        timestamp = excluded.timestamp,
+                        recorder = excluded.recorder,
+                        block_number = excluded.block_number,
+                        log_index = excluded.log_index
+                    WHERE (excluded.block_number, excluded.log_index)
+                          > (onchain_results.block_number, onchain_results.log_index)
+                    """,
+                    (
+                        bytes(ev["content_hash"]).hex(),
+                        ev["label"],
+                        int(ev["confidence"]),
+                        int(ev["timestamp"]),
+                        ev["recorder"],
+                        int(ev["block_number"]),
+                        int(ev["log_index"]),
+                    ),
+                )
+                count += 1
+            now = time.time()
+            if checkpoint is not None:
+                db.execute("INSERT OR REPLACE INTO indexer_state VALUES ('checkpoint', ?)", (checkpoint,))
+            if head is not None:
+                db.execute("INSERT OR REPLACE INTO indexer_state VALUES ('head', ?)", (head,))
+                db.execute("INSERT OR REPLACE INTO indexer_state VALUES ('last_poll', ?)", (now,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        EVENTS_INDEXED.inc(count)
+
+    # --- Reads ---
+
+    def lookup(self, content_hash_bytes32: bytes):
+        """
+        Returns (answered, result).
+
+        answered is False when the mirror cannot be trusted for a miss and the
+        caller should ask the RPC. result uses the same dict shape as
+        blockchain.interact.get_result, or None if nothing is stored.
+        """
+        row = self._db().execute(
+            "SELECT label, confidence, timestamp, recorder FROM onchain_results WHERE content_hash = ?",
+            (bytes(content_hash_bytes32).hex(),),
+        ).fetchone()
+
+        if row is not None:
+            LOOKUPS.inc(result="hit")
+            label, confidence, timestamp, recorder = row
+            return True, {
+                "contentHash": bytes(content_hash_bytes32),
+                "label": label,
+                "confidence": confidence / 10000.0,  # back to 0–1 range
+                "timestamp": timestamp,
+                "recorder": recorder,
+            }
+
+        if self.is_fresh():
+            LOOKUPS.inc(result="miss")
+            return True, None
+
+        LOOKUPS.inc(result="stale")
+        return False, None
+
+
+def _decode_logs(event, logs):
+    for log in logs:
+        decoded = event.process_log(log)
+        args = decoded["args"]
+        yield {
+            "content_hash": args["contentHash"],
+            "label": args["label"],
+            "confidence": args["confidence"],
+            "timestamp": args["timestamp"],
+            "recorder": args["recorder"],
+            "block_number": decoded["blockNumber"],
+            "log_index": decoded["logIndex"],
+        }
+
+
+class ChainIndexer(threading.Thread):
+    """Backfills and then follows ResultStored logs into a ChainMirror."""
+
+    def __init__(self, w3, contract, mirror, start_block=INDEXER_START_BLOCK,
+                 chunk_size=INDEXER_CHUNK_SIZE, confirmations=INDEXER_CONFIRMATIONS,
+                 poll_seconds=INDEXER_POLL_SECONDS):
+        super().__init__(name="chain-indexer", daemon=True)
+        self.w3 = w3
+        self.contract = contract
+        self.mirror = mirror
+        self.start_block = start_block
+        self.max_chunk = max(1, chunk_size)
+        self.chunk = self.max_chunk
+        self.confirmations = max(0, confirmations)
+        self.poll_seconds = poll_seconds
+        self._stop_event = threading.Event()
+        self._event = contract.events.ResultStored()
+        self._topic = "0x" + w3.keccak(text=RESULT_STORED_SIGNATURE).hex().removeprefix("0x")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _fetch(self, from_block, to_block):
+        return self.w3.eth.get_logs({
+            "address": self.contract.address,
+            "topics": [self._topic],
+            "fromBlock": from_block,
+            "toBlock": to_block,
+        })
+
+    def sync_once(self):
+        """Index everything up to head - confirmations; returns blocks processed."""
+        head = self.w3.eth.block_number
+        target = head - self.confirmations
+        checkpoint = self.mirror.checkpoint()
+        next_block = self.start_block if checkpoint is None else checkpoint + 1
+        processed = 0
+
+        while next_block <= target and not self._stop_event.is_set():
+            to_block = min(next_block + self.chunk - 1, target)
+            try:
+                logs = self._fetch(next_block, to_block)
+            except Exception as e:
+                # Providers cap result counts / ranges: halve the window and retry
+                if self.chunk > 1:
+                    self.chunk = max(1, self.chunk // 2)
+                    logger.warning(
+                        f"[indexer] get_logs {next_block}-{to_block} failed ({e}); "
+                        f"retrying with chunk size {self.chunk}"
+                    )
+                    continue
+                raise
+
+            self.mirror.apply(_decode_logs(self._event, logs), checkpoint=to_block, head=head)
+            processed += to_block - next_block + 1
+            next_block = to_block + 1
+            # Grow back towards the configured chunk after successful calls
+            self.chunk = min(self.max_chunk, self.chunk * 2)
+
+        if processed == 0:
+            # Nothing new, but record that we are caught up as of now
+            self.mirror.apply((), head=head)
+        return processed
+
+    def run(self):
+        logger.info(
+            f"[indexer] Following ResultStored from block "
+            f"{self.mirror.checkpoint() if self.mirror.checkpoint() is not None else self.start_block}"
+        )
+        while not self._stop_event.is_set():
+            try:
+                processed = self.sync_once()
+            except Exception as e:
+                logger.warning(f"[indexer] Sync failed: {e}")
+                processed = 0
+            if processed == 0:
+                self._stop_event.wait(self.poll_seconds)
+
+
+# --- Module-level wiring ---
+
+_mirror = None
+_indexer = None
+
+
+def get_mirror():
+    """Shared ChainMirror for this process, or None if the mirror cannot be opened."""
+    global _mirror
+    if _mirror is None:
+        try:
+            _mirror = ChainMirror()
+            LAG_BLOCKS.set_function(_mirror.lag_blocks)
+            STALENESS.set_function(_mirror.staleness_seconds)
+        except Exception as e:
+            logger.error(f"[indexer] Local chain mirror unavailable: {e}")
+            return None
+    return _mirror
+
+
+def start_indexer(w3, contract):
+    """Start the background indexer in this process if it wins the per-box election."""
+    global _indexer
+    if not CHAIN_INDEXER_ENABLED or _indexer is not None:
+        return _indexer
+
+    mirror = get_mirror()
+    if mirror is None or not try_acquire_leader("chain_indexer"):
+        return None
+
+    _indexer = ChainIndexer(w3, contract, mirror)
+    _indexer.start()
+    return _indexer
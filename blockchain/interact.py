@@ -1,8 +1,8 @@
 import os
 import json
+import threading
 from pathlib import Path
 
-from web3 import Web3
 from dotenv import load_dotenv
 
 # Load variables from .env (for local dev)
@@ -16,17 +16,6 @@ CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
 CHAIN_ID = int(os.getenv("CHAIN_ID", "11155111"))  # Sepolia default
 
-if not RPC_URL or not CONTRACT_ADDRESS:
-    raise RuntimeError("RPC_URL/WEB3_RPC_URL or CONTRACT_ADDRESS not set in environment (.env)")
-
-
-# --- Connect to Sepolia ---
-
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
-if not w3.is_connected():
-    raise RuntimeError("Web3 not connected. Check RPC_URL/WEB3_RPC_URL and internet connection.")
-
-
 # --- Load ABI ---
 
 ABI_PATH = Path(__file__).resolve().parent.parent / "abi" / "DeepfakeLogger.json"
@@ -37,61 +26,250 @@ if not ABI_PATH.exists():
 with open(ABI_PATH, "r") as f:
     CONTRACT_ABI = json.load(f)
 
-contract = w3.eth.contract(
-    address=Web3.to_checksum_address(CONTRACT_ADDRESS),
-    abi=CONTRACT_ABI,
-)
+
+# --- Connect to Sepolia (lazily) ---
+#
+# Importing web3 and building the client is deferred to first use (normally
+# the background warm-up in utils/startup.py), so importing this module is
+# cheap and never touches the network. A missing RPC_URL/CONTRACT_ADDRESS
+# or an RPC outage only disables the chain side; the app still serves
+# ML-only verification. Connections are pooled and request-path calls go
+# through the circuit breaker in blockchain/client.py.
+
+from blockchain.client import Web3Client, rpc_breaker, WEB3_READ_TIMEOUT_S
+
+_client = Web3Client(RPC_URL)
+_contracts = {}
+_contract_lock = threading.Lock()
+
+
+def get_w3(timeout=None):
+    """Web3 client for RPC_URL (per-request timeout in seconds; default WEB3_TIMEOUT_S)."""
+    return _client.w3(timeout)
+
+
+def get_contract(timeout=None):
+    """DeepfakeLogger contract bound to get_w3(timeout)."""
+    w3 = get_w3(timeout)
+    contract = _contracts.get(id(w3))
+    if contract is None:
+        if not CONTRACT_ADDRESS:
+            raise RuntimeError("CONTRACT_ADDRESS not set in environment (.env)")
+        with _contract_lock:
+            contract = _contracts.get(id(w3))
+            if contract is None:
+                contract = w3.eth.contract(
+                    address=w3.to_checksum_address(CONTRACT_ADDRESS),
+                    abi=CONTRACT_ABI,
+                )
+                _contracts[id(w3)] = contract
+    return contract
+
+
+def check_connection():
+    """Raise RuntimeError unless the RPC answers (used by the warm-up, not at import)."""
+    def probe():
+        if not get_w3().is_connected():
+            raise RuntimeError("Web3 not connected. Check RPC_URL/WEB3_RPC_URL and internet connection.")
+
+    rpc_breaker.call(probe)
+
+
+# --- Local mirror of on-chain results (see blockchain/indexer.py) ---
+
+from blockchain.indexer import get_mirror, start_indexer
+
+
+def start_chain_indexer():
+    """Start the ResultStored indexer (only one worker per box actually runs it)."""
+    return start_indexer(get_w3(), get_contract())
 
 
 # --- Helper functions ---
 
-from web3.exceptions import TransactionNotFound
+
+def scale_confidence(confidence: float) -> int:
+    """Scale confidence to 0–10000 as the contract expects."""
+    conf_scaled = int(confidence * 10000)
+    if conf_scaled > 10000:
+        conf_scaled = 10000
+    return conf_scaled
+
+
+# --- Shared signer (account, local nonces, cached gas price) ---
+
+from blockchain.signer import TransactionSigner
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_signer() -> TransactionSigner:
+    """Process-wide TransactionSigner for PRIVATE_KEY (created on first use)."""
+    global _signer
+    if not PRIVATE_KEY:
+        raise RuntimeError("PRIVATE_KEY not set in environment")
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                _signer = TransactionSigner(get_w3(), PRIVATE_KEY, CHAIN_ID)
+    return _signer
+
+
+def suggested_gas_price() -> int:
+    """Suggested gas price bumped +20% (against 'underpriced'), served from the signer's cache."""
+    return get_signer().gas_price()
+
+
+def signer_address() -> str:
+    return get_signer().address
+
+
+def sign_store_result(content_hash_bytes32: bytes, label: str, confidence: float,
+                      nonce: int, gas_price: int):
+    """
+    Build and sign (but do not send) a storeResult transaction.
+
+    The signed transaction's hash is known before broadcasting, which lets
+    the outbox persist it first and re-broadcast the exact same bytes after
+    a crash.
+    """
+    return get_signer().sign(
+        get_contract().functions.storeResult(
+            content_hash_bytes32,
+            label,
+            scale_confidence(confidence)
+        ),
+        gas=300000,
+        nonce=nonce,
+        gas_price=gas_price,
+    )
+
+
+# Gas limit for storeResults: the node's eth_estimateGas times BATCH_GAS_MARGIN.
+# If estimation fails, fixed part + per image. Each image costs about 118k from
+# the EVM gas schedule (5 fresh storage slots at 22.1k, a LOG2 with 192 bytes
+# of data at ~2.7k, ~1.1k of calldata, ABI decoding and the loop) on top of
+# the 21k transaction base, so the fallback keeps a wide margin.
+# benchmarks/gas_per_image.py fits both numbers from real receipts.
+# (storeResult uses a flat 300k.)
+BATCH_GAS_MARGIN = float(os.getenv("BATCH_GAS_MARGIN", "1.2"))
+BATCH_GAS_BASE = int(os.getenv("BATCH_GAS_BASE", "60000"))
+BATCH_GAS_PER_ITEM = int(os.getenv("BATCH_GAS_PER_ITEM", "160000"))
+
+
+def _batch_gas(call, count: int) -> int:
+    """Gas limit for a storeResults call of count images."""
+    try:
+        return int(call.estimate_gas({"from": get_signer().address}) * BATCH_GAS_MARGIN)
+    except Exception:
+        return BATCH_GAS_BASE + BATCH_GAS_PER_ITEM * count
+
+
+def sign_store_results(items, nonce: int, gas_price: int):
+    """
+    Build and sign (but do not send) one storeResults transaction.
+
+    items: list of (content_hash_bytes32, label, confidence) tuples.
+    A single item falls back to storeResult, so batches of one also work
+    against contracts deployed before storeResults existed.
+    """
+    if len(items) == 1:
+        content_hash_bytes32, label, confidence = items[0]
+        return sign_store_result(content_hash_bytes32, label, confidence,
+                                 nonce=nonce, gas_price=gas_price)
+
+    call = get_contract().functions.storeResults(
+        [h for h, _, _ in items],
+        [label for _, label, _ in items],
+        [scale_confidence(conf) for _, _, conf in items],
+    )
+    return get_signer().sign(
+        call,
+        gas=_batch_gas(call, len(items)),
+        nonce=nonce,
+        gas_price=gas_price,
+    )
+
+
+class RegistrationBatcher:
+    """
+    Groups pending registrations into storeResults batches by count or age.
+
+    A batch is released as soon as it has max_count items, or once its
+    oldest item has waited max_age_s seconds. Items only need a created_at
+    datetime (e.g. ChainRegistration rows) and must be passed oldest first.
+    """
+
+    def __init__(self, max_count=1, max_age_s=0.0):
+        self.max_count = max(1, int(max_count))
+        self.max_age_s = max(0.0, float(max_age_s))
+
+    def ready_batches(self, items, now):
+        batches = []
+        for i in range(0, len(items), self.max_count):
+            batch = items[i:i + self.max_count]
+            if len(batch) == self.max_count:
+                batches.append(batch)
+                continue
+            oldest = batch[0].created_at
+            if oldest is None or (now - oldest).total_seconds() >= self.max_age_s:
+                batches.append(batch)
+        return batches
 
 
 def store_result(content_hash_bytes32: bytes, label: str, confidence: float):
     """
-    Write result to blockchain.
+    Write result to blockchain and wait until it is mined.
 
     content_hash_bytes32: 32-byte hash (e.g. hashlib.sha256(image_bytes).digest())
     label: 'real' or 'fake'
     confidence: float between 0 and 1
-    """
-    if not PRIVATE_KEY:
-        raise RuntimeError("PRIVATE_KEY not set in environment")
 
-    account = w3.eth.account.from_key(PRIVATE_KEY)
+    The web app registers through the asynchronous outbox
+    (blockchain/outbox.py); this blocking path is kept for scripts.
+    Nonce and gas price come from the shared signer, so submitting costs a
+    single send_raw_transaction.
+    """
+    tx_hash = get_signer().send(
+        get_contract().functions.storeResult(
+            content_hash_bytes32,
+            label,
+            scale_confidence(confidence)
+        ),
+        gas=300000,
+    )
 
-    # Use 'pending' so we include in-flight txs and avoid nonce clashes
-    nonce = w3.eth.get_transaction_count(account.address, 'pending')
+    # Wait until mined
+    receipt = get_w3().eth.wait_for_transaction_receipt(tx_hash)
 
-    # Scale confidence to 0–10000 as contract expects
-    conf_scaled = int(confidence * 10000)
-    if conf_scaled > 10000:
-        conf_scaled = 10000
+    record_receipt_in_mirror(receipt)
 
-    # Take suggested gas price and bump it a bit to avoid 'underpriced' errors
-    base_gas_price = w3.eth.gas_price
-    gas_price = int(base_gas_price * 1.2)  # +20%
-
-    tx = contract.functions.storeResult(
-        content_hash_bytes32,
-        label,
-        conf_scaled
-    ).build_transaction({
-        "from": account.address,
-        "nonce": nonce,
-        "chainId": CHAIN_ID,
-        "gas": 300000,
-        "gasPrice": gas_price,
-    })
-
-    signed_tx = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    return receipt
 
-    # Wait until mined
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
 
-    return receipt
+def record_receipt_in_mirror(receipt):
+    """Write our own ResultStored events through to the local mirror right away."""
+    mirror = get_mirror()
+    if mirror is None:
+        return
+    try:
+        events = get_contract().events.ResultStored().process_receipt(receipt)
+        mirror.apply(
+            {
+                "content_hash": ev["args"]["contentHash"],
+                "label": ev["args"]["label"],
+                "confidence": ev["args"]["confidence"],
+                "timestamp": ev["args"]["timestamp"],
+                "recorder": ev["args"]["recorder"],
+                "block_number": ev["blockNumber"],
+                "log_index": ev["logIndex"],
+            }
+            for ev in events
+        )
+    except Exception:
+        # The indexer will pick the event up on its next poll anyway
+        pass
 
 
 def get_result(content_hash_bytes32: bytes) -> dict | None:
@@ -111,8 +289,37 @@ def get_result(content_hash_bytes32: bytes) -> dict | None:
       }
 
     If no record is stored for that hash, we return None.
+
+    Answered from the local ResultStored mirror when it is up to date; the
+    eth_call is only made while the indexer has not caught up (or the mirror
+    is unavailable).
     """
-    result = contract.functions.getResult(content_hash_bytes32).call()
+    mirror = get_mirror()
+    if mirror is not None:
+        try:
+            answered, cached = mirror.lookup(content_hash_bytes32)
+            if answered:
+                return cached
+        except Exception:
+            pass
+
+    return _get_result_rpc(content_hash_bytes32)
+
+
+def _get_result_rpc(content_hash_bytes32: bytes) -> dict | None:
+    """
+    get_result straight from the contract (eth_call), bypassing the mirror.
+
+    Uses the short read timeout and the circuit breaker: while the RPC is
+    failing this raises CircuitOpenError at once, and callers fall back to
+    ML-only verification.
+    """
+    call = get_contract(WEB3_READ_TIMEOUT_S).functions.getResult(content_hash_bytes32).call
+    return result_from_call(rpc_breaker.call(call))
+
+
+def result_from_call(result) -> dict | None:
+    """getResult's return tuple as the get_result() dict (None for the empty default struct)."""
     (content_hash, label, confidence, timestamp, recorder) = result
 
     # Detect "empty" default struct:
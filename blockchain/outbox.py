@@ -0,0 +1,410 @@
+# blockchain/outbox.py
+"""
+Durable, asynchronous outbox for on-chain registrations.
+
+/analyze no longer waits for a REAL image's storeResult transaction to be
+mined. It writes a ChainRegistration row (status "pending") and returns;
+a background submitter signs and broadcasts pending rows, keeps up to
+OUTBOX_MAX_IN_FLIGHT transactions in flight, tracks receipts and
+re-broadcasts stuck transactions with a gas bump.
+
+One submitter for the whole deployment: ChainRegistration lives in the
+shared database and nonces are allocated locally, so two submitters would
+pick up the same pending rows and race for nonces. Each box elects one
+candidate with a file lock, and a candidate only works while it holds the
+OutboxLease row in the database, renewed on every tick and taken over by
+another box's candidate once it has not been renewed for OUTBOX_LEASE_S.
+A candidate that takes the lease resyncs its nonces and resumes whatever
+the previous holder left in flight.
+
+With OUTBOX_BATCH_SIZE > 1 pending rows are grouped (by count, or once the
+oldest has waited OUTBOX_BATCH_MAX_AGE_S) into one storeResults transaction;
+all rows of a batch share its nonce and tx hash.
+
+Crash safety: a row's nonce, tx hash and signed bytes are committed *before*
+the transaction is broadcast. After a restart every "submitted" row is
+re-broadcast with exactly the same bytes, so a registration can never be
+sent twice under two different nonces.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.chain_registration import ChainRegistration, OutboxLease
+from blockchain.interact import (
+    RegistrationBatcher,
+    get_signer,
+    get_w3,
+    record_receipt_in_mirror,
+    sign_store_results,
+)
+from utils import metrics
+from utils.local_store import try_acquire_leader
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "True").lower() == "true"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "4"))
+OUTBOX_BUMP_AFTER_S = float(os.getenv("OUTBOX_BUMP_AFTER_S", "90"))
+OUTBOX_GAS_BUMP = float(os.getenv("OUTBOX_GAS_BUMP", "1.15"))  # replacements need >= +10%
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+# Batching via storeResults (needs the contract redeployed with storeResults)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "1"))
+OUTBOX_BATCH_MAX_AGE_S = float(os.getenv("OUTBOX_BATCH_MAX_AGE_S", "10"))
+# Seconds without renewal before another box may take over the submitter
+# (well above a tick; also absorbs clock skew between hosts)
+OUTBOX_LEASE_S = float(os.getenv("OUTBOX_LEASE_S", "60"))
+
+LEASE_NAME = "chain_outbox"
+
+TRANSITIONS = metrics.counter(
+    "chain_outbox_transitions_total",
+    "Outbox registrations entering each status.",
+    ("status",),
+)
+BROADCASTS = metrics.counter(
+    "chain_outbox_broadcasts_total",
+    "Raw transactions broadcast by the outbox submitter, by reason.",
+    ("reason",),
+)
+
+
+def _hex(value) -> str:
+    h = value.hex() if isinstance(value, (bytes, bytearray)) else str(value)
+    return "0x" + h.removeprefix("0x")
+
+
+def _clear_submission(row):
+    """Forget the row's nonce and transactions so it is signed from scratch."""
+    row.nonce = None
+    row.gas_price = None
+    row.tx_hash = None
+    row.tx_hashes = None
+    row.raw_tx = None
+    row.submitted_at = None
+
+
+# --- Request-side API ---
+
+def enqueue_registration(image_hash: str, label: str, confidence: float, phash: str = None) -> ChainRegistration:
+    """
+    Record that image_hash should be registered on-chain; returns immediately.
+
+    Idempotent per hash: an existing row is returned as is, except that a
+    previously failed row is put back to "pending".
+    """
+    row = ChainRegistration.query.filter_by(image_hash=image_hash).first()
+    if row is not None:
+        if row.status == 'failed':
+            # A fresh transaction: the old hashes must not be matched to its receipt
+            _clear_submission(row)
+            row.status = 'pending'
+            row.attempts = 0
+            row.last_error = None
+            row.block_number = None
+            db.session.commit()
+            TRANSITIONS.inc(status='pending')
+        return row
+
+    row = ChainRegistration(image_hash=image_hash, label=label, confidence=float(confidence), phash=phash)
+    db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Same image enqueued concurrently by another request
+        db.session.rollback()
+        return ChainRegistration.query.filter_by(image_hash=image_hash).first()
+
+    TRANSITIONS.inc(status='pending')
+    return row
+
+
+def registration_status(image_hash: str):
+    """Outbox row for image_hash as a dict, or None if it was never enqueued."""
+    row = ChainRegistration.query.filter_by(image_hash=image_hash).first()
+    return row.to_dict() if row is not None else None
+
+
+# --- Background submitter ---
+
+class OutboxSubmitter(threading.Thread):
+    """
+    Signs, broadcasts and tracks ChainRegistration rows.
+
+    Each transaction covers a "group": the rows sharing one nonce (a single
+    row, or a storeResults batch).
+    """
+
+    def __init__(self, app, poll_seconds=OUTBOX_POLL_SECONDS, max_in_flight=OUTBOX_MAX_IN_FLIGHT,
+                 batch_size=OUTBOX_BATCH_SIZE, batch_max_age_s=OUTBOX_BATCH_MAX_AGE_S):
+        super().__init__(name="chain-outbox", daemon=True)
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self.max_in_flight = max(1, max_in_flight)
+        self.batcher = RegistrationBatcher(max_count=batch_size, max_age_s=batch_max_age_s)
+        self._stop_event = threading.Event()
+        self._resumed = False
+        self._signer = None
+        self._holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leader = False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    self.tick()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"[outbox] Submitter tick failed: {e}")
+                finally:
+                    db.session.remove()
+                self._stop_event.wait(self.poll_seconds)
+
+    def tick(self):
+        if not self._hold_lease():
+            return
+        if self._signer is None:
+            self._signer = get_signer()
+        if not self._resumed:
+            self._resume()
+            self._resumed = True
+        self._track_submitted()
+        self._submit_pending()
+
+    # --- Lease ---
+
+    def _hold_lease(self) -> bool:
+        """Take or renew the deployment-wide lease; False if another process holds it."""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=OUTBOX_LEASE_S)
+        renewed = db.session.execute(
+            update(OutboxLease)
+            .where(OutboxLease.name == LEASE_NAME)
+            .where(or_(OutboxLease.holder == self._holder, OutboxLease.expires_at < now))
+            .values(holder=self._holder, expires_at=expires_at)
+        ).rowcount
+        if not renewed:
+            db.session.add(OutboxLease(name=LEASE_NAME, holder=self._holder, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:  # the row exists and someone else holds it
+            db.session.rollback()
+            renewed = False
+        else:
+            renewed = True
+
+        if renewed and not self._leader:
+            logger.info(f"[outbox] Took the submitter lease ({self._holder})")
+            # Another process may have used nonces and left rows in flight
+            if self._signer is not None:
+                self._signer.resync()
+            self._resumed = False
+        elif not renewed and self._leader:
+            logger.warning(f"[outbox] Lost the submitter lease ({self._holder})")
+        self._leader = renewed
+        return renewed
+
+    # --- Helpers ---
+
+    def _in_flight_groups(self):
+        """Submitted rows grouped by nonce, lowest nonce first."""
+        rows = ChainRegistration.query.filter_by(status='submitted').order_by(
+            ChainRegistration.nonce, ChainRegistration.id
+        ).all()
+        groups = defaultdict(list)
+        for row in rows:
+            groups[row.nonce].append(row)
+        return [groups[nonce] for nonce in sorted(groups)]
+
+    def _next_nonce(self) -> int:
+        """Next nonce from the shared signer (local counter, no RPC once synced)."""
+        return self._signer.allocate_nonce()
+
+    def _sign(self, group, nonce, gas_price):
+        signed = sign_store_results(
+            [(bytes.fromhex(row.image_hash), row.label, row.confidence) for row in group],
+            nonce=nonce, gas_price=gas_price,
+        )
+        tx_hash = _hex(signed.hash)
+        raw_tx = _hex(signed.raw_transaction)
+        now = datetime.utcnow()
+        for row in group:
+            row.nonce = nonce
+            row.gas_price = gas_price
+            row.tx_hash = tx_hash
+            row.tx_hashes = f"{row.tx_hashes},{tx_hash}" if row.tx_hashes else tx_hash
+            row.raw_tx = raw_tx
+            row.submitted_at = now
+
+    def _broadcast(self, group, reason):
+        lead = group[0]
+        try:
+            get_w3().eth.send_raw_transaction(bytes.fromhex(lead.raw_tx.removeprefix("0x")))
+            BROADCASTS.inc(reason=reason)
+        except Exception as e:
+            msg = str(e).lower()
+            if "already known" in msg or "known transaction" in msg:
+                return
+            # "nonce too low" etc. are resolved by _track_submitted on the next tick
+            for row in group:
+                row.last_error = str(e)
+            db.session.commit()
+            logger.warning(f"[outbox] Broadcast of nonce {lead.nonce} ({len(group)} images) failed: {e}")
+
+    def _find_receipt(self, group):
+        from web3.exceptions import TransactionNotFound
+
+        w3 = get_w3()
+        for tx_hash in (group[0].tx_hashes or "").split(","):
+            if not tx_hash:
+                continue
+            try:
+                return w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    # --- Steps ---
+
+    def _resume(self):
+        """Re-broadcast everything that was in flight when the process stopped."""
+        groups = self._in_flight_groups()
+        if groups:
+            # Nonces persisted before the crash may not have reached the node yet
+            self._signer.reserve_through(groups[-1][0].nonce)
+        for group in groups:
+            self._broadcast(group, reason='resume')
+        if groups:
+            logger.info(f"[outbox] Resumed {len(groups)} in-flight transactions")
+
+    def _submit_pending(self):
+        in_flight = db.session.query(func.count(func.distinct(ChainRegistration.nonce))).filter(
+            ChainRegistration.status == 'submitted'
+        ).scalar() or 0
+        slots = self.max_in_flight - in_flight
+        if slots <= 0:
+            return
+
+        rows = (
+            ChainRegistration.query.filter_by(status='pending')
+            .order_by(ChainRegistration.id)
+            .limit(slots * self.batcher.max_count)
+            .all()
+        )
+        batches = self.batcher.ready_batches(rows, datetime.utcnow())
+        if not batches:
+            return
+
+        # Never hand out a nonce that an in-flight row already holds
+        db_max = db.session.query(func.max(ChainRegistration.nonce)).filter(
+            ChainRegistration.status == 'submitted'
+        ).scalar()
+        if db_max is not None:
+            self._signer.reserve_through(db_max)
+
+        gas_price = self._signer.gas_price()
+        for group in batches:
+            if not self._hold_lease():
+                return
+            nonce = self._next_nonce()
+            self._sign(group, nonce, gas_price)
+            for row in group:
+                row.status = 'submitted'
+                row.attempts += 1
+            # Persist nonce + signed bytes before the network sees them
+            db.session.commit()
+            TRANSITIONS.inc(len(group), status='submitted')
+            self._broadcast(group, reason='new')
+
+    def _track_submitted(self):
+        groups = self._in_flight_groups()
+        if not groups:
+            return
+
+        confirmed_nonce = get_w3().eth.get_transaction_count(self._signer.address, 'latest')
+        now = datetime.utcnow()
+
+        for group in groups:
+            lead = group[0]
+            receipt = self._find_receipt(group)
+            if receipt is not None:
+                status = 'mined' if receipt.status == 1 else 'failed'
+                for row in group:
+                    row.status = status
+                    row.block_number = receipt.blockNumber
+                    row.tx_hash = _hex(receipt.transactionHash)
+                    if status == 'failed':
+                        row.last_error = "transaction reverted"
+                db.session.commit()
+                TRANSITIONS.inc(len(group), status=status)
+                if status == 'mined':
+                    record_receipt_in_mirror(receipt)
+                continue
+
+            if confirmed_nonce > lead.nonce:
+                # Our nonce was consumed by a transaction we don't know -> dropped/replaced
+                self._requeue(group, "nonce consumed by another transaction")
+                continue
+
+            age = (now - lead.submitted_at).total_seconds() if lead.submitted_at else 0
+            if age < OUTBOX_BUMP_AFTER_S:
+                continue
+
+            if lead.attempts >= OUTBOX_MAX_ATTEMPTS:
+                # The nonce is still ours; keep the last transaction alive
+                self._broadcast(group, reason='rebroadcast')
+                continue
+
+            # Stuck or dropped from the mempool: same nonce, higher gas
+            gas_price = max(int(lead.gas_price * OUTBOX_GAS_BUMP), self._signer.gas_price())
+            self._sign(group, lead.nonce, gas_price)
+            for row in group:
+                row.attempts += 1
+            db.session.commit()
+            self._broadcast(group, reason='gas_bump')
+
+    def _requeue(self, group, reason):
+        # Someone else used our nonce: local nonce state can't be trusted any more
+        self._signer.resync()
+        for row in group:
+            if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                row.status = 'failed'
+            else:
+                row.status = 'pending'
+                _clear_submission(row)
+            row.last_error = reason
+            TRANSITIONS.inc(status=row.status)
+        db.session.commit()
+        logger.warning(f"[outbox] Nonce {group[0].nonce if group else '?'}: {reason}")
+
+
+_submitter = None
+
+
+def start_outbox_submitter(app):
+    """
+    Start the background submitter if this process wins the per-box election.
+
+    It then only submits while it holds the deployment-wide OutboxLease.
+    """
+    global _submitter
+    if not OUTBOX_ENABLED or _submitter is not None:
+        return _submitter
+    if not try_acquire_leader(LEASE_NAME):
+        return None
+
+    _submitter = OutboxSubmitter(app)
+    _submitter.start()
+    return _submitter
@@ -0,0 +1,189 @@
+# blockchain/signer.py
+"""
+Shared transaction signer: owns the account, allocates nonces locally and
+caches the gas price.
+
+Before this, every store_result did account.from_key,
+get_transaction_count('pending') and eth_gasPrice, i.e. three RPC
+round-trips per transaction, and workers sharing PRIVATE_KEY raced for the
+same nonce. With the signer, submitting a transaction costs exactly one
+send_raw_transaction:
+
+- the account is derived once;
+- nonces are handed out from a local counter that is synced from the chain
+  once; nonces of transactions the node rejected are released and reused
+  first, so no gaps are left. After "nonce too low", or an error that leaves
+  it open whether the node got the transaction (timeout, connection reset),
+  the counter is re-read from the node's 'pending' count instead, so a
+  transaction that may sit in the mempool is never replaced;
+- the gas price is refreshed by a background thread every GAS_PRICE_TTL_S
+  seconds and read from memory on the hot path.
+
+In the web app all transactions go through the outbox submitter, and only
+the worker holding the deployment-wide outbox lease submits
+(blockchain/outbox.py). Any worker can take the lease over; it resyncs its
+signer when it does, so there is still one active signer for the key and
+cross-worker nonce collisions cannot happen.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+GAS_PRICE_TTL_S = float(os.getenv("GAS_PRICE_TTL_S", "15"))
+GAS_PRICE_MULTIPLIER = float(os.getenv("GAS_PRICE_MULTIPLIER", "1.2"))  # +20% against 'underpriced'
+
+GAS_PRICE = metrics.gauge("signer_gas_price_wei", "Cached gas price used for new transactions.")
+NONCE_EVENTS = metrics.counter(
+    "signer_nonce_events_total",
+    "Nonce allocator events (allocated, released, resync).",
+    ("event",),
+)
+
+
+class TransactionSigner:
+    """Account + local nonce allocator + cached gas price for one private key."""
+
+    def __init__(self, w3, private_key, chain_id, gas_ttl_s=GAS_PRICE_TTL_S,
+                 gas_multiplier=GAS_PRICE_MULTIPLIER, refresh_in_background=True):
+        self.w3 = w3
+        self.account = w3.eth.account.from_key(private_key)
+        self.address = self.account.address
+        self.chain_id = chain_id
+        self.gas_ttl_s = gas_ttl_s
+        self.gas_multiplier = gas_multiplier
+
+        self._nonce_lock = threading.Lock()
+        self._next_nonce = None
+        self._released = []  # min-heap of nonces to reuse
+
+        self._gas_lock = threading.Lock()
+        self._gas_price = None
+        self._gas_fetched_at = 0.0
+
+        GAS_PRICE.set_function(lambda: self._gas_price or 0)
+
+        self._stop_event = threading.Event()
+        if refresh_in_background:
+            threading.Thread(target=self._refresh_loop, name="signer-gas-price", daemon=True).start()
+
+    # --- Nonces ---
+
+    def _sync_nonce(self):
+        self._next_nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+        self._released = []
+        NONCE_EVENTS.inc(event="resync")
+
+    def allocate_nonce(self) -> int:
+        with self._nonce_lock:
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                if self._next_nonce is None:
+                    self._sync_nonce()
+                nonce = self._next_nonce
+                self._next_nonce += 1
+        NONCE_EVENTS.inc(event="allocated")
+        return nonce
+
+    def release_nonce(self, nonce: int):
+        """Give back a nonce whose transaction never reached the node (gap recovery)."""
+        with self._nonce_lock:
+            if self._next_nonce is not None and nonce == self._next_nonce - 1:
+                self._next_nonce -= 1
+            elif nonce not in self._released:
+                heapq.heappush(self._released, nonce)
+        NONCE_EVENTS.inc(event="released")
+
+    def reserve_through(self, nonce: int):
+        """Make sure nonces <= nonce are never handed out (e.g. persisted by the outbox)."""
+        with self._nonce_lock:
+            if self._next_nonce is None:
+                self._sync_nonce()
+            self._next_nonce = max(self._next_nonce, nonce + 1)
+            self._released = [n for n in self._released if n > nonce]
+            heapq.heapify(self._released)
+
+    def resync(self):
+        """Forget local state; the next allocation re-reads the node's 'pending' count."""
+        with self._nonce_lock:
+            self._next_nonce = None
+            self._released = []
+
+    # --- Gas price ---
+
+    def _fetch_gas_price(self):
+        price = int(self.w3.eth.gas_price * self.gas_multiplier)
+        with self._gas_lock:
+            self._gas_price = price
+            self._gas_fetched_at = time.monotonic()
+        return price
+
+    def gas_price(self) -> int:
+        """Cached (bumped) gas price; only blocks on the RPC if the cache is cold or expired."""
+        with self._gas_lock:
+            price = self._gas_price
+            fresh = time.monotonic() - self._gas_fetched_at < self.gas_ttl_s
+        if price is not None and fresh:
+            return price
+        return self._fetch_gas_price()
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(max(1.0, self.gas_ttl_s / 2)):
+            try:
+                self._fetch_gas_price()
+            except Exception as e:
+                logger.warning(f"[signer] Gas price refresh failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    # --- Signing / sending ---
+
+    def sign(self, contract_fn, gas: int, nonce: int, gas_price: int):
+        """Build and sign a contract call locally (no RPC: every field is explicit)."""
+        tx = contract_fn.build_transaction({
+            "from": self.address,
+            "nonce": nonce,
+            "chainId": self.chain_id,
+            "gas": gas,
+            "gasPrice": gas_price,
+        })
+        return self.account.sign_transaction(tx)
+
+    def send(self, contract_fn, gas: int):
+        """Allocate a nonce, sign and broadcast; returns the tx hash."""
+        nonce = self.allocate_nonce()
+        try:
+            signed = self.sign(contract_fn, gas=gas, nonce=nonce, gas_price=self.gas_price())
+        except Exception:
+            self.release_nonce(nonce)  # nothing was sent
+            raise
+        try:
+            return self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception as e:
+            if _rejected(e):
+                self.release_nonce(nonce)
+            else:
+                # The transaction may be in the mempool: re-read 'pending', don't reuse the nonce
+                self.resync()
+            raise
+
+
+# The node answered, but these mean the nonce is used or the transaction is already pending
+_NONCE_IN_USE = ("nonce too low", "already known", "known transaction", "replacement transaction underpriced")
+
+
+def _rejected(error) -> bool:
+    """True if the node answered send_raw_transaction with an error that proves it dropped the transaction."""
+    from web3.exceptions import Web3RPCError
+
+    if not isinstance(error, Web3RPCError):
+        return False  # timeout, connection reset, ...: it may have been received
+    message = str(error).lower()
+    return not any(phrase in message for phrase in _NONCE_IN_USE)
@@ -25,6 +25,30 @@ contract DeepfakeLogger {
         string calldata _label,
         uint256 _confidence
     ) external {
+        _store(_contentHash, _label, _confidence);
+    }
+
+    // Batched registration: one transaction (and one 21k base cost) for many images.
+    // Emits the same ResultStored event per item as storeResult.
+    function storeResults(
+        bytes32[] calldata _contentHashes,
+        string[] calldata _labels,
+        uint256[] calldata _confidences
+    ) external {
+        require(
+            _contentHashes.length == _labels.length &&
+            _contentHashes.length == _confidences.length
+        );
+        for (uint256 i = 0; i < _contentHashes.length; i++) {
+            _store(_contentHashes[i], _labels[i], _confidences[i]);
+        }
+    }
+
+    function _store(
+        bytes32 _contentHash,
+        string calldata _label,
+        uint256 _confidence
+    ) internal {
         require(_confidence <= 10000);
         results[_contentHash] =
             Result(_contentHash, _label, _confidence, block.timestamp, msg.sender);
@@ -1,30 +1,234 @@
 # convert_to_tflite.py
+"""
+Convert the Keras model to TFLite variants and report their trade-offs.
+
+Variants (file names in globals.TFLITE_VARIANTS; the server loads the one
+named by TFLITE_VARIANT):
+  dynamic   dynamic-range quantization: int8 weights, float activations (the original export)
+  int8      full-integer quantization calibrated on --calibration-dir; takes
+            uint8 input (raw 0-255 pixels, the /255 is part of the model), float32 output
+  float16   float16 weights
+  float32   no quantization
+
+Every variant is exported with a dynamic batch dimension (None, 299, 299, 3)
+so the inference scheduler can run several images in one invoke. The report
+gives each variant's file size, single-image and batched CPU latency, and,
+with --eval-dir, how often its real/fake decision agrees with the Keras model
+on those held-out images (keep them out of the calibration set).
+
+    python convert_to_tflite.py                      # dynamic only, as before
+    python convert_to_tflite.py --variants all \\
+        --calibration-dir data/calibration --eval-dir data/holdout
+"""
+import argparse
+import json
 import pathlib
+import statistics
+import time
+
+import numpy as np
 import tensorflow as tf
+from PIL import Image
+
+from globals import TFLITE_VARIANTS
+from utils.predict import IMG_SIZE, _decode_binary_preds, predict_batch, preprocess_pil
 
 # Paths
 MODEL_PATH = pathlib.Path("model") / "Xception_deepfake_model.keras"
 OUT_DIR = pathlib.Path("model")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-TFLITE_PATH = OUT_DIR / "xception_deepfake_quant.tflite"
+REPORT_PATH = OUT_DIR / "variants_report.json"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def list_images(directory, limit=None):
+    paths = sorted(p for p in pathlib.Path(directory).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return paths[:limit] if limit else paths
+
+
+def load_pixels(path) -> np.ndarray:
+    """(1, 299, 299, 3) uint8 batch, resized exactly like the server does."""
+    with Image.open(path) as img:
+        return preprocess_pil(img, np.uint8)
+
+
+# --- Conversion ---
+
+
+def _serving_model(model, raw_pixels=False):
+    """
+    Keras model to convert, with a dynamic batch dimension.
+
+    raw_pixels=True takes 0-255 input and does the /255 inside the graph,
+    which lets the full-integer model accept uint8 pixels directly.
+
+    Converted with from_keras_model, which freezes the weights; a concrete
+    function of model(x) leaves them as uninitialised resource variables
+    with Keras 3, and the exported model returns NaN.
+    """
+    if not raw_pixels:
+        return model
+    inputs = tf.keras.Input(shape=model.input_shape[1:])
+    outputs = model(tf.keras.layers.Rescaling(1.0 / 255.0)(inputs), training=False)
+    return tf.keras.Model(inputs, outputs)
+
+
+def convert_variant(model, variant, calibration_paths=()):
+    """TFLite flatbuffer (bytes) for one variant."""
+    raw_pixels = variant == "int8"
+    converter = tf.lite.TFLiteConverter.from_keras_model(_serving_model(model, raw_pixels))
+
+    if variant == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [load_pixels(path).astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.float32
+    elif variant != "float32":
+        raise ValueError(f"unknown variant {variant!r}")
+
+    return converter.convert()
+
+
+# --- Report ---
+
+
+def _interpreter(path, threads):
+    interpreter = tf.lite.Interpreter(model_path=str(path), num_threads=threads)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def measure_latency(path, batch_size=8, runs=20, threads=4):
+    """Median ms for one image, and per image within a batch of batch_size."""
+    interpreter = _interpreter(path, threads)
+    dtype = interpreter.get_input_details()[0]["dtype"]
+    rng = np.random.default_rng(0)
+
+    def median_ms(n):
+        x = rng.integers(0, 256, (n, IMG_SIZE[1], IMG_SIZE[0], 3)).astype(dtype)
+        if np.issubdtype(dtype, np.floating):
+            x /= 255.0
+        for _ in range(2):  # warm-up (and re-allocation for the new batch size)
+            predict_batch(interpreter, x)
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            predict_batch(interpreter, x)
+            samples.append((time.perf_counter() - started) * 1000.0)
+        return statistics.median(samples)
+
+    single = median_ms(1)
+    batched = median_ms(batch_size) / batch_size
+    return round(single, 2), round(batched, 2)
+
+
+def predictions(predict_fn, batches):
+    """(labels, p_fake) for every (1, H, W, 3) batch."""
+    labels, scores = [], []
+    for x in batches:
+        preds = np.asarray(predict_fn(x)).ravel()
+        label, _ = _decode_binary_preds(preds)
+        labels.append(label)
+        scores.append(float(preds[0]) if preds.size == 1 else float("nan"))
+    return labels, np.array(scores)
+
+
+def agreement(path, eval_pixels, reference, threads=4):
+    """Fraction of held-out images where the variant and Keras agree, plus score drift."""
+    interpreter = _interpreter(path, threads)
+    ref_labels, ref_scores = reference
+    labels, scores = predictions(lambda x: predict_batch(interpreter, x), eval_pixels)
+    matches = sum(a == b for a, b in zip(labels, ref_labels))
+    drift = np.abs(scores - ref_scores)
+    return {
+        "agreement": round(matches / len(labels), 4),
+        "mean_abs_score_diff": round(float(drift.mean()), 5),
+        "max_abs_score_diff": round(float(drift.max()), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(MODEL_PATH), help="Keras model to convert")
+    parser.add_argument("--variants", nargs="+", default=["dynamic"],
+                        choices=sorted(TFLITE_VARIANTS) + ["all"])
+    parser.add_argument("--calibration-dir", default=None, help="images for int8 calibration")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--eval-dir", default=None, help="held-out images for the agreement check")
+    parser.add_argument("--eval-samples", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=8, help="batch for the batched latency")
+    parser.add_argument("--runs", type=int, default=20, help="timed invokes per latency figure")
+    parser.add_argument("--threads", type=int, default=4, help="interpreter threads")
+    parser.add_argument("--report", default=str(REPORT_PATH), help="where to write the JSON report")
+    args = parser.parse_args()
+
+    variants = list(TFLITE_VARIANTS) if "all" in args.variants else args.variants
+    calibration_paths = []
+    if "int8" in variants:
+        if not args.calibration_dir:
+            parser.error("the int8 variant needs --calibration-dir")
+        calibration_paths = list_images(args.calibration_dir, args.calibration_samples)
+        if not calibration_paths:
+            parser.error(f"no images found in {args.calibration_dir}")
+
+    model_path = pathlib.Path(args.model)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print(f"[+] Loading Keras model from: {model_path}")
+    model = tf.keras.models.load_model(str(model_path))
+
+    reference = eval_pixels = None
+    if args.eval_dir:
+        eval_pixels = [load_pixels(p) for p in list_images(args.eval_dir, args.eval_samples)]
+        if not eval_pixels:
+            parser.error(f"no images found in {args.eval_dir}")
+        print(f"[+] Keras reference predictions on {len(eval_pixels)} held-out images…")
+        reference = predictions(
+            lambda x: model.predict(x.astype(np.float32) / 255.0, verbose=0), eval_pixels
+        )
 
-print(f"[+] Loading Keras model from: {MODEL_PATH}")
-model = tf.keras.models.load_model(str(MODEL_PATH))
+    report = {"keras_model": str(model_path), "keras_size_mb": round(model_path.stat().st_size / 2**20, 2),
+              "variants": {}}
+    for variant in variants:
+        out_path = OUT_DIR / TFLITE_VARIANTS[variant]
+        print(f"[+] Converting {variant} → {out_path} (this may take a few minutes)")
+        out_path.write_bytes(convert_variant(model, variant, calibration_paths))
 
-# Dynamic-range quantization (smaller model, usually tiny accuracy drop)
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        interpreter = tf.lite.Interpreter(model_path=str(out_path))
+        entry = {
+            "path": str(out_path),
+            "size_mb": round(out_path.stat().st_size / 2**20, 2),
+            "input_dtype": np.dtype(interpreter.get_input_details()[0]["dtype"]).name,
+            "input_signature": interpreter.get_input_details()[0]["shape_signature"].tolist(),
+        }
+        entry["single_ms"], entry["batched_ms_per_image"] = measure_latency(
+            out_path, args.batch_size, args.runs, args.threads
+        )
+        if reference is not None:
+            entry.update(agreement(out_path, eval_pixels, reference, args.threads))
+        report["variants"][variant] = entry
 
-print("[+] Converting to quantized TFLite… this may take a few minutes")
-tflite_model = converter.convert()
+    report_path = pathlib.Path(args.report)
+    report_path.write_text(json.dumps(report, indent=2))
 
-# Save TFLite model
-with open(TFLITE_PATH, "wb") as f:
-    f.write(tflite_model)
+    print(f"\n[✓] Keras model: {report['keras_size_mb']:.1f} MB; report saved to {report_path}")
+    print(f"    {'variant':<8} {'MB':>7} {'input':>7} {'1 img ms':>9} {f'x{args.batch_size} ms/img':>12} {'agree':>7}")
+    for variant, entry in report["variants"].items():
+        agree = f"{entry['agreement']:.2%}" if "agreement" in entry else "-"
+        print(f"    {variant:<8} {entry['size_mb']:>7.1f} {entry['input_dtype']:>7} "
+              f"{entry['single_ms']:>9.1f} {entry['batched_ms_per_image']:>12.1f} {agree:>7}")
+    print("    Select one with TFLITE_VARIANT=<variant>.")
 
-orig_size = MODEL_PATH.stat().st_size / (1024 * 1024)
-tflite_size = TFLITE_PATH.stat().st_size / (1024 * 1024)
 
-print(f"[✓] Saved TFLite model to: {TFLITE_PATH}")
-print(f"    Original Keras: {orig_size:.1f} MB")
-print(f"    TFLite (quant): {tflite_size:.1f} MB")
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,309 @@
 # globals.py
 import os
+import hashlib
 import logging
-
-# We only need TensorFlow Lite Interpreter
-try:
-    import tensorflow as tf
-except ImportError:
-    tf = None
+import threading
 
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "model")
 
-# Path to the quantized TFLite model
-TFLITE_PATH = os.path.join(MODEL_DIR, "xception_deepfake_quant.tflite")
+# TFLite variants written by convert_to_tflite.py (see its report for the trade-offs)
+TFLITE_VARIANTS = {
+    "dynamic": "xception_deepfake_quant.tflite",  # dynamic-range quantized (the original export)
+    "int8": "xception_deepfake_int8.tflite",      # full integer, uint8 input (raw pixels)
+    "float16": "xception_deepfake_fp16.tflite",   # float16 weights
+    "float32": "xception_deepfake_fp32.tflite",   # unquantized
+}
+TFLITE_VARIANT = os.getenv("TFLITE_VARIANT", "dynamic").lower()
+if TFLITE_VARIANT not in TFLITE_VARIANTS:
+    logger.warning(
+        f"[globals] Unknown TFLITE_VARIANT {TFLITE_VARIANT!r} "
+        f"(expected one of {', '.join(TFLITE_VARIANTS)}); using 'dynamic'."
+    )
+    TFLITE_VARIANT = "dynamic"
+
+# Path to the TFLite model (TFLITE_PATH overrides the variant's default file)
+TFLITE_PATH = os.getenv("TFLITE_PATH") or os.path.join(MODEL_DIR, TFLITE_VARIANTS[TFLITE_VARIANT])
 
 # Optional: URL where TFLITE model could be downloaded from (future use)
 MODEL_URL = os.getenv("MODEL_URL")
 
-# This variable will hold the loaded TFLite interpreter
+# Micro-batching knobs for the inference scheduler (see utils/batching.py)
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+
+# Interpreter pool (see utils/interpreter_pool.py). Unset -> derived from cores.
+TFLITE_POOL_SIZE = int(os.getenv("TFLITE_POOL_SIZE", "0")) or None
+TFLITE_NUM_THREADS = int(os.getenv("TFLITE_NUM_THREADS", "0")) or None
+# XNNPACK is TFLite's default CPU delegate; set to False to run the builtin kernels only
+TFLITE_USE_XNNPACK = os.getenv("TFLITE_USE_XNNPACK", "True").lower() == "true"
+TFLITE_CHECKOUT_TIMEOUT_S = float(os.getenv("TFLITE_CHECKOUT_TIMEOUT_S", "30"))
+
+# Nothing heavy happens at import time any more: the model is loaded by
+# load_model(), normally from the background warm-up in utils/startup.py.
+# Read the state through the get_*() accessors, not `from globals import model`.
+
+# This variable will hold the loaded TFLite interpreter pool
 model = None
 
+# Batching front-end for `model`; routes should predict through this
+scheduler = None
+
+# Content hash of the loaded model file; keys the verdict cache
+MODEL_VERSION = None
+
+# Verdict cache for the loaded model (see utils/verdict_cache.py)
+verdict_cache = None
+
+# Which TFLite runtime got imported ("ai_edge_litert", "tflite_runtime" or "tensorflow")
+TFLITE_RUNTIME = None
+
+_load_lock = threading.Lock()
+_loaded = False
+
+
+def _import_tflite_runtime():
+    """
+    Return (Interpreter class, OpResolverType enum or None).
+
+    Prefer the standalone runtimes, which import in a fraction of the time
+    and memory of full TensorFlow; fall back to tf.lite.
+    """
+    global TFLITE_RUNTIME
+
+    try:
+        from ai_edge_litert import interpreter as litert
+        TFLITE_RUNTIME = "ai_edge_litert"
+        return litert.Interpreter, getattr(litert, "OpResolverType", None)
+    except ImportError:
+        pass
+
+    try:
+        from tflite_runtime import interpreter as tflite
+        TFLITE_RUNTIME = "tflite_runtime"
+        return tflite.Interpreter, getattr(tflite, "OpResolverType", None)
+    except ImportError:
+        pass
+
+    try:
+        import tensorflow as tf
+        TFLITE_RUNTIME = "tensorflow"
+        return tf.lite.Interpreter, tf.lite.experimental.OpResolverType
+    except ImportError:
+        return None, None
+
+
+def _model_file_version(path):
+    """Short SHA-256 of the model file, so a changed file means a new version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def preload_model():
+    """
+    Load what forked workers can share, before the fork (STARTUP_MODE=deferred).
+
+    Only the TFLite runtime import. Interpreters are not built here: their
+    thread pools would not survive the fork, so each worker builds its own
+    pool in load_model(). They load with model_path, which memory-maps the
+    flatbuffer read-only, so the weights are already shared between workers
+    through the page cache.
+    """
+    from utils.startup import timed
+
+    with timed("import:tflite_runtime"):
+        _import_tflite_runtime()
+
 
 def _load_tflite_model():
-    """Load TFLite quantized model if available."""
-    global model
+    """Load TFLite quantized model if available; returns (InterpreterPool, version) or (None, None)."""
+    from utils.startup import timed
 
-    if tf is None:
-        logger.error("[globals] TensorFlow is not installed — TFLite model cannot load.")
-        model = None
-        return
+    with timed("import:tflite_runtime"):
+        interpreter_cls, op_resolver_type = _import_tflite_runtime()
+
+    if interpreter_cls is None:
+        logger.error("[globals] No TFLite runtime (ai-edge-litert, tflite-runtime or TensorFlow) is installed — TFLite model cannot load.")
+        return None, None
 
     if not os.path.exists(TFLITE_PATH):
         logger.warning(f"[globals] TFLite model not found at {TFLITE_PATH}")
-        model = None
-        return
+        return None, None
+
+    def make_interpreter(num_threads):
+        kwargs = {"model_path": TFLITE_PATH, "num_threads": num_threads}
+        if not TFLITE_USE_XNNPACK and op_resolver_type is not None:
+            kwargs["experimental_op_resolver_type"] = op_resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        return interpreter_cls(**kwargs)
 
     try:
-        logger.info(f"[globals] Loading TFLite model from {TFLITE_PATH}...")
-        interpreter = tf.lite.Interpreter(model_path=TFLITE_PATH)
-        interpreter.allocate_tensors()
-        model = interpreter
-        logger.info("[globals] TFLite model loaded successfully.")
+        from utils.interpreter_pool import InterpreterPool
+
+        logger.info(f"[globals] Loading TFLite model from {TFLITE_PATH} ({TFLITE_RUNTIME})...")
+        with timed("model:load"):
+            pool = InterpreterPool(
+                make_interpreter,
+                size=TFLITE_POOL_SIZE,
+                num_threads=TFLITE_NUM_THREADS,
+                checkout_timeout=TFLITE_CHECKOUT_TIMEOUT_S,
+            )
+        with timed("model:version_hash"):
+            version = _model_file_version(TFLITE_PATH)
+        logger.info(
+            f"[globals] TFLite model loaded successfully ({TFLITE_VARIANT}, version {version}, "
+            f"{pool.size} interpreters x {pool.num_threads} threads, "
+            f"xnnpack={'on' if TFLITE_USE_XNNPACK else 'off'})."
+        )
+        return pool, version
     except Exception as e:
         logger.error(f"[globals] Failed to load TFLite model: {e}")
-        model = None
+        return None, None
+
+
+def _make_scheduler(pool):
+    """Wrap a loaded model in a micro-batching scheduler (None if there is no model)."""
+    if pool is None:
+        return None
+
+    from utils.batching import InferenceScheduler
+
+    return InferenceScheduler(
+        pool,
+        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS,
+        workers=getattr(pool, "size", 1),  # one batch in flight per pooled interpreter
+    )
+
+
+def _load_in_process():
+    """Interpreter pool + scheduler in this process."""
+    global model, scheduler, MODEL_VERSION
+
+    model, MODEL_VERSION = _load_tflite_model()
+    scheduler = _make_scheduler(model)
+
+
+def _in_process_fallback():
+    """Scheduler over a local pool, built by InferenceClient when the server fails."""
+    pool, _ = _load_tflite_model()
+    return _make_scheduler(pool)
+
+
+def _connect_inference_server():
+    """
+    Use the inference server (utils/inference_server.py) instead of a local
+    model: `model` and `scheduler` are both the InferenceClient.
+    """
+    global model, scheduler, MODEL_VERSION
+
+    from utils.inference_server import INFERENCE_FALLBACK, InferenceClient
+    from utils.startup import timed
+
+    client = InferenceClient(fallback=_in_process_fallback if INFERENCE_FALLBACK == "local" else None)
+    try:
+        with timed("model:inference_server"):
+            info = client.info()
+        MODEL_VERSION = info.get("model_version")
+        logger.info(
+            f"[globals] Using inference server at {client.socket_path} "
+            f"(model {MODEL_VERSION}, {info.get('variant')}, pid {info.get('pid')})."
+        )
+    except Exception as e:
+        logger.warning(
+            f"[globals] Inference server at {client.socket_path} not reachable ({e}); "
+            + ("requests run in-process until it is." if INFERENCE_FALLBACK == "local"
+               else "inference fails until it is (INFERENCE_FALLBACK=none).")
+        )
+        # Same file as the server would load, so verdicts stay keyed consistently
+        if os.path.exists(TFLITE_PATH):
+            MODEL_VERSION = _model_file_version(TFLITE_PATH)
+    model = scheduler = client
+
+
+def _start_verdict_cache():
+    """Open the verdict cache for the loaded model version."""
+    global verdict_cache
+
+    if model is None or MODEL_VERSION is None:
+        verdict_cache = None
+        return
+
+    try:
+        from utils.verdict_cache import VerdictCache
+        verdict_cache = VerdictCache(MODEL_VERSION)
+    except Exception as e:
+        logger.error(f"[globals] Verdict cache disabled: {e}")
+        verdict_cache = None
+
+
+def _warm_up_inference():
+    """Run one dummy inference on every pooled interpreter so the first request isn't slow."""
+    if model is None:
+        return
+
+    import numpy as np
+    from utils.predict import IMG_SIZE, input_dtype, predict_batch
+
+    x = np.zeros((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=input_dtype(model))
+    if hasattr(model, "warm_up"):
+        model.warm_up(lambda interpreter: predict_batch(interpreter, x))
+    else:
+        predict_batch(model, x)
+
+
+def load_model(in_process=None):
+    """
+    Load the model, scheduler and verdict cache once (thread-safe, idempotent).
+
+    in_process: load the interpreter pool here (True) or talk to the
+    inference server (False); default: the server when INFERENCE_SERVER_ENABLED.
+    """
+    global _loaded
+
+    from utils.startup import timed
+
+    with _load_lock:
+        if _loaded:
+            return model
+
+        # Ensure model folder exists
+        os.makedirs(MODEL_DIR, exist_ok=True)
+
+        if in_process is None:
+            from utils.inference_server import INFERENCE_SERVER_ENABLED
+            in_process = not INFERENCE_SERVER_ENABLED
+
+        if in_process:
+            _load_in_process()
+        else:
+            _connect_inference_server()
+        _start_verdict_cache()
+        if in_process:
+            try:
+                with timed("model:warmup_inference"):
+                    _warm_up_inference()
+            except Exception as e:
+                logger.error(f"[globals] Warm-up inference failed: {e}")
+        _loaded = True
+        return model
+
+
+def is_model_loaded() -> bool:
+    return _loaded
+
+
+def get_model():
+    return model
+
 
+def get_scheduler():
+    return scheduler
 
-# Ensure model folder exists
-os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Load the TFLite model on startup
-_load_tflite_model()
+def get_verdict_cache():
+    return verdict_cache
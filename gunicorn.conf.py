@@ -0,0 +1,48 @@
+# gunicorn.conf.py
+"""
+gunicorn settings (picked up automatically from the working directory):
+    gunicorn run:app
+
+Only preload_app is set here; everything else keeps gunicorn's own
+defaults (and command-line flags) unless its variable below is set.
+
+With GUNICORN_PRELOAD=true the app and the TFLite runtime are imported once
+in the master and the forked workers share those pages copy-on-write; each
+worker still builds its own interpreters (the model file itself is
+memory-mapped, so its pages are shared either way). Background threads
+(history writer, warm-up, chain services) can't cross a fork, so
+STARTUP_MODE=deferred leaves them to post_fork, which starts them in
+every worker.
+
+Config (env):
+  GUNICORN_PRELOAD          preload the app in the master (default False)
+  GUNICORN_BIND             listen address (unset: gunicorn's -b, else 0.0.0.0:$PORT or 127.0.0.1:8000)
+  WEB_CONCURRENCY           worker processes (read by gunicorn itself; unset: 1)
+  GUNICORN_THREADS          threads per worker (unset: gunicorn's --threads, 1)
+  GUNICORN_TIMEOUT          worker timeout in seconds (unset: gunicorn's --timeout, 30)
+
+benchmarks/worker_memory.py measures RSS/PSS per worker with and without it.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "False").lower() == "true"
+if preload_app:
+    os.environ.setdefault("STARTUP_MODE", "deferred")
+
+if os.getenv("GUNICORN_BIND"):
+    bind = os.environ["GUNICORN_BIND"]
+if os.getenv("GUNICORN_THREADS"):
+    threads = int(os.environ["GUNICORN_THREADS"])
+if os.getenv("GUNICORN_TIMEOUT"):
+    timeout = int(os.environ["GUNICORN_TIMEOUT"])
+
+
+def post_fork(server, worker):
+    from utils.startup import STARTUP_MODE, start_worker_services
+
+    if preload_app and STARTUP_MODE == "deferred":
+        start_worker_services(worker.app.wsgi())
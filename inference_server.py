@@ -0,0 +1,10 @@
+# inference_server.py
+# Runs the shared inference server (see utils/inference_server.py):
+#   python inference_server.py
+from dotenv import load_dotenv
+load_dotenv()
+
+from utils.inference_server import main
+
+if __name__ == '__main__':
+    main()
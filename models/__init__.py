@@ -1,5 +1,6 @@
 from extensions import db
 from .user import User
 from .image_record import ImageRecord
+from .chain_registration import ChainRegistration, OutboxLease
 
-__all__ = ["User", "ImageRecord"]
+__all__ = ["User", "ImageRecord", "ChainRegistration", "OutboxLease"]
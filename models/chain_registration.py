@@ -0,0 +1,64 @@
+from extensions import db
+from datetime import datetime
+
+class ChainRegistration(db.Model):
+    """
+    Durable outbox entry for one on-chain registration (storeResult).
+
+    status: "pending"   -> waiting for the submitter
+            "submitted" -> signed + broadcast, nonce reserved, not mined yet
+            "mined"     -> included in a block with status 1
+            "failed"    -> reverted, or gave up after OUTBOX_MAX_ATTEMPTS
+    """
+    __tablename__ = 'chain_registration'
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_hash = db.Column(db.String(64), unique=True, nullable=False)
+    phash = db.Column(db.String(16), nullable=True)  # 64-bit dHash (hex) for near-duplicate lookups
+    label = db.Column(db.String(10), nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+
+    nonce = db.Column(db.Integer, nullable=True)
+    gas_price = db.Column(db.BigInteger, nullable=True)
+    tx_hash = db.Column(db.String(66), nullable=True)       # latest broadcast
+    tx_hashes = db.Column(db.Text, nullable=True)            # every broadcast for this nonce, comma-separated
+    raw_tx = db.Column(db.Text, nullable=True)               # signed bytes of the latest broadcast (hex)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    block_number = db.Column(db.Integer, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "image_hash": self.image_hash,
+            "status": self.status,
+            "label": self.label,
+            "confidence": self.confidence,
+            "tx_hash": self.tx_hash,
+            "block_number": self.block_number,
+            "attempts": self.attempts,
+            "error": self.last_error if self.status == 'failed' else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"<ChainRegistration hash={self.image_hash}, status={self.status}, nonce={self.nonce}>"
+
+
+class OutboxLease(db.Model):
+    """
+    Which process may run the outbox submitter, across every host sharing this database.
+
+    The holder renews expires_at on every tick; another process can only take
+    the lease once it has expired (see blockchain/outbox.py).
+    """
+    __tablename__ = 'outbox_lease'
+
+    name = db.Column(db.String(32), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
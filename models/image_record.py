@@ -1,14 +1,24 @@
 from extensions import db
 from datetime import datetime
 
+from models.types import HexHash
+
 class ImageRecord(db.Model):
     __tablename__ = 'image_record'
+    # Admin dashboard: keyset pagination on (timestamp, id), optionally filtered by label or user.
+    # The leading columns also serve plain lookups on timestamp, label and user_id.
+    __table_args__ = (
+        db.Index('ix_image_record_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_image_record_label_timestamp_id', 'label', 'timestamp', 'id'),
+        db.Index('ix_image_record_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     image_filename = db.Column(db.String(255), nullable=False)
-    image_hash = db.Column(db.String(64), unique=True, nullable=False)
-    label = db.Column(db.String(10), nullable=False)  # "real" or "fake"
+    image_hash = db.Column(HexHash(), unique=True, nullable=False)  # hex in Python; text or 32-byte binary in the DB
+    phash = db.Column(db.String(16), nullable=True)  # 64-bit dHash (hex) for near-duplicate lookups
+    label = db.Column(db.String(10), nullable=False)  # "real" or "fake", always stored lower-case
     confidence = db.Column(db.Float, nullable=False)  # confidence score between 0.0 and 1.0
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -0,0 +1,39 @@
+import os
+
+from sqlalchemy.types import LargeBinary, String, TypeDecorator
+
+# Store 32-byte hashes as raw bytes (BYTEA / BLOB) instead of 64 hex chars.
+# Halves the column and its unique index; only set this on a new database
+# (existing text columns are not converted, and utils.schema.check_hash_columns
+# refuses to start on a mismatch).
+IMAGE_HASH_BINARY = os.getenv("IMAGE_HASH_BINARY", "False").lower() == "true"
+
+
+class HexHash(TypeDecorator):
+    """
+    A 32-byte hash that Python code always sees as a 64-char lowercase hex string.
+
+    binary=False: stored as String(64) (the original layout)
+    binary=True:  stored as LargeBinary(32); hex is converted on the way in/out
+    """
+    impl = String(64)
+    cache_ok = True
+
+    def __init__(self, binary=IMAGE_HASH_BINARY):
+        super().__init__()
+        self.binary = binary
+
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(LargeBinary(32) if self.binary else String(64))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not self.binary:
+            return value
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value)
+        return bytes.fromhex(value.lower().removeprefix("0x"))
+
+    def process_result_value(self, value, dialect):
+        if value is None or not self.binary:
+            return value
+        return bytes(value).hex()
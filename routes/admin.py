@@ -1,8 +1,18 @@
+import os
+from datetime import datetime, timedelta
+
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from sqlalchemy import tuple_
+from sqlalchemy.orm import contains_eager
+
 from models.admin import Admin
 from models.user import User
+from models.image_record import ImageRecord
 from extensions import db
 
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+ADMIN_MAX_PAGE_SIZE = 200
+
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 @admin_bp.route('/login', methods=['GET', 'POST'])
@@ -23,6 +33,102 @@ def login():
     return render_template('admin_login.html')
 
 
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def _encode_cursor(record):
+    return f"{record.timestamp.isoformat()}~{record.id}"
+
+
+def _decode_cursor(value):
+    """'<iso timestamp>~<id>' -> (datetime, id), or None if missing/invalid."""
+    if not value:
+        return None
+    try:
+        ts, record_id = value.rsplit('~', 1)
+        return datetime.fromisoformat(ts), int(record_id)
+    except ValueError:
+        return None
+
+
+def _hash_prefix_bounds(prefix):
+    """
+    [lower, upper) range of full 64-char hashes starting with prefix (upper None = open).
+
+    A plain range (unlike LIKE 'abc%') can use the image_hash index on
+    every database, and works whether hashes are stored as hex or binary.
+    """
+    lower = prefix.ljust(64, '0')
+    bumped = int(prefix, 16) + 1
+    if bumped >= 16 ** len(prefix):
+        return lower, None
+    return lower, f"{bumped:0{len(prefix)}x}".ljust(64, '0')
+
+
+def _filtered_records(filters):
+    """ImageRecord + User in one join, with the dashboard's filters applied."""
+    query = (
+        ImageRecord.query
+        .join(User, ImageRecord.user_id == User.id)
+        .options(contains_eager(ImageRecord.user))
+    )
+
+    if filters['label']:
+        query = query.filter(ImageRecord.label == filters['label'])
+
+    start, end = _parse_date(filters['date_from']), _parse_date(filters['date_to'])
+    if start is not None:
+        query = query.filter(ImageRecord.timestamp >= start)
+    if end is not None:
+        query = query.filter(ImageRecord.timestamp < end + timedelta(days=1))
+
+    if filters['email']:
+        # Unique index on user.email -> at most one user_id
+        query = query.filter(User.email == filters['email'])
+
+    if filters['hash_prefix']:
+        lower, upper = _hash_prefix_bounds(filters['hash_prefix'][:64])
+        query = query.filter(ImageRecord.image_hash >= lower)
+        if upper is not None:
+            query = query.filter(ImageRecord.image_hash < upper)
+
+    return query
+
+
+def _page(query, per_page, before=None, after=None):
+    """
+    One keyset page, newest first.
+
+    before: cursor of the last row of the previous page (older rows)
+    after: cursor of the first row of the next page (newer rows)
+    Returns (records, has_older, has_newer).
+    """
+    key = tuple_(ImageRecord.timestamp, ImageRecord.id)
+
+    if after is not None:
+        rows = (
+            query.filter(key > after)
+            .order_by(ImageRecord.timestamp.asc(), ImageRecord.id.asc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_newer = len(rows) > per_page
+        return list(reversed(rows[:per_page])), True, has_newer
+
+    if before is not None:
+        query = query.filter(key < before)
+    rows = (
+        query.order_by(ImageRecord.timestamp.desc(), ImageRecord.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    return rows[:per_page], len(rows) > per_page, before is not None
+
+
 @admin_bp.route('/')
 def dashboard():
     if not session.get('admin_logged_in'):
@@ -30,15 +136,44 @@ def dashboard():
 
     username = session.get('admin_username', '')
 
-    # ✅ Fetch all users with their images
-    users = User.query.all()
+    filters = {
+        'label': request.args.get('label', '').strip().lower(),
+        'date_from': request.args.get('date_from', '').strip(),
+        'date_to': request.args.get('date_to', '').strip(),
+        'email': request.args.get('email', '').strip(),
+        'hash_prefix': request.args.get('hash_prefix', '').strip().lower().removeprefix('0x'),
+    }
+    if filters['label'] not in ('', 'real', 'fake', 'unknown'):
+        filters['label'] = ''
+    if filters['hash_prefix'] and not all(c in '0123456789abcdef' for c in filters['hash_prefix']):
+        flash('Hash prefix must be hexadecimal', 'error')
+        filters['hash_prefix'] = ''
+
+    per_page = min(max(request.args.get('per_page', ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+
+    # ✅ One page of image records with their users, in a single joined query
+    records, has_older, has_newer = _page(
+        _filtered_records(filters),
+        per_page,
+        before=_decode_cursor(request.args.get('before')),
+        after=_decode_cursor(request.args.get('after')),
+    )
 
-    # DEBUG: print to terminal to confirm
-    print(f"[DEBUG] Found {len(users)} users in database.")
-    for u in users:
-        print(f"[DEBUG] User: {u.email}, Images: {len(u.images)}")
+    active = {k: v for k, v in filters.items() if v}
+    if per_page != ADMIN_PAGE_SIZE:
+        active['per_page'] = per_page
+    older_url = url_for('admin.dashboard', before=_encode_cursor(records[-1]), **active) if records and has_older else None
+    newer_url = url_for('admin.dashboard', after=_encode_cursor(records[0]), **active) if records and has_newer else None
 
-    return render_template('admin.html', username=username, users=users)
+    return render_template(
+        'admin.html',
+        username=username,
+        records=records,
+        filters=filters,
+        per_page=per_page,
+        older_url=older_url,
+        newer_url=newer_url,
+    )
 
 
 @admin_bp.route('/logout')
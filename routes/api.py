@@ -0,0 +1,93 @@
+import json
+import os
+import zipfile
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from utils.bulk import BulkVerifier, items_from_files, items_from_zip
+from utils.history import log_image_if_new, parse_age
+from globals import get_model, get_scheduler, get_verdict_cache
+from routes.frontend import STATIC_IMAGES_DIR
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Bulk uploads get their own (larger) limits than the single-image form
+BULK_MAX_UPLOAD_MB = int(os.getenv('BULK_MAX_UPLOAD_MB', '1024'))
+# Multipart-list uploads; larger batches go in one zip archive
+BULK_MAX_FORM_PARTS = int(os.getenv('BULK_MAX_FORM_PARTS', '500'))
+# In-memory spool per file and per request; the rest of the upload spools to disk
+BULK_SPOOL_MAX_BYTES = int(os.getenv('BULK_SPOOL_MAX_KB', '1024')) * 1024
+BULK_SPOOL_MEMORY_BYTES = int(os.getenv('BULK_SPOOL_MEMORY_MB', '64')) * 1024 * 1024
+
+
+@api_bp.route('/verify', methods=['POST'])
+def bulk_verify():
+    """
+    Verify many images in one request; streams one JSON object per line (NDJSON).
+
+    multipart/form-data with either
+      - images: one or more image files (up to BULK_MAX_FORM_PARTS form
+        parts), or
+      - archive: a .zip of images, for larger batches
+    and optionally email / age / gender / occupation, which are logged with
+    every image exactly like /analyze does.
+
+    Each line is the /analyze decision for one image (image_hash, label,
+    confidence, source, onchain, registration, ...) plus its "index" and
+    "name" in the upload, or {"index", "name", "error"}. Lines arrive in
+    completion order, not upload order.
+    """
+    request.max_content_length = BULK_MAX_UPLOAD_MB * 1024 * 1024
+    request.max_form_parts = BULK_MAX_FORM_PARTS
+    # Keep at most BULK_SPOOL_MEMORY_BYTES of the upload in memory
+    request.spool_max_bytes = BULK_SPOOL_MAX_BYTES
+    request.spool_memory_budget = BULK_SPOOL_MEMORY_BYTES
+
+    archive = request.files.get('archive')
+    images = [f for f in request.files.getlist('images') if f and f.filename]
+
+    if archive is not None and archive.filename:
+        try:
+            items = items_from_zip(zipfile.ZipFile(archive.stream))
+        except zipfile.BadZipFile:
+            return jsonify({"error": "archive is not a valid zip file"}), 400
+    elif images:
+        items = items_from_files(images)
+    else:
+        return jsonify({"error": "send images (multipart list) or archive (zip)"}), 400
+
+    email = request.form.get('email')
+    age = request.form.get('age')
+    gender = request.form.get('gender')
+    occupation = request.form.get('occupation')
+    log_history = all([email, age, gender, occupation])
+    if log_history:
+        age = parse_age(age)
+        if age is None:
+            return jsonify({"error": "age must be a whole number"}), 400
+
+    def log_decision(decision):
+        if log_history:
+            log_image_if_new(
+                email=email,
+                age=age,
+                gender=gender,
+                occupation=occupation,
+                image_filename=decision["filename"],
+                image_hash=decision["image_hash"],
+                label=decision["label"],
+                confidence=decision["confidence"],
+                phash=decision["perceptual_hash"],
+            )
+
+    verifier = BulkVerifier(get_model(), get_scheduler(), get_verdict_cache(), STATIC_IMAGES_DIR)
+
+    def generate():
+        for result in verifier.run(items, on_decision=log_decision):
+            yield json.dumps(result, default=str) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no'},  # let nginx pass lines through as they come
+    )
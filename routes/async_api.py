@@ -0,0 +1,157 @@
+# routes/async_api.py
+"""
+Async single-image verification for the ASGI app (asgi.py).
+
+POST /api/async/verify takes the /analyze form (image, and optionally
+email / age / gender / occupation for the history log) and answers with
+the same JSON decision as one /api/verify line. The handler runs on the
+event loop: the chain lookup is an AsyncWeb3 call (blockchain/async_client.py)
+and inference awaits the micro-batching scheduler, so neither holds a
+thread. Decoding, hashing, preprocessing and the database writes run on
+a bounded thread pool, so hundreds of verifications can be in flight per
+process with ASYNC_CPU_WORKERS threads.
+
+Config (env):
+  ASYNC_CPU_WORKERS     threads for decoding/hashing/DB work (default: CPU count)
+  MAX_UPLOAD_MB         upload limit, shared with the Flask app (default 32)
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.datastructures import FileStorage
+
+from blockchain.async_client import AsyncChainClient
+from globals import get_model, get_scheduler, get_verdict_cache
+from routes.frontend import STATIC_IMAGES_DIR
+from utils.history import log_image_if_new, parse_age
+from utils.image_pipeline import DecodedUpload
+from utils.request_timing import StageTimer
+from utils.thumbnails import schedule_thumbnail
+from utils.verification import decide_async, public_view, record_outcome, register
+
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", "0")) or os.cpu_count() or 4
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "32")) * 1024 * 1024
+
+HISTORY_FIELDS = ("email", "age", "gender", "occupation")
+
+
+class _BodyTooLarge(Exception):
+    """The request body went past MAX_UPLOAD_BYTES while it was being read."""
+
+
+def _limit_body(request, limit):
+    """
+    The request with a body stream that raises _BodyTooLarge past limit bytes.
+
+    Content-Length is only checked up front; this also stops chunked bodies
+    and ones longer than their header says.
+    """
+    receive = request.receive
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise _BodyTooLarge()
+        return message
+
+    return Request(request.scope, limited_receive)
+
+
+def _json(payload, status_code=200):
+    return Response(json.dumps(payload, default=str), status_code=status_code, media_type="application/json")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """One executor and one AsyncWeb3 session per process, tied to the server's event loop."""
+    app.state.executor = ThreadPoolExecutor(max_workers=ASYNC_CPU_WORKERS, thread_name_prefix="async-verify")
+    app.state.chain = AsyncChainClient(executor=app.state.executor)
+    try:
+        yield
+    finally:
+        await app.state.chain.close()
+        app.state.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _offload(request, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(request.app.state.executor, fn, *args)
+
+
+def _save(upload):
+    upload.save_if_missing(STATIC_IMAGES_DIR)
+    schedule_thumbnail(upload)
+
+
+def _register_and_log(flask_app, decision, history):
+    """Outbox registration and history log, inside the Flask app context (runs on the executor)."""
+    with flask_app.app_context():
+        register(decision)
+        if history is not None:
+            log_image_if_new(
+                **history,
+                image_filename=decision["filename"],
+                image_hash=decision["image_hash"],
+                label=decision["label"],
+                confidence=decision["confidence"],
+                phash=decision["perceptual_hash"],
+            )
+    return decision
+
+
+async def verify(request):
+    state = request.app.state
+
+    too_large = {"error": f"upload is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES:
+        return _json(too_large, 413)
+
+    request = _limit_body(request, MAX_UPLOAD_BYTES)
+    try:
+        await request.form(max_files=1, max_fields=len(HISTORY_FIELDS) + 1)
+    except _BodyTooLarge:
+        return _json(too_large, 413)
+
+    async with request.form() as form:  # parsed above; closes the spooled files on exit
+        image = form.get("image")
+        if image is None or not getattr(image, "filename", None):
+            return _json({"error": "send one image as multipart field 'image'"}, 400)
+        history = {field: form.get(field) for field in HISTORY_FIELDS}
+        history = history if all(history.values()) else None
+        if history is not None:
+            history["age"] = parse_age(history["age"])
+            if history["age"] is None:
+                return _json({"error": "age must be a whole number"}, 400)
+
+        timer = StageTimer("async_verify")
+        try:
+            with timer.stage("decode"):
+                upload = await _offload(request, DecodedUpload, FileStorage(stream=image.file, filename=image.filename))
+        except Exception:
+            return _json({"error": "could not read the uploaded file as an image"}, 400)
+        with timer.stage("save"):
+            await _offload(request, _save, upload)
+
+        # Still inside the form: a memo hit decodes lazily from the upload's stream
+        decision = await decide_async(
+            upload, get_model(), get_scheduler(), get_verdict_cache(),
+            state.chain, state.executor, timer=timer,
+        )
+
+    record_outcome(timer, decision)
+    with timer.stage("register"):
+        await _offload(request, _register_and_log, state.flask_app, decision, history)
+    timer.finish(image_hash=decision["image_hash"])
+    return _json(public_view(decision))
+
+
+routes = [Route("/api/async/verify", verify, methods=["POST"])]
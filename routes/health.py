@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+
+from utils import startup
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: 503 until the model (and chain client) warm-up has finished."""
+    status = startup.status()
+    return jsonify(status), (200 if status["ready"] else 503)
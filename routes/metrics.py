@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+
+from utils import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint for this worker's in-process metrics."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
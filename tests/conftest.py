@@ -0,0 +1,19 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """Point utils.local_store (the SQLite caches) at an empty LOCAL_STATE_DIR."""
+    from utils import local_store
+
+    directory = tmp_path / "state"
+    monkeypatch.setattr(local_store, "LOCAL_STATE_DIR", directory)
+    return directory
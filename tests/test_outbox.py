@@ -0,0 +1,110 @@
+# tests/test_outbox.py
+"""Outbox state transitions against an in-process stand-in for the node."""
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from blockchain import outbox
+from extensions import db
+from models import ChainRegistration
+
+
+class FakeNode:
+    """Mines every broadcast straight away."""
+
+    def __init__(self):
+        self.sent = []
+        self.receipts = {}
+        self.eth = self
+
+    def send_raw_transaction(self, raw):
+        tx_hash = "0x" + hashlib.sha256(raw).hexdigest()
+        self.sent.append(tx_hash)
+        self.receipts[tx_hash] = SimpleNamespace(
+            status=1,
+            blockNumber=len(self.sent),
+            transactionHash=bytes.fromhex(tx_hash[2:]),
+        )
+
+    def get_transaction_receipt(self, tx_hash):
+        from web3.exceptions import TransactionNotFound
+
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+    def get_transaction_count(self, address, block):
+        return 0
+
+
+class FakeSigner:
+    address = "0x" + "11" * 20
+
+    def __init__(self):
+        self._next = 0
+
+    def allocate_nonce(self):
+        self._next += 1
+        return self._next - 1
+
+    def reserve_through(self, nonce):
+        self._next = max(self._next, nonce + 1)
+
+    def resync(self):
+        pass
+
+    def gas_price(self):
+        return 10 ** 9
+
+
+def _sign(items, nonce, gas_price):
+    raw = repr((items, nonce, gas_price)).encode()
+    return SimpleNamespace(hash=hashlib.sha256(raw).digest(), raw_transaction=raw)
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(outbox, "get_w3", lambda: node)
+    monkeypatch.setattr(outbox, "sign_store_results", _sign)
+    monkeypatch.setattr(outbox, "record_receipt_in_mirror", lambda receipt: None)
+    return node
+
+
+@pytest.fixture
+def submitter(tmp_path, node):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'outbox.sqlite3'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        submitter = outbox.OutboxSubmitter(app, batch_size=1)
+        submitter._signer = FakeSigner()
+        yield submitter
+
+
+def _status(image_hash):
+    db.session.expire_all()
+    return ChainRegistration.query.filter_by(image_hash=image_hash).one()
+
+
+def test_failed_registration_is_retried_with_a_fresh_transaction(submitter, node):
+    image_hash = "ab" * 32
+    outbox.enqueue_registration(image_hash, "real", 0.9)
+    submitter.tick()
+    node.receipts[node.sent[0]].status = 0  # the first transaction reverted
+    submitter.tick()
+    assert _status(image_hash).status == "failed"
+
+    outbox.enqueue_registration(image_hash, "real", 0.9)
+    row = _status(image_hash)
+    assert (row.status, row.nonce, row.tx_hashes, row.raw_tx) == ("pending", None, None, None)
+
+    submitter.tick()  # signs and broadcasts the retry
+    submitter.tick()  # finds its receipt
+    row = _status(image_hash)
+    assert row.status == "mined"
+    assert row.tx_hash == node.sent[-1]
+    assert len(node.sent) == 2
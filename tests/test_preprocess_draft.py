@@ -0,0 +1,55 @@
+# tests/test_preprocess_draft.py
+"""
+JPEG draft-mode preprocessing must not move the model's verdicts.
+
+utils.predict._preprocess_image decodes JPEGs at a reduced DCT scale; the
+old path decoded the full image and resized it with nearest neighbour.
+Through the synthetic model (benchmarks/synthetic_model.py) the two inputs
+must give p_fake within SCORE_TOLERANCE of each other, with no real/fake
+flip. The inputs themselves are compared with PIXEL_TOLERANCE: draft mode
+averages 8x8 blocks where nearest neighbour picks single grainy pixels, so
+they are close but not identical.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from benchmarks.preprocess_draft import full_decode, load_interpreter, synthetic_photos
+from benchmarks.synthetic_model import write_synthetic_model
+from utils.predict import IMG_SIZE, _decode_binary_preds, _preprocess_image, predict_batch
+
+# Max |p_fake(draft) - p_fake(full)| per image
+SCORE_TOLERANCE = 0.02
+# Max mean |difference| of the model input, in 0-255 units
+PIXEL_TOLERANCE = 8.0
+
+# 12 MP (decoded at 1/8) and 3 MP (decoded at 1/4) photos
+SIZES = [(4032, 3024), (2000, 1500)]
+
+
+@pytest.fixture(scope="module")
+def interpreter(tmp_path_factory):
+    return load_interpreter(write_synthetic_model(tmp_path_factory.mktemp("model") / "synthetic.tflite"))
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size[0]}x{size[1]}")
+def photos(request, tmp_path_factory):
+    return synthetic_photos(tmp_path_factory.mktemp("photos"), count=3, size=request.param)
+
+
+def test_draft_input_matches_full_decode(photos):
+    for path in photos:
+        full = full_decode(path)
+        draft = _preprocess_image(str(path), np.uint8)
+        assert draft.shape == full.shape == (1, IMG_SIZE[1], IMG_SIZE[0], 3)
+        assert draft.dtype == full.dtype
+        assert np.abs(full.astype(np.int16) - draft.astype(np.int16)).mean() <= PIXEL_TOLERANCE
+
+
+def test_draft_predictions_match_full_decode(photos, interpreter):
+    for path in photos:
+        p_full = np.asarray(predict_batch(interpreter, full_decode(path))).ravel()
+        p_draft = np.asarray(predict_batch(interpreter, _preprocess_image(str(path), np.uint8))).ravel()
+        assert np.abs(p_full - p_draft).max() <= SCORE_TOLERANCE
+        assert _decode_binary_preds(p_full)[0] == _decode_binary_preds(p_draft)[0]
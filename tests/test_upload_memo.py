@@ -0,0 +1,59 @@
+# tests/test_upload_memo.py
+"""The raw-bytes upload memo must give the same hashes and pixels as decoding."""
+import io
+
+import pytest
+
+from benchmarks.upload_memo import SYNTHETIC_IMAGES, synthetic_images, upload_of
+from utils import upload_memo
+from utils.hash_utils import get_image_hash
+from utils.upload_memo import UploadMemo, bytes_digest
+
+
+@pytest.fixture
+def memo(state_dir, monkeypatch):
+    """A fresh process-wide memo in an empty state directory."""
+    memo = UploadMemo()
+    monkeypatch.setattr(upload_memo, "UPLOAD_MEMO_ENABLED", True)
+    monkeypatch.setattr(upload_memo, "_memo", memo)
+    return memo
+
+
+@pytest.fixture(scope="module")
+def images(tmp_path_factory):
+    return {path.name: path for path in synthetic_images(tmp_path_factory.mktemp("images"), size=(320, 240))}
+
+
+@pytest.mark.parametrize("name", [name for name, _, _ in SYNTHETIC_IMAGES])
+def test_memo_matches_decode(name, images, memo):
+    path = images[name]
+    data = path.read_bytes()
+
+    decoded = upload_of(data, name, use_memo=False)
+    expected = (get_image_hash(str(path)), decoded.perceptual_hash)
+    assert decoded.pixel_hash == expected[0]
+
+    miss = upload_of(data, name)
+    assert not miss.memo_hit
+    assert (miss.pixel_hash, miss.perceptual_hash) == expected
+
+    hit = upload_of(data, name)
+    assert hit.memo_hit
+    assert not hit.decoded
+    assert (hit.pixel_hash, hit.perceptual_hash) == expected
+    # Pixels asked for after a hit decode lazily to the same image
+    assert hit.rgb.tobytes() == decoded.rgb.tobytes()
+
+    # Another worker on the box: empty LRU, same SQLite file
+    fresh_worker = UploadMemo(memory_items=0)
+    assert fresh_worker.get(bytes_digest(io.BytesIO(data))) == expected
+
+
+def test_other_decoder_versions_are_purged(images, memo):
+    data = images["rgb.png"].read_bytes()
+    upload_of(data, "rgb.png")
+    digest = bytes_digest(io.BytesIO(data))
+
+    upgraded = UploadMemo(memory_items=0, decoder_version="Pillow-0.0.0")
+    assert upgraded.get(digest) is None
+    assert UploadMemo(memory_items=0).get(digest) is None
@@ -0,0 +1,181 @@
+# utils/batching.py
+"""
+Micro-batching inference scheduler.
+
+Concurrent /analyze requests submit their preprocessed (1, 299, 299, 3)
+tensors here. Worker threads collect them into batches of up to
+max_batch_size (waiting at most max_wait_ms for the batch to fill), run a
+single batched invoke via utils.predict.predict_batch and resolve each
+caller's future with its own row of predictions. With an InterpreterPool
+there is one worker per pooled interpreter, so batches run in parallel.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils import metrics
+from utils.predict import predict_batch
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = metrics.gauge(
+    "inference_queue_depth",
+    "Requests waiting for the inference scheduler.",
+    ("scheduler",),
+)
+BATCH_SIZE = metrics.histogram(
+    "inference_batch_size",
+    "Number of images per batched model invoke.",
+    ("scheduler",),
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QUEUE_WAIT = metrics.histogram(
+    "inference_queue_wait_seconds",
+    "Time a request spent queued before its batch started.",
+    ("scheduler",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+BUSY_WORKERS = metrics.gauge(
+    "inference_scheduler_busy_workers",
+    "Scheduler workers currently running a batch.",
+    ("scheduler",),
+)
+WORKERS = metrics.gauge(
+    "inference_scheduler_workers",
+    "Scheduler worker threads (batches that can run at once).",
+    ("scheduler",),
+)
+BATCH_LATENCY = metrics.histogram(
+    "inference_batch_seconds",
+    "Wall time of one batched model invoke.",
+    ("scheduler",),
+)
+
+_STOP = object()
+
+
+class InferenceScheduler:
+    """
+    Collect concurrent inference requests into batches.
+
+    model_obj: TFLite interpreter, InterpreterPool or Keras model (anything predict_batch accepts)
+    max_batch_size: upper bound on images per invoke
+    max_wait_ms: how long the first request of a batch waits for company
+    workers: batches that may run concurrently (the model must be thread-safe
+             for workers > 1, e.g. an InterpreterPool)
+    """
+
+    def __init__(self, model_obj, max_batch_size=8, max_wait_ms=5.0, name="default", workers=1):
+        if model_obj is None:
+            raise ValueError("InferenceScheduler needs a loaded model")
+        self.model = model_obj
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"inference-scheduler-{name}-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        QUEUE_DEPTH.set_function(self._queue.qsize, scheduler=name)
+        BUSY_WORKERS.set_function(lambda: self._busy, scheduler=name)
+        WORKERS.set(len(self._threads), scheduler=name)
+        logger.info(
+            f"[batching] Scheduler '{name}' started "
+            f"(max_batch_size={self.max_batch_size}, max_wait_ms={max_wait_ms}, "
+            f"workers={len(self._threads)})"
+        )
+
+    # --- Public API ---
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, x: np.ndarray) -> Future:
+        """Queue one preprocessed image (shape (1, H, W, C) or (H, W, C))."""
+        if self._closed:
+            raise RuntimeError("InferenceScheduler is closed")
+        if x.ndim == 3:
+            x = np.expand_dims(x, axis=0)
+        future = Future()
+        self._queue.put((x, future, time.perf_counter()))
+        return future
+
+    def infer(self, x: np.ndarray, timeout=None) -> np.ndarray:
+        """Blocking helper: submit and wait for this image's raw predictions."""
+        return self.submit(x).result(timeout=timeout)
+
+    def close(self):
+        """Stop accepting work; queued requests are still served."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    # --- Worker ---
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # let the outer loop see it
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.put(_STOP)  # wake the next worker too
+                return
+
+            batch = self._collect_batch(first)
+
+            # Skip requests whose callers already gave up
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._busy_lock:
+                self._busy += 1
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                QUEUE_WAIT.observe(started - enqueued_at, scheduler=self.name)
+            BATCH_SIZE.observe(len(batch), scheduler=self.name)
+
+            try:
+                # Items are written straight into the input tensor; no concatenated copy
+                preds = predict_batch(self.model, [item[0] for item in batch])
+            except Exception as e:
+                logger.error(f"[batching] Batched inference failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                BATCH_LATENCY.observe(time.perf_counter() - started, scheduler=self.name)
+                with self._busy_lock:
+                    self._busy -= 1
+
+            for i, (_, future, _) in enumerate(batch):
+                future.set_result(preds[i])
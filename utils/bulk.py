@@ -0,0 +1,176 @@
+# utils/bulk.py
+"""
+Pipelined bulk verification for /api/verify.
+
+Images come from a multipart list or a zip archive and are read one at a
+time. At most BULK_MAX_IN_FLIGHT of them are being processed at once, so
+memory stays bounded however large the archive is. Decoding, hashing, the
+chain lookup and inference (utils.verification.decide) run on a thread pool
+of the same size. Every worker submits to the shared InferenceScheduler,
+so concurrent images are batched into one invoke. Results are yielded in
+completion order. The database side effects (outbox, history log) run in
+the caller's thread, which keeps them inside the request's app context.
+
+Config (env):
+  BULK_MAX_IN_FLIGHT        images being processed concurrently (default 16)
+  BULK_MAX_ITEMS            images per request (default 10000)
+  BULK_MAX_MEMBER_MB        largest zip member that is read (default 32)
+"""
+import io
+import logging
+import os
+import posixpath
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from werkzeug.datastructures import FileStorage
+
+from utils.image_pipeline import DecodedUpload
+from utils.request_timing import StageTimer
+from utils.thumbnails import schedule_thumbnail
+from utils.verification import decide, public_view, record_outcome, register
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "16"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+BULK_MAX_MEMBER_BYTES = int(os.getenv("BULK_MAX_MEMBER_MB", "32")) * 1024 * 1024
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+
+
+class BulkItem:
+    """One image to verify: its position, name and a callable that opens it."""
+
+    def __init__(self, index, name, open_fn):
+        self.index = index
+        self.name = name
+        self.open = open_fn
+
+
+def items_from_files(file_storages):
+    """BulkItems for a multipart list (request.files.getlist(...))."""
+    for index, fs in enumerate(file_storages):
+        yield BulkItem(index, fs.filename or f"image-{index}", lambda fs=fs: fs)
+
+
+def items_from_zip(archive: zipfile.ZipFile):
+    """
+    BulkItems for the image members of a zip archive (read lazily, one at a time).
+
+    Members over BULK_MAX_MEMBER_BYTES are yielded with an opener that
+    raises, so they show up as per-image errors instead of being inflated.
+    """
+    index = 0
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        base = posixpath.basename(info.filename)
+        if base.startswith(".") or os.path.splitext(base)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        yield BulkItem(index, info.filename, lambda info=info: _open_member(archive, info))
+        index += 1
+
+
+def _open_member(archive, info):
+    if info.file_size > BULK_MAX_MEMBER_BYTES:
+        raise ValueError(f"archive member is larger than {BULK_MAX_MEMBER_BYTES} bytes")
+    with archive.open(info) as member:
+        data = member.read(BULK_MAX_MEMBER_BYTES + 1)
+    if len(data) > BULK_MAX_MEMBER_BYTES:
+        raise ValueError(f"archive member is larger than {BULK_MAX_MEMBER_BYTES} bytes")
+    return FileStorage(stream=io.BytesIO(data), filename=posixpath.basename(info.filename))
+
+
+def _error_result(item, message):
+    return {"index": item.index, "name": item.name, "error": message}
+
+
+class BulkVerifier:
+    """
+    Verify many images with a bounded in-flight window.
+
+    model / scheduler / verdict_cache: as returned by globals.get_*()
+    images_dir: where originals are stored for display (static/images)
+    """
+
+    def __init__(self, model, scheduler, verdict_cache, images_dir,
+                 max_in_flight=BULK_MAX_IN_FLIGHT, max_items=BULK_MAX_ITEMS):
+        self.model = model
+        self.scheduler = scheduler
+        self.verdict_cache = verdict_cache
+        self.images_dir = images_dir
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_items = max(1, int(max_items))
+
+    def _process(self, item):
+        """Worker thread: read, decode, hash, store, chain lookup + ML verdict."""
+        timer = StageTimer("api_verify")
+        with timer.stage("decode"):
+            upload = DecodedUpload(item.open())
+        with timer.stage("save"):
+            upload.save_if_missing(self.images_dir)
+            schedule_thumbnail(upload)
+        decision = decide(upload, self.model, self.scheduler, self.verdict_cache, timer=timer)
+        decision["_timer"] = timer
+        return decision
+
+    def _finish(self, item, future, on_decision):
+        try:
+            decision = future.result()
+        except Exception as e:
+            return _error_result(item, f"could not verify image: {e}")
+
+        # Outbox / history writes happen here, in the request thread
+        timer = decision["_timer"]
+        record_outcome(timer, decision)
+        with timer.stage("register"):
+            register(decision)
+        if on_decision is not None:
+            try:
+                with timer.stage("history_log"):
+                    on_decision(decision)
+            except Exception as e:
+                logger.warning(f"[bulk] Post-verification hook failed for {item.name}: {e}")
+        timer.finish(image_hash=decision["image_hash"], name=item.name)
+        return {"index": item.index, "name": item.name, **public_view(decision)}
+
+    def run(self, items, on_decision=None):
+        """
+        Yield one result dict per item, in completion order.
+
+        on_decision(decision) is called in the caller's thread after
+        registration (e.g. to log the image in the history tables).
+        """
+        pending = {}
+        items = iter(items)
+        exhausted = False
+        submitted = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="bulk-verify") as pool:
+            try:
+                while True:
+                    # Top the window up; the next item is only read once there is room
+                    while not exhausted and len(pending) < self.max_in_flight:
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        if submitted >= self.max_items:
+                            exhausted = True
+                            yield _error_result(item, f"request exceeds {self.max_items} images; stopped here")
+                            break
+                        pending[pool.submit(self._process, item)] = item
+                        submitted += 1
+
+                    if not pending:
+                        return
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._finish(pending.pop(future), future, on_decision)
+            finally:
+                # Client went away: don't start work for images nobody will read
+                for future in pending:
+                    future.cancel()
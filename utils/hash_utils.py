@@ -1,17 +1,36 @@
 from PIL import Image
 import hashlib
 
+def get_image_pixel_hash_from_image(img):
+    """Generate a SHA-256 hash of the RGB pixel data of an already-decoded PIL image."""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return hashlib.sha256(img.tobytes()).hexdigest()
+
+def get_image_dhash_from_image(img, hash_size=8):
+    """
+    Perceptual difference hash (dHash) of an already-decoded PIL image, as hex.
+
+    The image is shrunk to (hash_size + 1) x hash_size grayscale and each bit
+    says whether a pixel is brighter than its right neighbour, so resized or
+    recompressed copies land within a few bits of the original.
+    """
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
 def get_image_pixel_hash_from_stream(file_stream):
     """Generate a SHA-256 hash of image pixel data from an in-memory stream."""
     file_stream.seek(0)  # reset stream pointer before reading
     with Image.open(file_stream) as img:
-        img = img.convert('RGB')
-        pixels = img.tobytes()
-        return hashlib.sha256(pixels).hexdigest()
+        return get_image_pixel_hash_from_image(img)
 
 def get_image_hash(image_path):
     """Generate a SHA-256 hash of image pixel data from an image file path."""
     with Image.open(image_path) as img:
-        img = img.convert('RGB')
-        pixels = img.tobytes()
-        return hashlib.sha256(pixels).hexdigest()
+        return get_image_pixel_hash_from_image(img)
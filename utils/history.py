@@ -0,0 +1,428 @@
+# utils/history.py
+"""
+One-time history logging of verified images (User + ImageRecord).
+
+The database is logging only; it never takes part in verification, so
+requests don't write to it themselves. log_image_if_new() puts an event
+on a bounded in-memory queue and returns. A background HistoryWriter (one
+per worker) bulk-inserts queued events every HISTORY_BATCH_SIZE events or
+HISTORY_FLUSH_MS milliseconds, whichever comes first.
+
+Rows are written with INSERT ... ON CONFLICT DO NOTHING (image_record on
+image_hash, user on email), so re-uploads — including concurrent ones —
+are no-ops. User ids come from an in-process email -> user_id cache and
+are upserted in bulk on a miss. On Postgres and SQLite a batch costs one
+multi-row INSERT plus COMMIT. Other dialects fall back to row-by-row
+insert-and-catch-IntegrityError.
+
+Backpressure: when the queue is full, log_image_if_new waits up to
+HISTORY_ENQUEUE_TIMEOUT_MS for room. After that the event goes to the
+spill file, or is dropped (and counted) if there is none.
+
+Durability: if a batch cannot be written (database down), its events are
+appended to HISTORY_SPILL_FILE (NDJSON in LOCAL_STATE_DIR). One worker
+per box replays the spill file once the database accepts writes again.
+On interpreter exit (atexit) the queue is drained and flushed.
+
+Config (env):
+  HISTORY_WRITE_BEHIND         queue + background flush (default true;
+                               false = write inside the request)
+  HISTORY_BATCH_SIZE           events per bulk insert (default 200)
+  HISTORY_FLUSH_MS             max time an event waits in the queue (default 250)
+  HISTORY_QUEUE_MAX            queue capacity (default 10000)
+  HISTORY_ENQUEUE_TIMEOUT_MS   how long a request waits for room (default 50)
+  HISTORY_SPILL_FILE           spill file name ("" disables; default history_spill.ndjson)
+  USER_ID_CACHE_SIZE           emails remembered per worker (default 10000)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.user import User
+from models.image_record import ImageRecord
+from utils import metrics
+from utils.local_store import file_lock, state_path, try_acquire_leader
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "True").lower() == "true"
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_MS = float(os.getenv("HISTORY_FLUSH_MS", "250"))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+HISTORY_ENQUEUE_TIMEOUT_MS = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT_MS", "50"))
+HISTORY_SPILL_FILE = os.getenv("HISTORY_SPILL_FILE", "history_spill.ndjson")
+USER_ID_CACHE_SIZE = int(os.getenv("USER_ID_CACHE_SIZE", "10000"))
+
+EVENTS = metrics.counter(
+    "history_events_total",
+    "History log events, by outcome.",
+    ("result",),
+)
+QUEUE_DEPTH = metrics.gauge(
+    "history_queue_depth",
+    "History events waiting for the background writer.",
+)
+FLUSH_LATENCY = metrics.histogram(
+    "history_flush_seconds",
+    "Time to bulk-insert one batch of history events.",
+)
+FLUSH_SIZE = metrics.histogram(
+    "history_flush_batch_size",
+    "History events per bulk insert.",
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+
+_STOP = object()
+
+
+# --- email -> user_id cache ---
+
+_user_ids = OrderedDict()
+_user_ids_lock = threading.Lock()
+
+
+def _cached_user_id(email):
+    with _user_ids_lock:
+        user_id = _user_ids.get(email)
+        if user_id is not None:
+            _user_ids.move_to_end(email)
+        return user_id
+
+
+def _remember_user_id(email, user_id):
+    with _user_ids_lock:
+        _user_ids[email] = user_id
+        _user_ids.move_to_end(email)
+        while len(_user_ids) > USER_ID_CACHE_SIZE:
+            _user_ids.popitem(last=False)
+
+
+def _forget_user_ids(emails):
+    with _user_ids_lock:
+        for email in emails:
+            _user_ids.pop(email, None)
+
+
+# --- Bulk writes ---
+
+def _insert_ignore(model, rows, conflict_column):
+    """
+    Multi-row INSERT ... ON CONFLICT (conflict_column) DO NOTHING for
+    Postgres and SQLite; row-by-row INSERT (IntegrityError swallowed) elsewhere.
+    """
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(model.__table__.insert().values(**row))
+            except IntegrityError:
+                pass
+        return
+
+    db.session.execute(
+        insert(model.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[conflict_column])
+    )
+
+
+def _resolve_user_ids(events):
+    """email -> user_id for every event, creating unknown users in one upsert."""
+    ids = {}
+    missing = {}
+    for ev in events:
+        email = ev["email"]
+        if email in ids or email in missing:
+            continue
+        user_id = _cached_user_id(email)
+        if user_id is not None:
+            ids[email] = user_id
+        else:
+            missing[email] = {
+                "email": email,
+                "age": ev["age"],
+                "gender": ev["gender"],
+                "occupation": ev["occupation"],
+                "timestamp": datetime.utcnow(),
+            }
+
+    if missing:
+        _insert_ignore(User, list(missing.values()), "email")
+        rows = db.session.execute(select(User.email, User.id).where(User.email.in_(list(missing)))).all()
+        for email, user_id in rows:
+            ids[email] = user_id
+            _remember_user_id(email, user_id)
+    return ids
+
+
+def write_events(events):
+    """
+    Insert a batch of history events (needs an app context). Commits.
+
+    Each event is a dict with email, age, gender, occupation, image_filename,
+    image_hash, label, confidence, phash and logged_at.
+    """
+    # First event per hash wins, like the one-at-a-time path
+    unique = {}
+    for ev in events:
+        unique.setdefault(ev["image_hash"], ev)
+    events = list(unique.values())
+
+    for attempt in range(2):
+        try:
+            user_ids = _resolve_user_ids(events)
+            _insert_ignore(
+                ImageRecord,
+                [
+                    {
+                        "user_id": user_ids[ev["email"]],
+                        "image_filename": ev["image_filename"],
+                        "image_hash": ev["image_hash"],
+                        "phash": ev.get("phash"),
+                        "label": ev["label"],
+                        "confidence": ev["confidence"],
+                        "timestamp": datetime.fromisoformat(ev["logged_at"]),
+                    }
+                    for ev in events
+                ],
+                "image_hash",
+            )
+            db.session.commit()
+            return len(events)
+        except IntegrityError:
+            # A cached user_id no longer exists (user deleted): look them up again once
+            db.session.rollback()
+            _forget_user_ids({ev["email"] for ev in events})
+            if attempt:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+# --- Spill file ---
+
+_spill_lock = threading.Lock()
+# Every worker appends to the spill file and the replayer renames it away;
+# both happen under this box-wide lock, so no append lands in a renamed file
+SPILL_LOCK_NAME = "history_spill_file"
+
+
+def _spill(events):
+    """Append events to the spill file; returns False if spilling is disabled or fails."""
+    if not HISTORY_SPILL_FILE:
+        return False
+    try:
+        data = "".join(json.dumps(ev) + "\n" for ev in events)
+        with _spill_lock, file_lock(SPILL_LOCK_NAME):
+            with open(state_path(HISTORY_SPILL_FILE), "a", encoding="utf-8") as f:
+                f.write(data)
+        return True
+    except OSError as e:
+        logger.error(f"[history] Could not write spill file: {e}")
+        return False
+
+
+def replay_spill_file(batch_size=HISTORY_BATCH_SIZE):
+    """
+    Write spilled events to the database (needs an app context).
+
+    The file is renamed (under the lock _spill() appends with) before it is
+    read, so new spills go to a fresh file and a failed replay leaves the
+    events on disk for the next attempt.
+    """
+    if not HISTORY_SPILL_FILE:
+        return 0
+    path = state_path(HISTORY_SPILL_FILE)
+    replaying = path.with_name(path.name + ".replaying")
+
+    if not replaying.exists():
+        with file_lock(SPILL_LOCK_NAME):
+            if not path.exists() or path.stat().st_size == 0:
+                return 0
+            os.replace(path, replaying)
+
+    written = 0
+    batch = []
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                continue  # torn last line after a crash
+            if len(batch) >= batch_size:
+                written += write_events(batch)
+                batch = []
+    if batch:
+        written += write_events(batch)
+
+    os.unlink(replaying)
+    EVENTS.inc(written, result="replayed")
+    logger.info(f"[history] Replayed {written} spilled history events")
+    return written
+
+
+# --- Write-behind queue ---
+
+class HistoryWriter(threading.Thread):
+    """Background bulk writer for history events (one per worker process)."""
+
+    def __init__(self, app, batch_size=HISTORY_BATCH_SIZE, flush_ms=HISTORY_FLUSH_MS,
+                 max_queue=HISTORY_QUEUE_MAX):
+        super().__init__(name="history-writer", daemon=True)
+        self.app = app
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stopped = threading.Event()
+        # One worker per box replays the (shared) spill file
+        self._replayer = bool(HISTORY_SPILL_FILE) and try_acquire_leader("history_spill")
+        QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def enqueue(self, event, timeout) -> bool:
+        """Queue one event, waiting up to timeout seconds for room."""
+        if self._stopped.is_set():
+            return False
+        try:
+            self._queue.put(event, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self, timeout=10.0):
+        """Flush everything still queued and stop (called at exit)."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(_STOP)
+        self.join(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                written = write_events(batch)
+        except Exception as e:
+            logger.error(f"[history] Bulk insert of {len(batch)} events failed: {e}")
+            EVENTS.inc(len(batch), result="spilled" if _spill(batch) else "dropped")
+            return
+        finally:
+            FLUSH_LATENCY.observe(time.perf_counter() - started)
+        FLUSH_SIZE.observe(len(batch))
+        EVENTS.inc(written, result="flushed")
+
+        # The database takes writes again: catch up on anything spilled earlier
+        if self._replayer:
+            try:
+                with self.app.app_context():
+                    replay_spill_file()
+            except Exception as e:
+                logger.warning(f"[history] Spill file replay failed (will retry): {e}")
+
+    def run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._flush(batch)
+
+
+_writer = None
+
+
+def start_history_writer(app):
+    """Start this worker's HistoryWriter (no-op if write-behind is disabled)."""
+    global _writer
+    if not HISTORY_WRITE_BEHIND or _writer is not None:
+        return _writer
+    _writer = HistoryWriter(app)
+    _writer.start()
+    atexit.register(_writer.stop)
+    return _writer
+
+
+def parse_age(value):
+    """Age from a form field as an int (0-150), or None if it isn't one; routes answer 400 on None."""
+    try:
+        age = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return age if 0 <= age <= 150 else None
+
+
+def log_image_if_new(email, age, gender, occupation,
+                     image_filename, image_hash, label, confidence, phash=None):
+    """
+    Logging ONLY (no verification logic):
+
+    - If image_hash already exists in ImageRecord -> do NOTHING.
+    - If not -> create User (if needed) and insert ONE ImageRecord row.
+    - DB is never used for detection/verification, only for storing history once.
+
+    With the write-behind writer running this only queues the event.
+    age must already be an int (see parse_age).
+    """
+    if not image_hash or not label:
+        return
+
+    event = {
+        "email": email,
+        "age": age,
+        "gender": gender,
+        "occupation": occupation,
+        "image_filename": image_filename,
+        "image_hash": image_hash,
+        "label": label.lower(),
+        "confidence": confidence if confidence is not None else 0.0,
+        "phash": phash,
+        "logged_at": datetime.utcnow().isoformat(),
+    }
+
+    if _writer is None:
+        write_events([event])
+        EVENTS.inc(result="flushed")
+        return
+
+    if _writer.enqueue(event, timeout=HISTORY_ENQUEUE_TIMEOUT_MS / 1000.0):
+        EVENTS.inc(result="queued")
+    elif _spill([event]):
+        EVENTS.inc(result="spilled")
+    else:
+        EVENTS.inc(result="dropped")
+        logger.warning("[history] Queue full and no spill file; dropped a history event")
@@ -0,0 +1,148 @@
+# utils/image_pipeline.py
+"""
+Decode-once upload pipeline for /analyze.
+
+The upload is spooled in memory (up to UPLOAD_SPOOL_MAX_BYTES, then to an
+anonymous temp file) by SpooledRequest, decoded at most once with PIL, and
+the resulting RGB buffer is shared by the SHA-256 pixel hash, the
+perceptual hash and the 299x299 model preprocessing. Byte-identical
+re-uploads take both hashes from the raw-bytes memo (utils/upload_memo.py)
+and are only decoded if the pixels are still needed. The original bytes
+are only written to static/images when that file does not exist yet.
+"""
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from tempfile import SpooledTemporaryFile, TemporaryFile
+
+import numpy as np
+from flask import Request
+from PIL import Image
+
+from utils.hash_utils import get_image_dhash_from_image, get_image_pixel_hash_from_image
+from utils.predict import preprocess_pil
+from utils.upload_memo import bytes_digest, get_memo
+
+# Uploads up to this size stay in memory; larger ones spill to an unnamed temp file
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class SpooledRequest(Request):
+    """
+    Flask request whose file uploads are spooled in memory up to spool_max_bytes each.
+
+    spool_memory_budget (None = unlimited) caps the in-memory spool of the
+    whole request: once the parts so far could use it up, later parts go
+    straight to an unnamed temp file. Routes taking many files lower both
+    before touching request.files.
+    """
+
+    spool_max_bytes = UPLOAD_SPOOL_MAX_BYTES
+    spool_memory_budget = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.spool_memory_budget is not None:
+            reserved = getattr(self, "_spool_reserved", 0)
+            if reserved + self.spool_max_bytes > self.spool_memory_budget:
+                return TemporaryFile(mode="rb+")
+            self._spool_reserved = reserved + self.spool_max_bytes
+        return SpooledTemporaryFile(max_size=self.spool_max_bytes, mode="rb+")
+
+
+class DecodedUpload:
+    """
+    One uploaded image, decoded at most once.
+
+    file_storage: werkzeug FileStorage from request.files
+    use_memo: look the raw bytes up in the upload memo (and record them)
+
+    memo_hit is True when the hashes came from the memo; the image is then
+    decoded lazily, the first time .rgb is read (from any thread).
+    saved_path is set once save_if_missing() has stored the original.
+    """
+
+    def __init__(self, file_storage, use_memo=True):
+        self.filename = file_storage.filename or ""
+        self.ext = os.path.splitext(self.filename)[1]
+        self.stream = file_storage.stream
+        self._rgb = None
+        self._decode_lock = threading.Lock()
+        self._perceptual_hash = None
+        self._model_input = None
+
+        self.memo_hit = False
+        self.saved_path = None
+
+        memo = get_memo() if use_memo else None
+        if memo is not None:
+            digest = bytes_digest(self.stream)
+            hashes = memo.get(digest)
+            if hashes is not None:
+                self.pixel_hash, self._perceptual_hash = hashes
+                self.memo_hit = True
+                return
+
+        self.pixel_hash = get_image_pixel_hash_from_image(self.rgb)
+        if memo is not None:
+            memo.put(digest, self.pixel_hash, self.perceptual_hash)
+
+    @property
+    def rgb(self):
+        """The decoded image in RGB mode (decoded on first access)."""
+        if self._rgb is None:
+            # Speculative inference and the request thread may both get here
+            with self._decode_lock:
+                if self._rgb is None:
+                    self.stream.seek(0)
+                    with Image.open(self.stream) as img:
+                        self._rgb = img.convert("RGB")
+        return self._rgb
+
+    @property
+    def decoded(self) -> bool:
+        """True once the RGB buffer exists (reading .rgb costs nothing)."""
+        return self._rgb is not None
+
+    @property
+    def stored_filename(self) -> str:
+        """Name used in static/images: <pixel hash><original extension>."""
+        return f"{self.pixel_hash}{self.ext}"
+
+    @property
+    def perceptual_hash(self) -> str:
+        """64-bit dHash (16 hex chars) for near-duplicate lookups, from the shared RGB buffer."""
+        if self._perceptual_hash is None:
+            self._perceptual_hash = get_image_dhash_from_image(self.rgb)
+        return self._perceptual_hash
+
+    def model_input(self, dtype=np.float32):
+        """
+        Preprocessed (1, 299, 299, 3) batch, built from the shared RGB buffer.
+
+        dtype: float32 ([0, 1]) or uint8 (raw pixels; utils.predict scales
+        them while writing the interpreter's input tensor).
+        """
+        if self._model_input is None or self._model_input.dtype != np.dtype(dtype):
+            self._model_input = preprocess_pil(self.rgb, dtype)
+        return self._model_input
+
+    def save_if_missing(self, directory: Path) -> Path:
+        """
+        Write the original upload bytes to directory/<stored_filename> unless it already exists.
+
+        The bytes go to a uniquely named part file first and are then renamed
+        into place, so concurrent uploads of the same image never collide.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        dest = directory / self.stored_filename
+        if not dest.exists():
+            part = directory / f".{self.stored_filename}.{uuid.uuid4().hex}.part"
+            with self._decode_lock:  # don't move the stream under a lazy decode
+                self.stream.seek(0)
+                with open(part, "wb") as out:
+                    shutil.copyfileobj(self.stream, out)
+            os.replace(part, dest)
+        self.saved_path = dest
+        return dest
@@ -0,0 +1,403 @@
+# utils/inference_server.py
+"""
+Out-of-process inference: one model per box instead of one per gunicorn worker.
+
+    python inference_server.py                # owns the interpreter pool + scheduler
+    INFERENCE_SERVER_ENABLED=True gunicorn …  # workers send tensors to it
+
+The server loads the TFLite pool and the micro-batching scheduler exactly
+as a worker would (globals.load_model(in_process=True)) and listens on a
+unix socket. Each client thread owns one shared-memory segment and one
+socket connection. To run an image it copies the preprocessed tensor into
+its segment and sends a small JSON frame on the socket ({"op": "infer",
+"shm": name, "shape": …, "dtype": …}). The server maps the segment,
+submits a view of it to the scheduler and answers with the raw
+predictions, so concurrent requests from all workers are batched
+together. The tensor itself never goes through the socket.
+
+InferenceClient stands in for the scheduler inside the web workers
+(globals.get_model() / get_scheduler() return it). Calls time out after
+INFERENCE_SERVER_TIMEOUT_S and go through a circuit breaker. Errors are
+raised to the caller by default. With INFERENCE_FALLBACK=local (opt-in) an
+image whose call failed in transport (server not listening, connection
+reset, shared-memory segment gone) is run in-process instead; that loads
+the whole model into the worker for good, so it is never done for errors
+the server reports (queue timeouts, failed invokes), for client timeouts
+or while the breaker is open.
+
+Frames are a 4-byte big-endian length followed by UTF-8 JSON.
+
+Config (env):
+  INFERENCE_SERVER_ENABLED    workers use the server (default False)
+  INFERENCE_SERVER_SOCKET     unix socket path (default LOCAL_STATE_DIR/inference.sock)
+  INFERENCE_SERVER_TIMEOUT_S  per-call timeout in the client (default 5)
+  INFERENCE_FALLBACK          none | local: what a worker does when the server can't be
+                              reached (default none)
+  INFERENCE_CLIENT_THREADS    threads behind InferenceClient.submit() (default 8)
+"""
+import atexit
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from blockchain.client import CircuitBreaker
+from utils import metrics
+from utils.local_store import state_path
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_SERVER_ENABLED = os.getenv("INFERENCE_SERVER_ENABLED", "False").lower() == "true"
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET") or str(state_path("inference.sock"))
+INFERENCE_SERVER_TIMEOUT_S = float(os.getenv("INFERENCE_SERVER_TIMEOUT_S", "5"))
+INFERENCE_FALLBACK = os.getenv("INFERENCE_FALLBACK", "none").lower()
+INFERENCE_CLIENT_THREADS = int(os.getenv("INFERENCE_CLIENT_THREADS", "8"))
+
+MAX_FRAME_BYTES = 1024 * 1024
+
+REMOTE_CALLS = metrics.counter(
+    "inference_remote_calls_total",
+    "Inference calls made through the inference server, by result (ok, fallback, error).",
+    ("result",),
+)
+REMOTE_LATENCY = metrics.histogram(
+    "inference_remote_seconds",
+    "Round trip of one inference server call (fallbacks included).",
+)
+
+
+class InferenceTransportError(ConnectionError):
+    """The request never got a model answer: no server, broken connection or missing segment."""
+
+
+class InferenceServerError(RuntimeError):
+    """The server answered with an error (timeout in its queue, failed invoke, ...)."""
+
+
+# --- Framing ---
+
+
+def send_frame(sock, obj):
+    payload = json.dumps(obj).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock):
+    (length,) = struct.unpack(">I", _recv_exact(sock, 4))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+    return json.loads(_recv_exact(sock, length).decode("utf-8"))
+
+
+def _attach_segment(name):
+    """Map a client's segment without letting this process's resource tracker unlink it later."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def _close_segment(shm):
+    if shm is None:
+        return
+    try:
+        shm.close()
+    except BufferError:
+        # A queued view is still alive; the mapping goes away once it is collected
+        pass
+
+
+# --- Server ---
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """One client connection (one client thread); requests on it are sequential."""
+
+    def handle(self):
+        shm = None
+        try:
+            while True:
+                try:
+                    request = recv_frame(self.request)
+                except (EOFError, ConnectionError):
+                    return
+                op = request.get("op")
+                try:
+                    if op == "info":
+                        send_frame(self.request, {"ok": True, **self.server.info})
+                    elif op == "infer":
+                        if shm is None or shm.name != request["shm"]:
+                            _close_segment(shm)
+                            shm = None
+                            try:
+                                shm = _attach_segment(request["shm"])
+                            except FileNotFoundError as e:
+                                send_frame(self.request, {"ok": False, "transport": True, "error": f"segment: {e}"})
+                                continue
+                        x = np.ndarray(tuple(request["shape"]), dtype=np.dtype(request["dtype"]), buffer=shm.buf)
+                        try:
+                            preds = self.server.scheduler.infer(x, timeout=self.server.timeout_s)
+                        finally:
+                            del x
+                        send_frame(self.request, {"ok": True, "preds": np.asarray(preds).ravel().tolist()})
+                    else:
+                        send_frame(self.request, {"ok": False, "error": f"unknown op {op!r}"})
+                except (EOFError, ConnectionError):
+                    return
+                except Exception as e:
+                    send_frame(self.request, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            _close_segment(shm)
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    """Unix-socket front-end for an InferenceScheduler; one thread per client connection."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, scheduler, info, timeout_s=60.0):
+        self.scheduler = scheduler
+        self.info = info
+        self.timeout_s = timeout_s
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+
+
+def serve(socket_path=INFERENCE_SERVER_SOCKET):
+    """Load the model in this process and serve it until SIGTERM/SIGINT."""
+    import globals as model_globals
+    from utils.predict import input_dtype
+
+    model_globals.load_model(in_process=True)
+    scheduler = model_globals.get_scheduler()
+    if scheduler is None:
+        raise SystemExit("[inference_server] Model did not load; nothing to serve.")
+
+    model = model_globals.get_model()
+    info = {
+        "model_version": model_globals.MODEL_VERSION,
+        "variant": model_globals.TFLITE_VARIANT,
+        "input_dtype": np.dtype(input_dtype(model)).name,
+        "interpreters": getattr(model, "size", 1),
+        "pid": os.getpid(),
+    }
+    server = InferenceServer(socket_path, scheduler, info)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"[inference_server] Serving model {info['model_version']} ({info['variant']}) on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        scheduler.close()
+
+
+# --- Client ---
+
+
+class InferenceClient:
+    """
+    Scheduler-compatible client (submit / infer) for the inference server.
+
+    fallback: callable returning an in-process scheduler, used (and only
+    built, once) when a call fails in transport; None re-raises instead.
+    """
+
+    def __init__(self, socket_path=INFERENCE_SERVER_SOCKET, timeout_s=INFERENCE_SERVER_TIMEOUT_S,
+                 fallback=None, threads=INFERENCE_CLIENT_THREADS):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self.breaker = CircuitBreaker("inference_server")
+        self.input_dtype = np.dtype(np.float32)
+        self.model_version = None
+
+        self._fallback_factory = fallback
+        self._fallback = None
+        self._fallback_loaded = False
+        self._fallback_lock = threading.Lock()
+        self._local = threading.local()
+        self._segments = set()
+        self._segments_lock = threading.Lock()
+        self._threads = max(1, int(threads))
+        self._executor = None
+        atexit.register(self.close)
+
+    # --- Per-thread connection and segment ---
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout_s)
+            try:
+                conn.connect(self.socket_path)
+            except Exception:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _segment(self, nbytes):
+        shm = getattr(self._local, "shm", None)
+        if shm is None or shm.size < nbytes:
+            self._drop_segment()
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            with self._segments_lock:
+                self._segments.add(shm)
+            self._local.shm = shm
+        return shm
+
+    def _drop_segment(self):
+        shm = getattr(self._local, "shm", None)
+        self._local.shm = None
+        if shm is not None:
+            with self._segments_lock:
+                self._segments.discard(shm)
+            shm.close()
+            shm.unlink()
+
+    def _reset(self):
+        """After a failure: new connection and a fresh segment (the server may still read the old one)."""
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+        self._drop_segment()
+
+    def _request(self, message):
+        try:
+            conn = self._connection()
+            send_frame(conn, message)
+            reply = recv_frame(conn)
+        except (ConnectionError, FileNotFoundError, EOFError) as e:
+            # Refused / reset / no socket file / closed mid-frame
+            self._reset()
+            raise InferenceTransportError(f"inference server unreachable: {e}") from e
+        except Exception:
+            self._reset()
+            raise
+        if not reply.get("ok"):
+            if reply.get("transport"):
+                self._reset()
+                raise InferenceTransportError(f"inference server: {reply.get('error')}")
+            raise InferenceServerError(f"inference server: {reply.get('error')}")
+        return reply
+
+    def _infer_remote(self, x):
+        shm = self._segment(x.nbytes)
+        view = np.ndarray(x.shape, dtype=x.dtype, buffer=shm.buf)
+        view[...] = x
+        del view
+        reply = self._request({"op": "infer", "shm": shm.name, "shape": list(x.shape), "dtype": x.dtype.str})
+        return np.asarray(reply["preds"], dtype=np.float32)
+
+    # --- Public API ---
+
+    def info(self) -> dict:
+        """Model version / variant / input dtype served (also primes input_dtype)."""
+        reply = self.breaker.call(self._request, {"op": "info"})
+        self.input_dtype = np.dtype(reply["input_dtype"])
+        self.model_version = reply.get("model_version")
+        return reply
+
+    def infer(self, x: np.ndarray, timeout=None) -> np.ndarray:
+        """Raw predictions for one image; runs in-process only on a transport failure with a fallback."""
+        if x.ndim == 3:
+            x = np.expand_dims(x, axis=0)
+        x = np.ascontiguousarray(x)
+        started = time.perf_counter()
+        try:
+            preds = self.breaker.call(self._infer_remote, x)
+            REMOTE_CALLS.inc(result="ok")
+            return preds
+        except InferenceTransportError as e:
+            fallback = self._get_fallback()
+            if fallback is None:
+                REMOTE_CALLS.inc(result="error")
+                raise
+            REMOTE_CALLS.inc(result="fallback")
+            logger.debug(f"[inference_server] Remote inference failed ({e}); running in-process")
+            return fallback.infer(x, timeout=timeout)
+        except Exception:
+            REMOTE_CALLS.inc(result="error")
+            raise
+        finally:
+            REMOTE_LATENCY.observe(time.perf_counter() - started)
+
+    def submit(self, x: np.ndarray):
+        """Future of infer(x), for callers written against InferenceScheduler."""
+        if self._executor is None:
+            with self._fallback_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self._threads, thread_name_prefix="inference-client")
+        return self._executor.submit(self.infer, x)
+
+    def _get_fallback(self):
+        if self._fallback_factory is None:
+            return None
+        if not self._fallback_loaded:
+            with self._fallback_lock:
+                if not self._fallback_loaded:
+                    logger.warning("[inference_server] Server unavailable; loading the model in-process as fallback")
+                    try:
+                        self._fallback = self._fallback_factory()
+                    finally:
+                        self._fallback_loaded = True
+        return self._fallback
+
+    def close(self):
+        """Unlink every segment this process created (atexit)."""
+        with self._segments_lock:
+            segments = list(self._segments)
+            self._segments.clear()
+        for shm in segments:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# utils/interpreter_pool.py
+"""
+Thread-safe pool of TFLite interpreters.
+
+A tf.lite.Interpreter must not be used from two threads at once, so the
+single global interpreter serialized (and raced) every request. The pool
+owns N interpreters, each with its own `num_threads` and cached tensor
+details; callers check one out with a timeout:
+
+    with pool.checkout(timeout=5) as interpreter:
+        interpreter.set_tensor(...)
+
+Defaults are derived from the cores available to this process:
+threads per interpreter = min(4, cores), pool size = cores // threads.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_IN_USE = metrics.gauge("interpreter_pool_in_use", "Interpreters currently checked out.")
+POOL_SIZE = metrics.gauge("interpreter_pool_size", "Interpreters in the pool.")
+POOL_UTILIZATION = metrics.gauge(
+    "interpreter_pool_utilization", "Fraction of pooled interpreters currently checked out."
+)
+CHECKOUT_WAIT = metrics.histogram(
+    "interpreter_pool_checkout_wait_seconds",
+    "Time spent waiting for a free interpreter.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+
+class PoolTimeout(RuntimeError):
+    """No interpreter became free within the checkout timeout."""
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_pool_shape(cores=None):
+    """(pool_size, threads_per_interpreter) for the given number of cores."""
+    cores = cores or available_cores()
+    num_threads = max(1, min(4, cores))
+    return max(1, cores // num_threads), num_threads
+
+
+class PooledInterpreter:
+    """
+    One interpreter plus its cached input/output details.
+
+    Exposes the subset of the tf.lite.Interpreter API used by utils.predict;
+    get_input_details()/get_output_details() are served from the cache and
+    refreshed only when the tensors are re-allocated.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+
+    def _refresh_details(self):
+        self._input_details = self.interpreter.get_input_details()
+        self._output_details = self.interpreter.get_output_details()
+
+    def get_input_details(self):
+        return self._input_details
+
+    def get_output_details(self):
+        return self._output_details
+
+    def resize_tensor_input(self, index, shape):
+        self.interpreter.resize_tensor_input(index, shape)
+
+    def allocate_tensors(self):
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+
+    def set_tensor(self, index, value):
+        self.interpreter.set_tensor(index, value)
+
+    def invoke(self):
+        self.interpreter.invoke()
+
+    def get_tensor(self, index):
+        return self.interpreter.get_tensor(index)
+
+    def tensor(self, index):
+        return self.interpreter.tensor(index)
+
+
+class InterpreterPool:
+    """
+    N interpreters built by factory(num_threads) with blocking checkout.
+
+    factory: callable(num_threads) -> un-allocated interpreter
+    """
+
+    def __init__(self, factory, size=None, num_threads=None, checkout_timeout=30.0):
+        default_size, default_threads = default_pool_shape()
+        self.size = max(1, int(size or default_size))
+        self.num_threads = max(1, int(num_threads or default_threads))
+        self.checkout_timeout = checkout_timeout
+
+        self._free = queue.LifoQueue()  # LIFO keeps recently used (cache-warm) interpreters busy
+        self._in_use = 0
+        self._lock = threading.Lock()
+        for _ in range(self.size):
+            self._free.put(PooledInterpreter(factory(self.num_threads)))
+        # All interpreters load the same file; uint8 for full-integer models
+        self.input_dtype = self._free.queue[0].get_input_details()[0]["dtype"]
+
+        POOL_SIZE.set(self.size)
+        POOL_IN_USE.set_function(lambda: self._in_use)
+        POOL_UTILIZATION.set_function(lambda: self._in_use / self.size)
+        logger.info(f"[interpreter_pool] {self.size} interpreters x {self.num_threads} threads")
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow an interpreter; raises PoolTimeout if none frees up in time."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        try:
+            interpreter = self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"no free interpreter within {timeout}s") from None
+        CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield interpreter
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._free.put(interpreter)
+
+    def warm_up(self, fn):
+        """Call fn(interpreter) once on every interpreter (all checked out at once)."""
+        held = [self._free.get() for _ in range(self.size)]
+        try:
+            for interpreter in held:
+                fn(interpreter)
+        finally:
+            for interpreter in held:
+                self._free.put(interpreter)
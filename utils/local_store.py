@@ -0,0 +1,252 @@
+# utils/local_store.py
+"""
+Small SQLite files shared by all gunicorn workers on the same box.
+
+Used for local caches and mirrors that must survive restarts but are not
+research data (that lives in the SQLAlchemy DB). Connections are per thread;
+WAL mode lets one writer and many readers work concurrently.
+
+TwoTierCache is the base of the verdict cache and the upload memo: a
+bounded in-process LRU in front of one of these files.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+LOCAL_STATE_DIR = Path(os.getenv("LOCAL_STATE_DIR", str(BASE_DIR / "instance")))
+
+_local = threading.local()
+
+
+def state_path(filename: str) -> Path:
+    LOCAL_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    return LOCAL_STATE_DIR / filename
+
+
+def connect(filename: str) -> sqlite3.Connection:
+    """Return this thread's connection to LOCAL_STATE_DIR/filename (created on first use)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(filename)
+    if conn is None:
+        conn = sqlite3.connect(str(state_path(filename)), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conns[filename] = conn
+    return conn
+
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: every process is the leader
+    fcntl = None
+
+_held_locks = {}
+
+
+def try_acquire_leader(name: str) -> bool:
+    """
+    Non-blocking, process-wide lock on LOCAL_STATE_DIR/<name>.lock.
+
+    Background jobs that must run once per box (indexers, submitters) call
+    this from every worker; only the first caller gets True, and the lock is
+    released automatically when that process exits.
+    """
+    if name in _held_locks:
+        return True
+    if fcntl is None:
+        _held_locks[name] = None
+        return True
+
+    handle = open(state_path(f"{name}.lock"), "a+")
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _held_locks[name] = handle
+    return True
+
+
+@contextmanager
+def file_lock(name: str):
+    """
+    Blocking lock on LOCAL_STATE_DIR/<name>.lock, held for the with block.
+
+    For short critical sections that every process on the box may enter,
+    e.g. appending to and rotating a shared file.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(state_path(f"{name}.lock"), "a+") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+# --- Two-tier cache ---
+
+
+class TwoTierCache:
+    """
+    key -> tuple of values for one version, cached in two tiers.
+
+    - Tier 1: bounded in-process LRU (per worker).
+    - Tier 2: SQLite table in LOCAL_STATE_DIR, shared by all workers on the
+      box, trimmed to max_rows by least-recent use.
+
+    Rows written for any other version are purged when an instance starts.
+    Subclasses name the table and its columns and supply the lookup and
+    eviction counters (labelled by tier, and tier/result for lookups).
+    """
+
+    table = None
+    key_column = None
+    version_column = None
+    value_columns = ()  # ((name, SQLite type), ...)
+    lookups = None
+    evictions = None
+
+    # How many inserts between two size checks of the persistent tier
+    trim_every = 500
+
+    def __init__(self, version, memory_items, max_rows, db_filename):
+        self.version = version
+        self.memory_items = max(0, int(memory_items))
+        self.max_rows = max(1, int(max_rows))
+        self.db_filename = db_filename
+        self._values = ", ".join(name for name, _ in self.value_columns)
+        self._log_prefix = f"[{type(self).__module__.rsplit('.', 1)[-1]}]"
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self._init_db()
+        self.purge_other_versions()
+
+    # --- Persistent tier ---
+
+    def _db(self):
+        return connect(self.db_filename)
+
+    def _init_db(self):
+        columns = ", ".join([
+            f"{self.key_column} TEXT NOT NULL",
+            f"{self.version_column} TEXT NOT NULL",
+            *(f"{name} {sql_type} NOT NULL" for name, sql_type in self.value_columns),
+            "last_used REAL NOT NULL",
+            f"PRIMARY KEY ({self.key_column}, {self.version_column})",
+        ])
+        self._db().executescript(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ({columns}) WITHOUT ROWID;"
+            f"CREATE INDEX IF NOT EXISTS ix_{self.table}_last_used ON {self.table} (last_used);"
+        )
+
+    def purge_other_versions(self):
+        """Drop rows written for any version other than this one."""
+        cur = self._db().execute(
+            f"DELETE FROM {self.table} WHERE {self.version_column} != ?", (self.version,)
+        )
+        if cur.rowcount:
+            logger.info(f"{self._log_prefix} Purged {cur.rowcount} rows from other {self.version_column}s")
+
+    def _trim(self):
+        db = self._db()
+        (rows,) = db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        excess = rows - self.max_rows
+        if excess > 0:
+            keys = f"{self.key_column}, {self.version_column}"
+            db.execute(
+                f"DELETE FROM {self.table} WHERE ({keys}) IN "
+                f"(SELECT {keys} FROM {self.table} ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.evictions.inc(excess, tier="sqlite")
+
+    # --- In-process tier ---
+
+    def _remember(self, key, values):
+        if not self.memory_items:
+            return
+        with self._lock:
+            self._lru[key] = values
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.memory_items:
+                self._lru.popitem(last=False)
+                self.evictions.inc(tier="memory")
+
+    # --- Public API ---
+
+    def get(self, key):
+        """Return the values tuple or None."""
+        with self._lock:
+            values = self._lru.get(key)
+            if values is not None:
+                self._lru.move_to_end(key)
+        if values is not None:
+            self.lookups.inc(tier="memory", result="hit")
+            return values
+        self.lookups.inc(tier="memory", result="miss")
+
+        where = f"{self.key_column} = ? AND {self.version_column} = ?"
+        try:
+            db = self._db()
+            row = db.execute(f"SELECT {self._values} FROM {self.table} WHERE {where}", (key, self.version)).fetchone()
+            if row is not None:
+                db.execute(f"UPDATE {self.table} SET last_used = ? WHERE {where}", (time.time(), key, self.version))
+        except Exception as e:
+            logger.warning(f"{self._log_prefix} SQLite lookup failed: {e}")
+            row = None
+
+        if row is None:
+            self.lookups.inc(tier="sqlite", result="miss")
+            return None
+
+        self.lookups.inc(tier="sqlite", result="hit")
+        values = tuple(row)
+        self._remember(key, values)
+        return values
+
+    def put(self, key, *values):
+        values = tuple(values)
+        self._remember(key, values)
+
+        columns = f"{self.key_column}, {self.version_column}, {self._values}, last_used"
+        placeholders = ", ".join("?" * (len(values) + 3))
+        try:
+            self._db().execute(
+                f"INSERT OR REPLACE INTO {self.table} ({columns}) VALUES ({placeholders})",
+                (key, self.version, *values, time.time()),
+            )
+            with self._lock:
+                self._inserts += 1
+                trim = self._inserts % self.trim_every == 0
+            if trim:
+                self._trim()
+        except Exception as e:
+            logger.warning(f"{self._log_prefix} SQLite write failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            self.version_column: self.version,
+            "memory_items": len(self._lru),
+            "memory_hits": self.lookups.value(tier="memory", result="hit"),
+            "memory_misses": self.lookups.value(tier="memory", result="miss"),
+            "sqlite_hits": self.lookups.value(tier="sqlite", result="hit"),
+            "sqlite_misses": self.lookups.value(tier="sqlite", result="miss"),
+        }
@@ -0,0 +1,204 @@
+# utils/metrics.py
+"""
+Tiny in-process metrics registry (counters, gauges, histograms).
+
+Everything is rendered in Prometheus text format by routes/metrics.py.
+Each gunicorn worker keeps its own registry, so scrape every worker (or
+run a single worker) when tuning.
+"""
+import threading
+
+_lock = threading.Lock()
+_registry = {}
+
+# Default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge:
+    """Value that can go up and down, or be computed on scrape via set_function()."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        """Evaluate fn() at scrape time instead of storing a value."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels):
+        key = _label_key(self.labelnames, labels)
+        fn = self._functions.get(key)
+        if fn is not None:
+            return float(fn())
+        return self._values.get(key, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+        for key, fn in functions:
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, same semantics as the Prometheus client."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[key] = series
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, key, ("le", _format_bound(bound))),
+                    cumulative,
+                )
+            yield f"{self.name}_bucket", _format_labels(self.labelnames, key, ("le", "+Inf")), count
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), count
+
+
+def _format_bound(bound):
+    return repr(float(bound)) if not float(bound).is_integer() else f"{bound:.1f}"
+
+
+def _get_or_create(cls, name, help_text, labelnames=(), **kwargs):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = cls(name, help_text, labelnames, **kwargs)
+            _registry[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"metric {name} already registered as {metric.kind}")
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    return _get_or_create(Counter, name, help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    return _get_or_create(Gauge, name, help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+def render() -> str:
+    """Render every registered metric in Prometheus text exposition format."""
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, labels, value in metric.samples():
+            lines.append(f"{sample_name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
@@ -0,0 +1,259 @@
+# utils/near_duplicate.py
+"""
+Near-duplicate lookup over perceptual hashes (64-bit dHash).
+
+The exact pixel hash misses resized / recompressed copies of an image that
+was already verified. Every verified image also gets a dHash
+(utils.hash_utils.get_image_dhash_from_image). This index finds an earlier
+FAKE verdict whose dHash is within NEAR_DUP_MAX_DISTANCE bits (Hamming) of
+the new one.
+
+Only FAKE verdicts are indexed. dHash barely moves under a local edit, so a
+face swapped into a verified REAL photo can land within a few bits of the
+original; reusing "real" from a near match would pass the edit as REAL.
+Near copies of a real image are therefore always sent to the model.
+
+Multi-index hashing: the 64-bit code is split into NEAR_DUP_CHUNKS chunks,
+with one hash table per chunk. If two codes differ in at most r bits, at
+least one chunk differs in at most r // chunks bits (pigeonhole). So a query
+only probes the buckets within that small radius of each chunk and then
+checks the candidates' full distance. With the defaults (r=2, 2 x 32-bit
+chunks) that is 2 x 33 probes into nearly empty buckets. The cost depends
+on r, not on index size: about 0.06 ms per lookup at 1M entries (0.6 ms
+for r=4). More chunks mean fewer probes but fuller buckets, which only
+pays off for a larger r.
+
+The index lives in each worker's memory. It is loaded from the FAKE
+ImageRecord rows that have a phash (ChainRegistration only holds REAL
+images), then topped up every NEAR_DUP_REFRESH_S seconds with rows that
+other workers inserted.
+
+Config (env):
+  NEAR_DUP_ENABLED        use the index at all (default true)
+  NEAR_DUP_MAX_DISTANCE   max Hamming distance for a near match (default 2)
+  NEAR_DUP_CHUNKS         chunks the 64-bit code is split into (default 2)
+  NEAR_DUP_REFRESH_S      poll interval for rows added elsewhere (default 15)
+"""
+import logging
+import os
+import threading
+import time
+from itertools import combinations
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "True").lower() == "true"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "2"))
+NEAR_DUP_CHUNKS = int(os.getenv("NEAR_DUP_CHUNKS", "2"))
+NEAR_DUP_REFRESH_S = float(os.getenv("NEAR_DUP_REFRESH_S", "15"))
+
+HASH_BITS = 64
+
+LOOKUPS = metrics.counter(
+    "near_duplicate_lookups_total",
+    "Perceptual-hash index lookups, by result.",
+    ("result",),
+)
+INDEX_SIZE = metrics.gauge(
+    "near_duplicate_index_entries",
+    "Perceptual hashes held in this worker's near-duplicate index.",
+)
+LOOKUP_LATENCY = metrics.histogram(
+    "near_duplicate_lookup_seconds",
+    "Time to query the near-duplicate index.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+
+
+def _flip_masks(width, radius):
+    """Every bit mask of `width` bits with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(width), r):
+            mask = 0
+            for b in bits:
+                mask |= 1 << b
+            masks.append(mask)
+    return masks
+
+
+class MultiIndexHash:
+    """
+    Hamming-radius index of 64-bit codes (multi-index hashing).
+
+    max_distance: largest Hamming distance reported as a match
+    chunks: number of tables the code is split into (must divide 64)
+    """
+
+    def __init__(self, max_distance=NEAR_DUP_MAX_DISTANCE, chunks=NEAR_DUP_CHUNKS):
+        if HASH_BITS % chunks:
+            raise ValueError(f"chunks must divide {HASH_BITS}")
+        self.max_distance = max(0, int(max_distance))
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._probe_masks = _flip_masks(self.chunk_bits, self.max_distance // chunks)
+
+        self._tables = [dict() for _ in range(chunks)]
+        self._codes = []
+        self._values = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def _split(self, code):
+        return [(code >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def add(self, code: int, value):
+        with self._lock:
+            entry = len(self._codes)
+            self._codes.append(code)
+            self._values.append(value)
+            for table, part in zip(self._tables, self._split(code)):
+                table.setdefault(part, []).append(entry)
+
+    def nearest(self, code: int):
+        """(distance, value) of the closest entry within max_distance, or None."""
+        best_distance, best_entry = self.max_distance + 1, None
+        codes = self._codes
+        for table, part in zip(self._tables, self._split(code)):
+            get = table.get
+            for mask in self._probe_masks:
+                bucket = get(part ^ mask)
+                if not bucket:
+                    continue
+                for entry in bucket:
+                    distance = (codes[entry] ^ code).bit_count()
+                    if distance < best_distance:
+                        best_distance, best_entry = distance, entry
+                        if distance == 0:
+                            return 0, self._values[entry]
+        return (best_distance, self._values[best_entry]) if best_entry is not None else None
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual-hash -> earlier verdict, kept in sync with the database.
+
+    Values are (image_hash, label, confidence). Only "fake" verdicts are
+    indexed (see the module docstring).
+    """
+
+    def __init__(self, max_distance=NEAR_DUP_MAX_DISTANCE, chunks=NEAR_DUP_CHUNKS):
+        self._index = MultiIndexHash(max_distance, chunks)
+        self._known = set()  # image hashes already indexed
+        self._last_id = 0  # last ImageRecord.id indexed
+        self._lock = threading.Lock()  # request threads add() while the refresher indexes rows
+        INDEX_SIZE.set_function(lambda: len(self._index))
+
+    def __len__(self):
+        return len(self._index)
+
+    def add(self, phash: str, image_hash: str, label: str, confidence: float):
+        with self._lock:
+            self._add(phash, image_hash, label, confidence)
+
+    def _add(self, phash, image_hash, label, confidence):
+        if not phash or label != "fake" or image_hash in self._known:
+            return
+        self._known.add(image_hash)
+        self._index.add(int(phash, 16), (image_hash, label, float(confidence or 0.0)))
+
+    def lookup(self, phash: str):
+        """
+        Closest earlier verdict within the distance threshold, as a dict
+        {image_hash, label, confidence, distance}, or None.
+        """
+        if not phash:
+            return None
+        started = time.perf_counter()
+        found = self._index.nearest(int(phash, 16))
+        LOOKUP_LATENCY.observe(time.perf_counter() - started)
+
+        if found is None:
+            LOOKUPS.inc(result="miss")
+            return None
+        distance, (image_hash, label, confidence) = found
+        LOOKUPS.inc(result="near_match")
+        return {
+            "image_hash": image_hash,
+            "label": label,
+            "confidence": confidence,
+            "distance": distance,
+        }
+
+    def refresh(self, batch_size=5000):
+        """Index FAKE rows with a phash added since the last refresh (needs an app context)."""
+        from models.image_record import ImageRecord
+
+        added = 0
+        while True:
+            rows = (
+                ImageRecord.query
+                .filter(ImageRecord.id > self._last_id, ImageRecord.phash.isnot(None))
+                .filter(ImageRecord.label == "fake")  # stored lower-case, so the label index applies
+                .order_by(ImageRecord.id)
+                .with_entities(ImageRecord.id, ImageRecord.phash, ImageRecord.image_hash,
+                               ImageRecord.label, ImageRecord.confidence)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            with self._lock:
+                for row_id, phash, image_hash, label, confidence in rows:
+                    self._add(phash, image_hash, label, confidence)
+                    added += 1
+                self._last_id = rows[-1][0]
+            if len(rows) < batch_size:
+                break
+        return added
+
+
+# --- Module-level wiring ---
+
+_index = None
+_refresher = None
+
+
+def get_index():
+    """This worker's NearDuplicateIndex, or None when disabled."""
+    global _index
+    if not NEAR_DUP_ENABLED:
+        return None
+    if _index is None:
+        _index = NearDuplicateIndex()
+    return _index
+
+
+def start_near_duplicate_index(app):
+    """Load the index from the database and keep it topped up (one thread per worker)."""
+    global _refresher
+
+    index = get_index()
+    if index is None or _refresher is not None:
+        return index
+
+    def run():
+        first = True
+        while True:
+            try:
+                with app.app_context():
+                    started = time.perf_counter()
+                    added = index.refresh()
+                if first:
+                    logger.info(
+                        f"[near_duplicate] Indexed {added} perceptual hashes "
+                        f"in {time.perf_counter() - started:.2f}s"
+                    )
+                    first = False
+            except Exception as e:
+                logger.warning(f"[near_duplicate] Refresh failed: {e}")
+            time.sleep(NEAR_DUP_REFRESH_S)
+
+    _refresher = threading.Thread(target=run, name="near-duplicate-refresh", daemon=True)
+    _refresher.start()
+    return index
@@ -1,34 +1,204 @@
 # utils/predict.py
+import asyncio
+
 import numpy as np
-from tensorflow.keras.preprocessing import image
+from PIL import Image
 
 IMG_SIZE = (299, 299)  # Xception input size
 
 
-def _preprocess_image(image_path: str) -> np.ndarray:
-    """Load image from disk and prepare a batch of 1 for the model."""
-    img = image.load_img(image_path, target_size=IMG_SIZE)
-    x = image.img_to_array(img)
-    x = x / 255.0
-    x = np.expand_dims(x, axis=0).astype("float32")
-    return x
+def resize_for_model(img):
+    """
+    RGB image of IMG_SIZE, as keras.preprocessing.image.load_img(target_size=IMG_SIZE)
+    makes it: RGB conversion, then nearest-neighbour resize.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != IMG_SIZE:
+        img = img.resize(IMG_SIZE, Image.NEAREST)
+    return img
+
+
+def preprocess_pil(img, dtype=np.float32) -> np.ndarray:
+    """
+    Prepare a batch of 1 from an already-decoded PIL image.
+
+    Matches keras.preprocessing.image.load_img(target_size=IMG_SIZE):
+    RGB conversion, nearest-neighbour resize, then scale to [0, 1].
+
+    dtype=np.uint8 skips the scaling and returns the raw 0-255 pixels. The
+    request path uses it: the pixels are scaled while being written into the
+    interpreter's input tensor (see _write_input), and full-integer models
+    (see convert_to_tflite.py) take them as they are.
+    """
+    img = resize_for_model(img)
+    if np.dtype(dtype) == np.uint8:
+        x = np.asarray(img, dtype=np.uint8)
+    else:
+        x = np.asarray(img, dtype="float32") / 255.0
+    return np.expand_dims(x, axis=0)
+
+
+def _preprocess_image(image_path: str, dtype=np.float32, draft=True) -> np.ndarray:
+    """
+    Load image from disk and prepare a batch of 1 for the model.
+
+    JPEGs are decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 in the
+    DCT domain to the smallest size that is still at least IMG_SIZE, so a
+    12-24 MP photo is never decoded at full resolution. The result is close
+    to, not bit-identical with, a full decode plus nearest-neighbour resize;
+    tests/test_preprocess_draft.py bounds the verdict drift and
+    benchmarks/preprocess_draft.py measures it on real photos. Other formats
+    ignore draft().
+    """
+    with Image.open(image_path) as img:
+        if draft:
+            img.draft("RGB", IMG_SIZE)
+        return preprocess_pil(img, dtype)
+
+
+def input_dtype(model_obj):
+    """
+    numpy dtype the model wants from preprocess_pil: uint8 for full-integer
+    TFLite models, float32 for everything else.
+
+    model_obj: Keras model, TFLite interpreter, InterpreterPool or InferenceScheduler.
+    """
+    if hasattr(model_obj, "input_dtype"):
+        # InterpreterPool, or InferenceClient (as reported by the inference server)
+        return np.dtype(model_obj.input_dtype)
+    if hasattr(model_obj, "submit"):
+        return input_dtype(model_obj.model)
+    if hasattr(model_obj, "predict"):
+        return np.dtype(np.float32)
+    return np.dtype(model_obj.get_input_details()[0]["dtype"])
+
+
+def _as_input_dtype(x: np.ndarray, dtype) -> np.ndarray:
+    """
+    Cast a preprocessed batch to the input tensor's dtype.
+
+    A [0, 1] float batch fed to a uint8 model (or raw pixels to a float
+    model) is rescaled rather than truncated, so callers that always build
+    float tensors keep working with every variant.
+    """
+    dtype = np.dtype(dtype)
+    if x.dtype == dtype:
+        return x
+    if dtype == np.uint8 and np.issubdtype(x.dtype, np.floating):
+        return np.clip(np.rint(x * 255.0), 0, 255).astype(np.uint8)
+    if x.dtype == np.uint8 and np.issubdtype(dtype, np.floating):
+        return x.astype(dtype) / dtype.type(255.0)
+    return x.astype(dtype)
+
+
+def _write_input(dst: np.ndarray, src: np.ndarray):
+    """
+    Copy one preprocessed image into its row of the input tensor.
+
+    uint8 pixels going into a float tensor are scaled by 1/255 in the same
+    pass, so no float32 temporary is made; other dtype mismatches go through
+    _as_input_dtype.
+    """
+    src = src.reshape(dst.shape)
+    if src.dtype == dst.dtype:
+        np.copyto(dst, src)
+    elif src.dtype == np.uint8 and np.issubdtype(dst.dtype, np.floating):
+        np.multiply(src, dst.dtype.type(1.0 / 255.0), out=dst, dtype=dst.dtype)
+    else:
+        np.copyto(dst, _as_input_dtype(src, dst.dtype))
+
+
+def _fill_input(interpreter, index, items):
+    """
+    Write a batch straight into the interpreter's input tensor.
+
+    Saves the np.concatenate and set_tensor copies. Rows past len(items)
+    (power-of-two padding) keep whatever the previous batch left there;
+    their outputs are discarded.
+    """
+    view = interpreter.tensor(index)()
+    for i, item in enumerate(items):
+        _write_input(view[i], item)
+    # No numpy view of the tensor may be alive when invoke() runs
+    del view
+
+
+def _as_batch(x, dtype) -> np.ndarray:
+    """(N, H, W, C) array of dtype from an array or a list of single images."""
+    if not isinstance(x, np.ndarray):
+        x = np.concatenate([item.reshape((-1,) + item.shape[-3:]) for item in x], axis=0)
+    return _as_input_dtype(x, dtype)
 
 
 def _predict_with_keras(model, x: np.ndarray) -> np.ndarray:
-    preds = model.predict(x)[0]
+    preds = model.predict(_as_batch(x, np.float32))[0]
     return np.array(preds)
 
 
 def _predict_with_tflite(interpreter, x: np.ndarray) -> np.ndarray:
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
+    return _predict_batch_with_tflite(interpreter, x)[0]
+
+
+def _predict_batch_with_keras(model, x) -> np.ndarray:
+    return np.asarray(model.predict(_as_batch(x, np.float32), verbose=0))
+
+
+def _predict_batch_with_tflite(interpreter, x) -> np.ndarray:
+    """
+    Run a whole batch through one invoke.
 
-    x_cast = x.astype(input_details[0]["dtype"])
-    interpreter.set_tensor(input_details[0]["index"], x_cast)
+    x: (N, H, W, C) array, or a list of (1, H, W, C) / (H, W, C) images
+    (the scheduler passes its queue items as they are); uint8 or float.
+
+    Models exported with a dynamic batch dimension (see convert_to_tflite.py)
+    are resized to the batch; the batch is padded up to a power of two so the
+    interpreter only re-allocates for a handful of distinct shapes. Older
+    exports with a fixed batch of 1 fall back to one invoke per image.
+    """
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+
+    items = list(x) if isinstance(x, np.ndarray) else x
+    n = len(items)
+    signature = input_details.get("shape_signature")
+    dynamic_batch = signature is not None and len(signature) > 0 and signature[0] == -1
+
+    if not dynamic_batch:
+        if n == 1:
+            _fill_input(interpreter, input_details["index"], items)
+            interpreter.invoke()
+            return np.array(interpreter.get_tensor(output_details["index"]))
+        return np.concatenate(
+            [_predict_batch_with_tflite(interpreter, items[i:i + 1]) for i in range(n)], axis=0
+        )
+
+    padded_n = 1 << (n - 1).bit_length()
+    if input_details["shape"][0] != padded_n:
+        interpreter.resize_tensor_input(input_details["index"], [padded_n] + list(input_details["shape"][1:]))
+        interpreter.allocate_tensors()
+
+    _fill_input(interpreter, input_details["index"], items)
     interpreter.invoke()
+    preds = interpreter.get_tensor(output_details["index"])
+    return np.array(preds[:n])
 
-    preds = interpreter.get_tensor(output_details[0]["index"])[0]
-    return np.array(preds)
+
+def predict_batch(model_obj, x) -> np.ndarray:
+    """
+    Raw predictions for a batch of preprocessed images, shape (N, ...).
+
+    x: (N, H, W, C) array or list of single images (see _predict_batch_with_tflite).
+    Used by utils.batching.InferenceScheduler; works for Keras models, TFLite
+    interpreters and InterpreterPools alike.
+    """
+    if hasattr(model_obj, "predict"):
+        return _predict_batch_with_keras(model_obj, x)
+    if hasattr(model_obj, "checkout"):
+        # InterpreterPool: borrow one interpreter for this batch
+        with model_obj.checkout() as interpreter:
+            return _predict_batch_with_tflite(interpreter, x)
+    return _predict_batch_with_tflite(model_obj, x)
 
 
 def _decode_binary_preds(preds: np.ndarray):
@@ -51,26 +221,62 @@ def _decode_binary_preds(preds: np.ndarray):
     return "fake", 0.5
 
 
-def predict_image(model_obj, image_path: str):
+def predict_array(model_obj, x: np.ndarray):
     """
-    Main API used by your routes.
+    Same as predict_image, but for an already-preprocessed (1, 299, 299, 3) batch.
 
-    Returns:
-        label: "real" or "fake"
-        confidence: float in [0, 1]
-    If model_obj is None, returns (None, None).
+    Returns (label, confidence), or (None, None) if model_obj is None.
     """
     if model_obj is None:
         return None, None
 
-    x = _preprocess_image(image_path)
-
-    if hasattr(model_obj, "predict"):
+    if hasattr(model_obj, "submit"):
+        # InferenceScheduler: batched together with concurrent requests
+        preds = model_obj.infer(x)
+    elif hasattr(model_obj, "predict"):
         # Keras model
         preds = _predict_with_keras(model_obj, x)
+    elif hasattr(model_obj, "checkout"):
+        # InterpreterPool
+        preds = predict_batch(model_obj, x)[0]
     else:
         # TFLite Interpreter
         preds = _predict_with_tflite(model_obj, x)
 
     label, confidence = _decode_binary_preds(preds)
     return label, confidence
+
+
+async def predict_array_async(model_obj, x: np.ndarray, executor=None):
+    """
+    predict_array for asyncio callers.
+
+    A scheduler's future is awaited directly, so no thread waits for the
+    batch; anything else runs predict_array on the executor.
+    """
+    if model_obj is None:
+        return None, None
+
+    if hasattr(model_obj, "submit"):
+        preds = await asyncio.wrap_future(model_obj.submit(x))
+        return _decode_binary_preds(preds)
+    return await asyncio.get_running_loop().run_in_executor(executor, predict_array, model_obj, x)
+
+
+def predict_image(model_obj, image_path: str):
+    """
+    Main API used by your routes.
+
+    model_obj may be a Keras model, a TFLite interpreter, an InterpreterPool
+    or an InferenceScheduler wrapping any of them.
+
+    Returns:
+        label: "real" or "fake"
+        confidence: float in [0, 1]
+    If model_obj is None, returns (None, None).
+    """
+    if model_obj is None:
+        return None, None
+
+    # Raw pixels: scaled (if the model wants floats) while being written into the input tensor
+    return predict_array(model_obj, _preprocess_image(image_path, np.uint8))
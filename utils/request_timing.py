@@ -0,0 +1,154 @@
+# utils/request_timing.py
+"""
+Per-stage latency and outcome metrics for the verification pipeline.
+
+Each /analyze and /api/async/verify request (and each /api/verify image)
+gets a StageTimer; the pipeline wraps its steps in timer.stage("...") and
+reports how the image was decided with timer.outcome("..."). finish()
+feeds the histograms and, when the request took longer than
+SLOW_REQUEST_MS, logs its stage breakdown as one JSON line, so a slow
+request can be explained without reproducing it.
+
+Stages (whatever ran for that request):
+  decode (decode + pixel hash), save (original + thumbnail job),
+  chain_lookup, perceptual_hash, verdict_cache, near_duplicate,
+  preprocess, inference (scheduler queue wait included), register,
+  history_log; the slow-request log reports the remainder as "other".
+  With speculative inference the off-chain stages run beside chain_lookup
+  and are reported as one speculation_wait (the part not hidden by it)
+
+Outcomes:
+  onchain_hit, real_new, fake, near_match, model_unavailable, and
+  chain_fallback (counted on top of the verdict when the chain lookup failed)
+
+A stage costs two perf_counter() calls and one histogram observe, so the
+timer stays on for every request.
+
+Config (env):
+  SLOW_REQUEST_MS     log the stage breakdown of requests slower than this
+                      (default 1000; 0 disables the log)
+"""
+import json
+import logging
+import os
+import time
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+STAGE_LATENCY = metrics.histogram(
+    "verify_stage_seconds",
+    "Wall time of one verification pipeline stage.",
+    ("route", "stage"),
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_LATENCY = metrics.histogram(
+    "verify_request_seconds",
+    "Wall time of one verification, all stages included.",
+    ("route",),
+    buckets=STAGE_BUCKETS,
+)
+OUTCOMES = metrics.counter(
+    "verify_outcomes_total",
+    "Verification outcomes (onchain_hit, real_new, fake, near_match, model_unavailable, chain_fallback).",
+    ("route", "outcome"),
+)
+SLOW_REQUESTS = metrics.counter(
+    "verify_slow_requests_total",
+    "Verifications slower than SLOW_REQUEST_MS.",
+    ("route",),
+)
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "started")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        stages = self.timer.stages
+        stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        STAGE_LATENCY.observe(elapsed, route=self.timer.route, stage=self.name)
+        return False
+
+
+class StageTimer:
+    """Stage durations and outcomes of one request (not shared between threads)."""
+
+    __slots__ = ("route", "started", "stages", "outcomes", "_finished")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.outcomes = []
+        self._finished = False
+
+    def stage(self, name):
+        """Context manager timing one stage; repeated stages add up."""
+        return _Stage(self, name)
+
+    def outcome(self, name):
+        self.outcomes.append(name)
+        OUTCOMES.inc(route=self.route, outcome=name)
+
+    def finish(self, **context):
+        """Record the total; log the breakdown if slow. context goes into that log line."""
+        if self._finished:
+            return
+        self._finished = True
+        total = time.perf_counter() - self.started
+        REQUEST_LATENCY.observe(total, route=self.route)
+
+        if SLOW_REQUEST_MS > 0 and total * 1000.0 >= SLOW_REQUEST_MS:
+            SLOW_REQUESTS.inc(route=self.route)
+            breakdown = {name: round(seconds * 1000.0, 2) for name, seconds in self.stages.items()}
+            breakdown["other"] = round(max(0.0, total * 1000.0 - sum(breakdown.values())), 2)
+            logger.warning("[request_timing] Slow request " + json.dumps({
+                "route": self.route,
+                "total_ms": round(total * 1000.0, 2),
+                "stages_ms": breakdown,
+                "outcomes": self.outcomes,
+                **context,
+            }, default=str))
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _NullTimer:
+    """Stand-in when the caller doesn't time the request (scripts, benchmarks)."""
+
+    __slots__ = ()
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def outcome(self, name):
+        pass
+
+    def finish(self, **context):
+        pass
+
+
+NULL_TIMER = _NullTimer()
@@ -0,0 +1,95 @@
+# utils/schema.py
+"""
+Minimal forward-only schema updates.
+
+db.create_all() creates missing tables but never alters existing ones, so
+columns and indexes added to a model later (e.g. ImageRecord.phash) would
+be missing on databases created before them. add_missing_columns() adds
+such columns with ALTER TABLE ... ADD COLUMN (nullable ones only), and
+add_missing_indexes() creates the model's named indexes. Anything more
+involved needs a real migration.
+
+check_hash_columns() guards the one setting that changes how an existing
+column is read: IMAGE_HASH_BINARY (models/types.py). It refuses to start
+if the configured hash storage doesn't match the column in the database.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.types import LargeBinary, String
+
+from models.types import HexHash
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine, models):
+    """Add nullable model columns that are missing from their existing tables."""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as conn:
+        for model in models:
+            table = model.__table__
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.warning(
+                        f"[schema] {table.name}.{column.name} is missing and NOT NULL; "
+                        f"add it with a migration"
+                    )
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} "
+                    f"ADD COLUMN {preparer.quote(column.name)} {col_type}"
+                ))
+                logger.info(f"[schema] Added column {table.name}.{column.name}")
+
+
+def add_missing_indexes(engine, models):
+    """Create model indexes (from __table_args__ / index=True) missing on existing tables."""
+    inspector = inspect(engine)
+
+    for model in models:
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(bind=engine)
+            logger.info(f"[schema] Created index {index.name} on {table.name}")
+
+
+def check_hash_columns(engine, models):
+    """
+    Raise RuntimeError if a HexHash column's storage doesn't match the database.
+
+    With IMAGE_HASH_BINARY flipped on an existing database, the binary setting
+    would write raw bytes into a text column (or read bytes as hex text the
+    other way round) without any error.
+    """
+    inspector = inspect(engine)
+
+    for model in models:
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        reflected = {col["name"]: col["type"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if not isinstance(column.type, HexHash) or column.name not in reflected:
+                continue
+            expected = LargeBinary if column.type.binary else String
+            found = reflected[column.name]
+            if not isinstance(found, expected):
+                raise RuntimeError(
+                    f"[schema] {table.name}.{column.name} is {found} in the database but "
+                    f"IMAGE_HASH_BINARY={column.type.binary} expects {expected.__name__}; "
+                    f"refusing to start. Set IMAGE_HASH_BINARY to match the column, or migrate it."
+                )
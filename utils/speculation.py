@@ -0,0 +1,157 @@
+# utils/speculation.py
+"""
+Speculative inference: overlap the off-chain verdict with the chain lookup.
+
+Without it decide() is sequential, so every new image pays the RPC round
+trip and then preprocessing + inference. With SPECULATIVE_INFERENCE on,
+decide() starts the off-chain half (dHash, verdict cache, near-duplicate
+index, preprocessing, inference) on a small thread pool before it asks the
+chain, and only waits for it if the hash turns out not to be on-chain.
+If it is on-chain the speculative work is dropped: cancelled if it (or
+its inference) is still queued, discarded unused otherwise. A discarded
+result has no side effects; the verdict cache and near-duplicate index
+are only updated from the verdict that is actually returned.
+
+Speculation costs a wasted inference for every on-chain hit, so in
+"auto" mode it is skipped while the observed on-chain hit rate (an
+exponentially weighted moving average over all chain lookups) is at or
+above SPECULATION_MAX_HIT_RATE. The rate keeps being measured while
+speculation is off, so the policy follows the traffic either way.
+
+Config (env):
+  SPECULATIVE_INFERENCE       off (default) | on | auto
+  SPECULATION_MAX_HIT_RATE    auto: speculate while the hit rate is below this (default 0.5)
+  SPECULATION_EWMA_ALPHA      weight of each new lookup in the hit rate (default 0.05)
+  SPECULATION_WORKERS         threads running speculative work (default 8)
+"""
+import logging
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from utils import metrics
+from utils.predict import _decode_binary_preds, predict_array
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_INFERENCE = os.getenv("SPECULATIVE_INFERENCE", "off").lower()
+if SPECULATIVE_INFERENCE not in ("off", "on", "auto"):
+    logger.warning(f"[speculation] Unknown SPECULATIVE_INFERENCE {SPECULATIVE_INFERENCE!r}; using 'off'.")
+    SPECULATIVE_INFERENCE = "off"
+SPECULATION_MAX_HIT_RATE = float(os.getenv("SPECULATION_MAX_HIT_RATE", "0.5"))
+SPECULATION_EWMA_ALPHA = float(os.getenv("SPECULATION_EWMA_ALPHA", "0.05"))
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "8"))
+
+SPECULATIONS = metrics.counter(
+    "speculative_inference_total",
+    "Speculative off-chain verdicts, by what became of them.",
+    ("result",),
+)
+HIT_RATE = metrics.gauge(
+    "speculation_onchain_hit_rate",
+    "Moving average of the on-chain hit rate seen by chain lookups.",
+)
+
+
+class SpeculationPolicy:
+    """
+    Decides per request whether to speculate, from an EWMA of the on-chain hit rate.
+
+    mode: "off", "on" or "auto"
+    max_hit_rate: auto speculates while the hit rate is below this
+    alpha: weight of each new observation
+    """
+
+    def __init__(self, mode=SPECULATIVE_INFERENCE, max_hit_rate=SPECULATION_MAX_HIT_RATE,
+                 alpha=SPECULATION_EWMA_ALPHA):
+        self.mode = mode
+        self.max_hit_rate = float(max_hit_rate)
+        self.alpha = min(1.0, max(0.0, float(alpha)))
+        self._hit_rate = 0.0  # start by speculating: most uploads are new images
+        self._lock = threading.Lock()
+        HIT_RATE.set_function(lambda: self._hit_rate)
+
+    @property
+    def hit_rate(self) -> float:
+        return self._hit_rate
+
+    def should_speculate(self) -> bool:
+        if self.mode == "on":
+            return True
+        if self.mode == "auto":
+            return self._hit_rate < self.max_hit_rate
+        return False
+
+    def observe(self, onchain: bool):
+        """Feed one completed chain lookup (failed lookups say nothing; don't pass them)."""
+        with self._lock:
+            self._hit_rate += self.alpha * (float(onchain) - self._hit_rate)
+
+
+class SpeculativeVerdict:
+    """
+    One off-chain verdict running beside the chain lookup.
+
+    fn(job, *args) runs on the executor and must route its inference
+    through job.infer(...), which is where discard() can still stop it.
+    """
+
+    def __init__(self, executor, fn, *args):
+        self._fn = fn
+        self._args = args
+        self._lock = threading.Lock()
+        self._discarded = False
+        self._inference = None
+        self._future = executor.submit(fn, self, *args)
+
+    def infer(self, model_obj, x):
+        """predict_array(model_obj, x), or None if the job was discarded before it got queued."""
+        if not hasattr(model_obj, "submit"):
+            return predict_array(model_obj, x)
+        with self._lock:
+            if self._discarded:
+                return None
+            self._inference = model_obj.submit(x)
+        try:
+            return _decode_binary_preds(self._inference.result())
+        except CancelledError:
+            return None
+
+    def result(self):
+        """
+        The verdict (the hash is not on-chain).
+
+        If the pool never got to it, it runs here instead of waiting behind
+        other speculative work.
+        """
+        if self._future.cancel():
+            SPECULATIONS.inc(result="inline")
+            return self._fn(self, *self._args)
+        SPECULATIONS.inc(result="used")
+        return self._future.result()
+
+    def discard(self):
+        """The chain answered: cancel whatever hasn't started and ignore the rest."""
+        with self._lock:
+            self._discarded = True
+            inference = self._inference
+        if self._future.cancel() or inference is None or inference.cancel():
+            SPECULATIONS.inc(result="cancelled")
+        else:
+            SPECULATIONS.inc(result="discarded")  # the inference ran (or is running) for nothing
+
+
+policy = SpeculationPolicy()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def speculate(fn, *args) -> SpeculativeVerdict:
+    """Start fn(job, *args) on the speculation pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max(1, SPECULATION_WORKERS), thread_name_prefix="speculation")
+    return SpeculativeVerdict(_executor, fn, *args)
@@ -0,0 +1,179 @@
+# utils/startup.py
+"""
+Startup timing and background warm-up.
+
+create_app() no longer blocks on TensorFlow, the model or the RPC. It calls
+start_services(app), which starts the history writer and start_warmup(app);
+that (in a background thread by default) loads the TFLite model through the
+lightest available runtime, runs a warm-up inference, starts the
+near-duplicate index, builds the Web3 client and starts the chain
+background services. /readyz reports 503 until that has
+finished; /healthz only says the process is alive.
+
+Every phase is recorded with timed(...) so /readyz (and the log) show where
+cold-start time goes.
+
+STARTUP_MODE:
+  background (default)  warm up in a thread; the worker accepts connections at once
+  eager                 warm up inside create_app() (scripts, single-process dev)
+  lazy                  don't warm up; the model stays unloaded until load_model()
+  deferred              gunicorn --preload (see gunicorn.conf.py): create_app() runs
+                        in the master and only preloads what forked workers can
+                        share (the TFLite runtime); each worker then starts
+                        its threads from start_worker_services() in post_fork
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+
+PROCESS_STARTED = time.time()
+
+_timings = OrderedDict()
+_timings_lock = threading.Lock()
+
+_ready = threading.Event()
+_warmup_error = None
+_warmup_thread = None
+
+
+@contextmanager
+def timed(name):
+    """Record how long the block took under `name` (seconds)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            _timings[name] = round(time.perf_counter() - started, 4)
+
+
+def timings() -> dict:
+    with _timings_lock:
+        return dict(_timings)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout=None) -> bool:
+    return _ready.wait(timeout)
+
+
+def status() -> dict:
+    """Snapshot for /readyz."""
+    import globals as model_globals
+    from blockchain.client import rpc_breaker
+
+    return {
+        "ready": is_ready(),
+        "startup_mode": STARTUP_MODE,
+        "uptime_s": round(time.time() - PROCESS_STARTED, 3),
+        "model_loaded": model_globals.get_model() is not None,
+        "model_version": model_globals.MODEL_VERSION,
+        "model_variant": model_globals.TFLITE_VARIANT,
+        "inference_server": getattr(model_globals.get_model(), "socket_path", None),
+        "chain_breaker": rpc_breaker.state,
+        "tflite_runtime": model_globals.TFLITE_RUNTIME,
+        "warmup_error": _warmup_error,
+        "timings_s": timings(),
+    }
+
+
+def _warm_up(app):
+    global _warmup_error
+
+    import globals as model_globals
+
+    try:
+        with timed("warmup:total"):
+            model_globals.load_model()
+
+            with timed("near_duplicate:start"):
+                from utils.near_duplicate import start_near_duplicate_index
+                start_near_duplicate_index(app)
+
+            # Chain side: none of this may keep the app from serving (ML-only fallback)
+            try:
+                with timed("import:web3"):
+                    from blockchain import interact
+                try:
+                    with timed("web3:connect"):
+                        interact.check_connection()
+                except Exception as e:
+                    # The indexer and outbox retry on their own; the breaker covers requests
+                    logger.warning(f"[startup] RPC not reachable yet: {e}")
+                    _warmup_error = f"blockchain: {e}"
+                with timed("chain:start_services"):
+                    interact.start_chain_indexer()
+                    from blockchain.outbox import start_outbox_submitter
+                    start_outbox_submitter(app)
+            except Exception as e:
+                logger.warning(f"[startup] Blockchain warm-up failed (ML-only until it recovers): {e}")
+                _warmup_error = f"blockchain: {e}"
+    except Exception as e:
+        logger.error(f"[startup] Warm-up failed: {e}")
+        _warmup_error = str(e)
+    finally:
+        _ready.set()
+        logger.info(f"[startup] Ready. Startup timings (s): {timings()}")
+
+
+def start_warmup(app, mode=None):
+    """Kick off model/Web3 warm-up according to mode (default STARTUP_MODE)."""
+    global _warmup_thread
+
+    mode = mode or STARTUP_MODE
+    if mode == "lazy":
+        _ready.set()
+        return
+    if mode == "eager":
+        _warm_up(app)
+        return
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=_warm_up, args=(app,), name="startup-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def _start_services(app, mode=None):
+    from utils.history import start_history_writer
+
+    # History logging (write-behind, one writer per worker)
+    start_history_writer(app)
+    # TFLite model, warm-up inference, Web3 client, chain indexer and outbox
+    start_warmup(app, mode)
+
+
+def start_services(app):
+    """
+    Start this process's background services (called by create_app()).
+
+    With STARTUP_MODE=deferred nothing is started: threads don't survive
+    fork, so only fork-safe state is loaded here, into the gunicorn master,
+    where every worker shares it copy-on-write.
+    """
+    if STARTUP_MODE != "deferred":
+        _start_services(app)
+        return
+
+    import globals as model_globals
+
+    with timed("preload:model"):
+        model_globals.preload_model()
+
+
+def start_worker_services(app):
+    """gunicorn post_fork hook (STARTUP_MODE=deferred): start this worker's services."""
+    from extensions import db
+
+    # Don't share the master's pooled DB connections with the worker
+    with app.app_context():
+        db.engine.dispose(close=False)
+    _start_services(app, mode="background")
@@ -0,0 +1,181 @@
+# utils/thumbnails.py
+"""
+WebP thumbnails of uploaded images, keyed by pixel hash.
+
+Pages show static/thumbs/<pixel hash>.webp (at most THUMB_SIZE px on the
+long side) and link to the original in static/images only on click.
+
+Thumbnails are made off the request path: ingest calls
+schedule_thumbnail(), and a small thread pool (Pillow releases the GIL
+while resizing and encoding) writes the file from the stored original,
+JPEGs decoded at reduced scale. Queued jobs hold a path, never the
+upload's full-resolution RGB buffer, so THUMB_MAX_PENDING bounds memory
+as well as work. If the pool is saturated the job is skipped. The /thumb/<hash>.webp route then builds
+the thumbnail on demand from the original the first time it is
+requested. backfill_thumbnails.py covers files uploaded before this
+existed.
+
+Config (env):
+  THUMB_SIZE          long-side size in pixels (default 256)
+  THUMB_QUALITY       WebP quality (default 80)
+  THUMB_WORKERS       background generation threads (default 2)
+  THUMB_MAX_PENDING   queued jobs before new ones are skipped (default 256)
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from PIL import Image
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_IMAGES_DIR = BASE_DIR / "static" / "images"
+THUMBS_DIR = BASE_DIR / "static" / "thumbs"
+
+THUMB_SIZE = int(os.getenv("THUMB_SIZE", "256"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+THUMB_MAX_PENDING = int(os.getenv("THUMB_MAX_PENDING", "256"))
+
+GENERATED = metrics.counter(
+    "thumbnails_generated_total",
+    "WebP thumbnails written, by trigger.",
+    ("trigger",),
+)
+SKIPPED = metrics.counter(
+    "thumbnails_skipped_total",
+    "Background thumbnail jobs skipped because the pool was saturated.",
+)
+
+
+def thumbnail_path(image_hash: str) -> Path:
+    return THUMBS_DIR / f"{image_hash}.webp"
+
+
+def find_original(image_hash: str):
+    """static/images/<image_hash><ext>, whatever the extension; None if missing."""
+    if not all(c in "0123456789abcdef" for c in image_hash):
+        return None
+    for path in STATIC_IMAGES_DIR.glob(f"{image_hash}.*"):
+        if not path.name.startswith("."):
+            return path
+    return None
+
+
+def _shrink(img):
+    """A THUMB_SIZE copy of img in RGB(A); img is not modified."""
+    thumb = img.copy()
+    if thumb.mode not in ("RGB", "RGBA"):
+        thumb = thumb.convert("RGB")
+    thumb.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return thumb
+
+
+def write_thumbnail(img, image_hash: str) -> Path:
+    """
+    Write the thumbnail for an already-decoded PIL image (not modified).
+
+    Goes through a uniquely named part file, so concurrent writers and
+    readers never see a half-written thumbnail.
+    """
+    THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+    dest = thumbnail_path(image_hash)
+    thumb = _shrink(img)
+
+    part = THUMBS_DIR / f".{image_hash}.{uuid.uuid4().hex}.part"
+    thumb.save(part, format="WEBP", quality=THUMB_QUALITY, method=4)
+    os.replace(part, dest)
+    return dest
+
+
+def write_thumbnail_from_file(path, image_hash: str) -> Path:
+    """Write the thumbnail for an image file, decoding it at reduced scale where possible."""
+    with Image.open(path) as img:
+        img.draft("RGB", (THUMB_SIZE * 2, THUMB_SIZE * 2))  # JPEG: decode at reduced scale
+        return write_thumbnail(img, image_hash)
+
+
+def ensure_thumbnail(image_hash: str, trigger="on_demand"):
+    """Path of the thumbnail, generating it from the original if needed; None if no original."""
+    dest = thumbnail_path(image_hash)
+    if dest.exists():
+        return dest
+
+    original = find_original(image_hash)
+    if original is None:
+        return None
+    write_thumbnail_from_file(original, image_hash)
+    GENERATED.inc(trigger=trigger)
+    return dest
+
+
+class ThumbnailPool:
+    """Background thumbnail generation with a bounded number of pending jobs."""
+
+    def __init__(self, workers=THUMB_WORKERS, max_pending=THUMB_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnails")
+        self._max_pending = max(1, max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, write, image_hash: str) -> bool:
+        """
+        Queue write(image_hash), which makes the thumbnail, on the pool; False if skipped.
+
+        Any decoding happens inside write, on a pool thread.
+        """
+        if thumbnail_path(image_hash).exists():
+            return False
+        with self._lock:
+            if image_hash in self._pending:
+                return False
+            if len(self._pending) >= self._max_pending:
+                SKIPPED.inc()
+                return False
+            self._pending.add(image_hash)
+        self._executor.submit(self._run, write, image_hash)
+        return True
+
+    def _run(self, write, image_hash):
+        try:
+            write(image_hash)
+            GENERATED.inc(trigger="ingest")
+        except Exception as e:
+            logger.warning(f"[thumbnails] Could not create thumbnail for {image_hash}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(image_hash)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def schedule_thumbnail(upload) -> bool:
+    """
+    Queue a thumbnail for a DecodedUpload.
+
+    The job reads the stored original (save_if_missing() runs first on every
+    ingest path), never the request's upload stream, which is closed with
+    the request. Without a stored original the upload is shrunk here and
+    only the small image is queued.
+    """
+    global _pool
+    if thumbnail_path(upload.pixel_hash).exists():
+        return False
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThumbnailPool()
+    if upload.saved_path is not None:
+        write = partial(write_thumbnail_from_file, upload.saved_path)
+    else:
+        write = partial(write_thumbnail, _shrink(upload.rgb))
+    return _pool.schedule(write, upload.pixel_hash)
@@ -0,0 +1,105 @@
+# utils/upload_memo.py
+"""
+Memo from a digest of the raw upload bytes to the image's hashes.
+
+The pixel hash needs a full PIL decode and RGB conversion. A byte-identical
+re-upload can skip that: DecodedUpload looks the bytes' BLAKE2b digest up
+here and takes the pixel hash (and dHash) from the memo, and everything
+keyed by the pixel hash (verdict cache, chain mirror, near-duplicate index)
+follows from it. The image is then only decoded if something still needs
+the pixels, e.g. inference after a verdict-cache miss.
+
+The tiers (in-process LRU, SQLite file shared by the workers on the box,
+trimmed to UPLOAD_MEMO_MAX_ROWS) are utils.local_store.TwoTierCache.
+
+Rows are keyed by the Pillow version too: a different decoder could turn
+the same bytes into different pixels, so rows from other versions are
+purged at startup and the memo never disagrees with the decode path.
+
+Config (env):
+  UPLOAD_MEMO_ENABLED        default True
+  UPLOAD_MEMO_DB             SQLite file name in LOCAL_STATE_DIR (default upload_memo.sqlite3)
+  UPLOAD_MEMO_MEMORY_ITEMS   in-process LRU entries (default 10000)
+  UPLOAD_MEMO_MAX_ROWS       persistent rows (default 1000000)
+"""
+import hashlib
+import logging
+import os
+import threading
+
+import PIL
+
+from utils import metrics
+from utils.local_store import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MEMO_ENABLED = os.getenv("UPLOAD_MEMO_ENABLED", "True").lower() == "true"
+UPLOAD_MEMO_DB = os.getenv("UPLOAD_MEMO_DB", "upload_memo.sqlite3")
+UPLOAD_MEMO_MEMORY_ITEMS = int(os.getenv("UPLOAD_MEMO_MEMORY_ITEMS", "10000"))
+UPLOAD_MEMO_MAX_ROWS = int(os.getenv("UPLOAD_MEMO_MAX_ROWS", "1000000"))
+
+# Decoder version the memoized hashes were computed with
+DECODER_VERSION = f"Pillow-{PIL.__version__}"
+
+_CHUNK_SIZE = 1024 * 1024
+
+LOOKUPS = metrics.counter(
+    "upload_memo_lookups_total",
+    "Raw-bytes memo lookups by tier and result.",
+    ("tier", "result"),
+)
+EVICTIONS = metrics.counter(
+    "upload_memo_evictions_total",
+    "Entries evicted from the raw-bytes memo.",
+    ("tier",),
+)
+
+
+def bytes_digest(stream) -> str:
+    """BLAKE2b-128 of a seekable stream's full contents, as hex (leaves it at the end)."""
+    digest = hashlib.blake2b(digest_size=16)
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadMemo(TwoTierCache):
+    """(raw-bytes digest) -> (pixel_hash, perceptual_hash)."""
+
+    table = "upload_hashes"
+    key_column = "digest"
+    version_column = "decoder_version"
+    value_columns = (("pixel_hash", "TEXT"), ("perceptual_hash", "TEXT"))
+    lookups = LOOKUPS
+    evictions = EVICTIONS
+
+    def __init__(self, memory_items=UPLOAD_MEMO_MEMORY_ITEMS, max_rows=UPLOAD_MEMO_MAX_ROWS,
+                 db_filename=UPLOAD_MEMO_DB, decoder_version=DECODER_VERSION):
+        super().__init__(decoder_version, memory_items, max_rows, db_filename)
+
+    def put(self, digest, pixel_hash, perceptual_hash):
+        if not digest or not pixel_hash or not perceptual_hash:
+            return
+        super().put(digest, pixel_hash, perceptual_hash)
+
+
+_memo = None
+_memo_lock = threading.Lock()
+_memo_failed = False
+
+
+def get_memo():
+    """The process-wide UploadMemo, or None if disabled or its database can't be opened."""
+    global _memo, _memo_failed
+    if _memo is not None or _memo_failed or not UPLOAD_MEMO_ENABLED:
+        return _memo
+    with _memo_lock:
+        if _memo is None and not _memo_failed:
+            try:
+                _memo = UploadMemo()
+            except Exception as e:
+                logger.error(f"[upload_memo] Memo disabled: {e}")
+                _memo_failed = True
+    return _memo
@@ -0,0 +1,59 @@
+# utils/verdict_cache.py
+"""
+Two-tier cache of model verdicts keyed by (pixel hash, model version).
+
+FAKE images are never written on-chain, so without this every re-upload of
+a known deepfake pays full Xception inference again.
+
+The tiers (in-process LRU, SQLite file shared by the workers on the box,
+trimmed to VERDICT_CACHE_MAX_ROWS) are utils.local_store.TwoTierCache.
+
+Entries are keyed by the model version (content hash of the loaded model
+file), so swapping the model file invalidates everything automatically;
+rows written for other versions are purged when a new version starts.
+"""
+import os
+
+from utils import metrics
+from utils.local_store import TwoTierCache
+
+VERDICT_CACHE_DB = os.getenv("VERDICT_CACHE_DB", "verdict_cache.sqlite3")
+VERDICT_CACHE_MEMORY_ITEMS = int(os.getenv("VERDICT_CACHE_MEMORY_ITEMS", "10000"))
+VERDICT_CACHE_MAX_ROWS = int(os.getenv("VERDICT_CACHE_MAX_ROWS", "1000000"))
+
+LOOKUPS = metrics.counter(
+    "verdict_cache_lookups_total",
+    "Verdict cache lookups by tier and result.",
+    ("tier", "result"),
+)
+EVICTIONS = metrics.counter(
+    "verdict_cache_evictions_total",
+    "Entries evicted from the verdict cache.",
+    ("tier",),
+)
+
+
+class VerdictCache(TwoTierCache):
+    """(pixel_hash) -> (label, confidence) for one model version."""
+
+    table = "verdicts"
+    key_column = "pixel_hash"
+    version_column = "model_version"
+    value_columns = (("label", "TEXT"), ("confidence", "REAL"))
+    lookups = LOOKUPS
+    evictions = EVICTIONS
+
+    def __init__(self, model_version, memory_items=VERDICT_CACHE_MEMORY_ITEMS,
+                 max_rows=VERDICT_CACHE_MAX_ROWS, db_filename=VERDICT_CACHE_DB):
+        if not model_version:
+            raise ValueError("VerdictCache needs a model version")
+        super().__init__(model_version, memory_items, max_rows, db_filename)
+
+    @property
+    def model_version(self):
+        return self.version
+
+    def put(self, pixel_hash, label, confidence):
+        if not pixel_hash or label is None or confidence is None:
+            return
+        super().put(pixel_hash, label, float(confidence))
@@ -0,0 +1,431 @@
+# utils/verification.py
+"""
+Verification decision logic shared by /analyze (HTML) and /api/verify (NDJSON).
+
+For one decoded upload:
+  1. Look the pixel hash up on chain (local mirror, then RPC) — a stored
+     record means the image is REAL and already verified.
+  2. Otherwise take the verdict from the verdict cache, then from a near
+     duplicate of a known FAKE (perceptual hash, utils/near_duplicate.py),
+     or run the model. Near copies of REAL images always go to the model.
+  3. REAL by model and not on chain -> enqueue an on-chain registration
+     (outbox). FAKE is never registered, and neither is a near match: the
+     chain only vouches for images the model itself judged authentic.
+
+decide() does steps 1-2 and touches neither Flask nor the SQL database, so
+it can run in worker threads; register() (and utils.history.log_image_if_new)
+do the database side effects and must run inside the app/request context.
+decide_async() is the same decision for the ASGI API (routes/async_api.py).
+"""
+import asyncio
+
+import numpy as np
+
+from blockchain.interact import get_result
+from blockchain.outbox import enqueue_registration
+from extensions import db
+from utils.near_duplicate import get_index as get_near_duplicate_index
+from utils.predict import predict_array, predict_array_async
+from utils.request_timing import NULL_TIMER
+from utils import speculation
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# decision["chain_error"] values
+CHAIN_ERROR_INVALID_HASH = "invalid_hash"
+CHAIN_ERROR_LOOKUP_FAILED = "lookup_failed"
+
+# lookup_onchain() result standing in for the chain while speculating
+NOT_ON_CHAIN = (None, None, False, None)
+
+
+def hex_to_bytes32(hex_str: str) -> bytes:
+    """
+    Convert a 64-char hex string (or '0x' + 64) to 32-byte value for Solidity bytes32.
+    """
+    h = hex_str.strip().lower()
+    if h.startswith("0x"):
+        h = h[2:]
+    if len(h) != 64:
+        raise ValueError(f"image hash must be 64 hex chars (got {len(h)})")
+    return bytes.fromhex(h)
+
+
+def normalize_onchain_info(raw):
+    """
+    Take whatever get_result(...) returns (dict, tuple, or None)
+    and normalize it to:
+
+      (info_dict_or_none, is_present_bool)
+
+    info_dict format:
+      {
+        "label": str | None,
+        "confidence": float | None,   # 0–1 if available
+        "timestamp": int | None,
+        "recorder": str | None,
+      }
+
+    is_present_bool tells us whether there is a REAL stored record
+    on chain for this hash.
+    """
+    if raw is None:
+        return None, False
+
+    # Case 1: our interact.get_result already returns a dict
+    if isinstance(raw, dict):
+        label = raw.get("label")
+        conf = raw.get("confidence")
+        ts = raw.get("timestamp")
+        rec = raw.get("recorder") or raw.get("uploader")
+
+        # Try to normalize confidence to 0–1 float
+        conf_val = None
+        if conf is not None:
+            try:
+                conf_val = float(conf)
+                # If on-chain is stored as 0–10000 integer but not scaled yet
+                if conf_val > 1.0:
+                    # heuristic: treat as scaled if <= 10000
+                    if conf_val <= 10000:
+                        conf_val = conf_val / 10000.0
+                    else:
+                        conf_val = 1.0
+            except (TypeError, ValueError):
+                conf_val = None
+
+        # Determine if this looks like an empty record
+        empty = (
+            (label is None or str(label).strip() == "")
+            and (ts in (None, 0))
+        )
+        info = {
+            "label": label,
+            "confidence": conf_val,
+            "timestamp": ts,
+            "recorder": rec,
+        }
+        return (info, not empty)
+
+    # Case 2: raw tuple/list directly from contract
+    # Expected shape: (contentHash, label, confidence, timestamp, recorder)
+    if isinstance(raw, (tuple, list)) and len(raw) >= 5:
+        _, label, conf_scaled, ts, rec = raw
+
+        # check for "empty" default struct (no record)
+        is_zero_addr = (
+            isinstance(rec, str)
+            and rec.lower() == ZERO_ADDRESS
+        )
+        if (label == "" or label is None) and conf_scaled == 0 and ts == 0 and is_zero_addr:
+            return None, False
+
+        # Otherwise, it's a real stored record
+        conf_val = None
+        try:
+            conf_val = float(conf_scaled) / 10000.0
+        except (TypeError, ValueError):
+            conf_val = None
+
+        info = {
+            "label": label,
+            "confidence": conf_val,
+            "timestamp": ts,
+            "recorder": rec,
+        }
+        return info, True
+
+    # Any other unexpected type -> treat as "not present"
+    return None, False
+
+
+def lookup_onchain(hash_value: str):
+    """
+    Returns (content_hash_bytes32, onchain_info, is_onchain, chain_error).
+
+    chain_error is None, CHAIN_ERROR_INVALID_HASH or CHAIN_ERROR_LOOKUP_FAILED
+    (RPC failure or open circuit breaker); either way the caller falls back
+    to ML-only verification.
+    """
+    try:
+        content_hash_bytes32 = hex_to_bytes32(hash_value)
+    except Exception:
+        return None, None, False, CHAIN_ERROR_INVALID_HASH
+
+    try:
+        raw_onchain = get_result(content_hash_bytes32)
+    except Exception:
+        return content_hash_bytes32, None, False, CHAIN_ERROR_LOOKUP_FAILED
+
+    onchain_info, is_onchain = normalize_onchain_info(raw_onchain)
+    return content_hash_bytes32, onchain_info, is_onchain, None
+
+
+def decide(upload, model, scheduler=None, verdict_cache=None, timer=None) -> dict:
+    """
+    Chain lookup + ML verdict for one DecodedUpload (no database writes).
+
+    model / scheduler / verdict_cache: as returned by globals.get_*();
+    inference goes through the scheduler when there is one, so concurrent
+    callers are batched together.
+    timer: utils.request_timing.StageTimer for the per-stage metrics (optional)
+
+    With SPECULATIVE_INFERENCE (utils/speculation.py) the off-chain verdict
+    is worked out concurrently with the chain lookup; the decision is the same.
+
+    Returns a decision dict:
+      image_hash, filename      pixel hash and static/images file name
+      onchain, onchain_info     stored on-chain record, if any
+      chain_error               see lookup_onchain()
+      perceptual_hash           64-bit dHash (hex)
+      model_available           False if the model is not loaded (label "unknown")
+      source                    "chain" | "cache" | "near_match" | "model" | None
+      near_match                {image_hash, label, confidence, distance} of the
+                                earlier image whose verdict was reused, or None
+      label, confidence         final verdict ("real" / "fake" / "unknown")
+    """
+    timer = timer or NULL_TIMER
+    if model is not None and speculation.policy.should_speculate():
+        return _decide_speculatively(upload, model, scheduler, verdict_cache, timer)
+
+    with timer.stage("chain_lookup"):
+        chain_lookup = lookup_onchain(upload.pixel_hash)
+    _observe_chain_lookup(chain_lookup)
+
+    decision = decide_without_model(upload, chain_lookup, model, verdict_cache, timer)
+    if not needs_inference(decision):
+        return decision
+
+    # Inference goes through the micro-batching scheduler
+    with timer.stage("preprocess"):
+        x = upload.model_input(np.uint8)  # scaled to the model's dtype inside the input tensor
+    with timer.stage("inference"):
+        label, confidence = predict_array(scheduler or model, x)
+    return apply_model_verdict(decision, label, confidence, verdict_cache)
+
+
+def _observe_chain_lookup(chain_lookup):
+    """Feed the speculation policy's on-chain hit rate (failed lookups don't count)."""
+    if chain_lookup[3] is None:
+        speculation.policy.observe(chain_lookup[2])
+
+
+def _off_chain_verdict(job, upload, model, scheduler, verdict_cache):
+    """
+    Speculative half of decide(): the verdict if the hash is not on-chain.
+
+    Returns (decision, model verdict or None). Nothing is written to the
+    verdict cache or near-duplicate index here; the result may be thrown away.
+    """
+    decision = decide_without_model(upload, NOT_ON_CHAIN, model, verdict_cache)
+    if not needs_inference(decision):
+        return decision, None
+    x = upload.model_input(np.uint8)
+    return decision, job.infer(scheduler or model, x)
+
+
+def _decide_speculatively(upload, model, scheduler, verdict_cache, timer):
+    job = speculation.speculate(_off_chain_verdict, upload, model, scheduler, verdict_cache)
+
+    with timer.stage("chain_lookup"):
+        chain_lookup = lookup_onchain(upload.pixel_hash)
+    _observe_chain_lookup(chain_lookup)
+
+    if chain_lookup[2]:
+        job.discard()
+        return decide_without_model(upload, chain_lookup, model, verdict_cache, timer)
+
+    with timer.stage("speculation_wait"):
+        decision, verdict = job.result()
+    content_hash_bytes32, onchain_info, _, chain_error = chain_lookup
+    decision.update(onchain_info=onchain_info, chain_error=chain_error, _content_hash_bytes32=content_hash_bytes32)
+    if verdict is None:
+        return decision
+    label, confidence = verdict
+    return apply_model_verdict(decision, label, confidence, verdict_cache)
+
+
+def decide_without_model(upload, chain_lookup, model, verdict_cache=None, timer=None) -> dict:
+    """
+    decide() up to the model: the decision from the chain, the verdict cache
+    or a near duplicate, or one that still needs_inference().
+
+    chain_lookup: the lookup_onchain() result for upload.pixel_hash, however
+    it was obtained (the ASGI path reads the chain with AsyncWeb3).
+    """
+    timer = timer or NULL_TIMER
+    content_hash_bytes32, onchain_info, is_onchain, chain_error = chain_lookup
+
+    with timer.stage("perceptual_hash"):
+        perceptual_hash = upload.perceptual_hash
+
+    decision = {
+        "image_hash": upload.pixel_hash,
+        "filename": upload.stored_filename,
+        "onchain": is_onchain,
+        "onchain_info": onchain_info,
+        "chain_error": chain_error,
+        "perceptual_hash": perceptual_hash,
+        "model_available": model is not None,
+        "source": None,
+        "near_match": None,
+        "label": None,
+        "confidence": None,
+        "_content_hash_bytes32": content_hash_bytes32,
+    }
+
+    # Hash is already on-chain → image REAL & verified
+    if is_onchain:
+        chain_conf_val = onchain_info.get("confidence") if onchain_info is not None else None
+        decision.update(
+            source="chain",
+            label="real",
+            confidence=chain_conf_val if chain_conf_val is not None else 1.0,
+        )
+        return decision
+
+    # Known verdicts come from the cache
+    with timer.stage("verdict_cache"):
+        cached = verdict_cache.get(upload.pixel_hash) if (model is not None and verdict_cache is not None) else None
+    if cached is not None:
+        label, confidence = cached
+        decision.update(source="cache", label=label.lower(), confidence=confidence)
+        return decision
+
+    # Resized / recompressed copy of an image we already have a verdict for
+    near_index = get_near_duplicate_index()
+    with timer.stage("near_duplicate"):
+        near = near_index.lookup(decision["perceptual_hash"]) if near_index is not None else None
+    if near is not None:
+        decision.update(
+            source="near_match",
+            near_match=near,
+            label=near["label"],
+            confidence=near["confidence"],
+        )
+        return decision
+
+    # Model not loaded: no verdict, but the hash is still useful later
+    if model is None:
+        decision.update(label="unknown", confidence=0.0)
+    return decision
+
+
+def needs_inference(decision: dict) -> bool:
+    """True if decide_without_model() left the verdict to the model."""
+    return decision["source"] is None and decision["model_available"]
+
+
+def apply_model_verdict(decision: dict, label, confidence, verdict_cache=None) -> dict:
+    """Record the model's verdict in the decision, the verdict cache and the near-duplicate index."""
+    if verdict_cache is not None:
+        verdict_cache.put(decision["image_hash"], label, confidence)
+    near_index = get_near_duplicate_index()
+    if near_index is not None:
+        near_index.add(decision["perceptual_hash"], decision["image_hash"], label.lower(), confidence)
+
+    decision.update(source="model", label=label.lower(), confidence=confidence)
+    return decision
+
+
+async def lookup_onchain_async(chain, hash_value: str):
+    """lookup_onchain() through a blockchain.async_client.AsyncChainClient."""
+    try:
+        content_hash_bytes32 = hex_to_bytes32(hash_value)
+    except Exception:
+        return None, None, False, CHAIN_ERROR_INVALID_HASH
+
+    try:
+        raw_onchain = await chain.get_result(content_hash_bytes32)
+    except Exception:
+        return content_hash_bytes32, None, False, CHAIN_ERROR_LOOKUP_FAILED
+
+    onchain_info, is_onchain = normalize_onchain_info(raw_onchain)
+    return content_hash_bytes32, onchain_info, is_onchain, None
+
+
+async def decide_async(upload, model, scheduler, verdict_cache, chain, executor, timer=None) -> dict:
+    """
+    decide() on an event loop: the same decision dict, without a thread per request.
+
+    chain: AsyncChainClient for the chain lookup (awaited, no thread held)
+    executor: runs the CPU and local-SQLite steps (dHash, verdict cache,
+    near-duplicate index, preprocessing); inference awaits the scheduler.
+    """
+    timer = timer or NULL_TIMER
+    loop = asyncio.get_running_loop()
+
+    with timer.stage("chain_lookup"):
+        chain_lookup = await lookup_onchain_async(chain, upload.pixel_hash)
+
+    decision = await loop.run_in_executor(
+        executor, decide_without_model, upload, chain_lookup, model, verdict_cache, timer
+    )
+    if not needs_inference(decision):
+        return decision
+
+    with timer.stage("preprocess"):
+        x = await loop.run_in_executor(executor, upload.model_input, np.uint8)
+    with timer.stage("inference"):
+        label, confidence = await predict_array_async(scheduler or model, x, executor)
+    return await loop.run_in_executor(
+        executor, apply_model_verdict, decision, label, confidence, verdict_cache
+    )
+
+
+def record_outcome(timer, decision: dict):
+    """Count how a decision was reached (see utils/request_timing.py for the names)."""
+    if decision["chain_error"] is not None:
+        timer.outcome("chain_fallback")
+
+    if decision["onchain"]:
+        timer.outcome("onchain_hit")
+    elif decision["source"] == "near_match":
+        timer.outcome("near_match")
+    elif decision["source"] is None:
+        timer.outcome("model_unavailable")
+    elif decision["label"] == "real":
+        timer.outcome("real_new")
+    else:
+        timer.outcome("fake")
+
+
+def register(decision: dict) -> dict:
+    """
+    Enqueue an on-chain registration for a REAL, not-yet-registered decision.
+
+    Adds "registration" ({"status", "tx_hash"} or None) and
+    "registration_error" to the decision and returns it.
+    """
+    decision["registration"] = None
+    decision["registration_error"] = None
+
+    if (
+        decision["onchain"]
+        or decision["label"] != "real"
+        or decision["source"] not in ("model", "cache")
+        or decision.get("_content_hash_bytes32") is None
+    ):
+        return decision
+
+    try:
+        # Durable outbox: the transaction is signed, sent and tracked in the background
+        registration = enqueue_registration(
+            decision["image_hash"],
+            label=decision["label"],
+            confidence=decision["confidence"],
+            phash=decision["perceptual_hash"],
+        )
+        decision["registration"] = {
+            "status": registration.status,
+            "tx_hash": registration.tx_hash,
+        }
+    except Exception as e:
+        db.session.rollback()
+        decision["registration_error"] = str(e)
+    return decision
+
+
+def public_view(decision: dict) -> dict:
+    """The decision without internal fields (for JSON responses)."""
+    return {k: v for k, v in decision.items() if not k.startswith("_")}